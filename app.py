@@ -2,6 +2,9 @@ from flask import Flask
 import os
 from config import Config
 from utils.db import init_db
+from utils.analysis_queue import start_retry_worker
+from utils.device_monitor import start_device_monitor
+from utils.capture_scheduler import start_capture_scheduler
 
 # Import Blueprints from routes package
 from routes import (
@@ -13,11 +16,14 @@ from routes import (
     weather_bp,
     gallery_bp,
     telegram_bp,
-    config_bp
+    config_bp,
+    monitor_bp,
+    devices_bp,
+    schedules_bp
 )
 
 
-def create_app():
+def create_app(start_workers=True):
     # Create Flask app
     app = Flask(__name__)
     app.config.from_object(Config)
@@ -38,11 +44,27 @@ def create_app():
     app.register_blueprint(gallery_bp)
     app.register_blueprint(telegram_bp)
     app.register_blueprint(config_bp)
+    app.register_blueprint(monitor_bp)
+    app.register_blueprint(devices_bp)
+    app.register_blueprint(schedules_bp)
+
+    if start_workers:
+        # Background retry of analyses queued while Kindwise was unavailable
+        start_retry_worker()
+
+        # Background ESP32 health probes (status endpoints read from it)
+        start_device_monitor()
+
+        # Server-side auto-capture (schedules in the capture_schedules table)
+        start_capture_scheduler()
 
 
     return app
 
 
 if __name__ == "__main__":
-    app = create_app()
+    # The debug reloader runs this file twice: a watcher process and the
+    # serving child (WERKZEUG_RUN_MAIN=true). Only the child, which receives
+    # the requests (/scan callbacks included), runs the background workers.
+    app = create_app(start_workers=os.environ.get("WERKZEUG_RUN_MAIN") == "true")
     app.run(debug=True, host="0.0.0.0", port=5000)
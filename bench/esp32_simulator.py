@@ -0,0 +1,356 @@
+"""
+Local ESP32 simulator.
+
+Serves the firmware's HTTP surface (firmware/new_with_relay.ino) for N
+simulated boards, one port each, and calls back into Flask /sensor and
+/scan the way the real board does. Lets the sensor, relay and capture
+paths be developed and benchmarked without hardware.
+
+    python -m bench.esp32_simulator --devices 4 --register
+    python -m bench.esp32_simulator --ids default --port 8081 --latency 40 --fail-rate 0.05
+
+Like the firmware, each board handles one request at a time, and a soil
+read keeps it busy until "WiFi" is back.
+"""
+import argparse
+import base64
+import io
+import json
+import random
+import threading
+import time
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import requests
+
+try:
+    from PIL import Image, ImageDraw
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+
+# -----------------------------
+# DEFAULTS (seconds, roughly what the real board takes)
+# -----------------------------
+DHT_TIME = 0.3          # DHT22 read
+SOIL_TIME = 3.0         # WiFi off + 12 ADC samples + reconnect
+CAPTURE_TIME = 1.5      # camera init + frame + base64
+CALLBACK_TIMEOUT = 15   # httpPostJSONLocal timeout
+
+
+# -----------------------------
+# FAKE LEAF IMAGE
+# -----------------------------
+def _leaf_jpeg(width=640, height=480):
+    """A green leaf-ish VGA frame (a few KB), like the camera's JPEGs."""
+    if not PIL_AVAILABLE:
+        raise RuntimeError("Pillow is needed to generate images (or pass --image)")
+
+    img = Image.new("RGB", (width, height), (92, 64, 40))
+    draw = ImageDraw.Draw(img)
+    draw.ellipse((width * 0.15, height * 0.2, width * 0.85, height * 0.8), fill=(54, 140, 60))
+    draw.line((width * 0.2, height * 0.5, width * 0.8, height * 0.5), fill=(190, 210, 120), width=4)
+
+    for _ in range(random.randint(0, 12)):   # some "lesions"
+        x, y = random.uniform(0.3, 0.7) * width, random.uniform(0.3, 0.7) * height
+        r = random.uniform(4, 14)
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=(120, 90, 30))
+
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=80)
+    return buf.getvalue()
+
+
+# -----------------------------
+# ONE SIMULATED BOARD
+# -----------------------------
+class SimulatedBoard:
+
+    def __init__(self, device_id, port, flask_base, opts):
+        self.device_id = device_id
+        self.port = port
+        self.flask_base = flask_base.rstrip("/")
+        self.opts = opts
+
+        self.relay = "off"
+        self.moisture = random.uniform(35, 60)
+        self._updated = time.monotonic()
+
+        # The firmware's loop() does one thing at a time
+        self.busy = threading.Lock()
+        self.server = None
+        self.stats = {"requests": 0, "failed": 0, "dropped": 0, "callbacks": 0, "callback_errors": 0}
+
+    # ---- environment model ----
+    def _soil(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+
+        if self.relay == "on":
+            self.moisture += self.opts.water_rate * elapsed
+        else:
+            self.moisture -= self.opts.dry_rate * elapsed / 60.0
+        self.moisture = min(100.0, max(0.0, self.moisture))
+
+        return round(min(100.0, max(0.0, self.moisture + random.uniform(-0.5, 0.5))), 1)
+
+    def _dht(self):
+        hour = time.localtime().tm_hour + time.localtime().tm_min / 60.0
+        temp = 26 + 5 * -abs(hour - 14) / 14 + random.uniform(-0.3, 0.3)
+        hum = 70 - (temp - 20) * 1.5 + random.uniform(-1, 1)
+        return round(temp, 1), round(hum, 1)
+
+    # ---- callbacks into Flask ----
+    def _post(self, path, payload):
+        self.stats["callbacks"] += 1
+        try:
+            r = requests.post(f"{self.flask_base}{path}", json=payload, timeout=CALLBACK_TIMEOUT)
+            return r.status_code
+        except Exception as e:
+            self.stats["callback_errors"] += 1
+            print(f"[Sim {self.device_id}] {path} callback failed:", e)
+            return None
+
+    def send_sensor(self, moisture=-1, temperature=-1, humidity=-1):
+        return self._post("/sensor", {
+            "deviceId": self.device_id,
+            "moisture": moisture,
+            "temperature": temperature,
+            "humidity": humidity
+        })
+
+    def read_dht(self):
+        time.sleep(self.opts.dht_time)
+        temp, hum = self._dht()
+        self.send_sensor(temperature=temp, humidity=hum)
+
+    def read_soil(self):
+        time.sleep(self.opts.soil_time)
+        moisture = self._soil()
+        self.send_sensor(moisture=moisture)
+        return moisture
+
+    def capture(self, request_id=None):
+        time.sleep(self.opts.capture_time)
+
+        if self.opts.images:
+            with open(random.choice(self.opts.images), "rb") as f:
+                jpeg = f.read()
+        else:
+            jpeg = _leaf_jpeg()
+
+        payload = {"deviceId": self.device_id, "imageBase64": base64.b64encode(jpeg).decode()}
+        if request_id:
+            payload["requestId"] = request_id
+        return self._post("/scan", payload)
+
+    # ---- firmware loop(): periodic pushes ----
+    def _loop(self):
+        next_dht = time.monotonic() + self.opts.dht_interval if self.opts.dht_interval else None
+        next_soil = time.monotonic() + self.opts.soil_interval if self.opts.soil_interval else None
+
+        while True:
+            time.sleep(0.5)
+            now = time.monotonic()
+
+            if next_dht and now >= next_dht:
+                next_dht = now + self.opts.dht_interval
+                with self.busy:
+                    self.read_dht()
+
+            if next_soil and now >= next_soil:
+                next_soil = now + self.opts.soil_interval
+                with self.busy:
+                    self.read_soil()
+
+    def start(self, host="0.0.0.0"):
+        board = self
+
+        class Handler(_FirmwareHandler):
+            pass
+        Handler.board = board
+
+        # HTTPServer (not Threading...) → one request at a time, like WebServer
+        self.server = HTTPServer((host, self.port), Handler)
+        threading.Thread(target=self.server.serve_forever, name=f"sim-{self.device_id}", daemon=True).start()
+        threading.Thread(target=self._loop, name=f"sim-loop-{self.device_id}", daemon=True).start()
+        print(f"[Sim {self.device_id}] listening on :{self.port}")
+
+
+# -----------------------------
+# HTTP SURFACE (same routes as the firmware)
+# -----------------------------
+class _FirmwareHandler(BaseHTTPRequestHandler):
+    board = None
+
+    def log_message(self, fmt, *args):
+        if self.board.opts.verbose:
+            print(f"[Sim {self.board.device_id}] " + fmt % args)
+
+    def _reply(self, status, body, content_type="application/json"):
+        data = body if isinstance(body, bytes) else (
+            json.dumps(body).encode() if content_type == "application/json" else body.encode()
+        )
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(data)
+        self.wfile.flush()
+
+    def _inject(self):
+        """Latency + failure injection. Returns False if the request should stop here."""
+        board, opts = self.board, self.board.opts
+        board.stats["requests"] += 1
+
+        delay = opts.latency + random.uniform(0, opts.jitter)
+        if delay:
+            time.sleep(delay / 1000.0)
+
+        if random.random() < opts.drop_rate:
+            board.stats["dropped"] += 1
+            self.close_connection = True
+            return False
+
+        if random.random() < opts.fail_rate:
+            board.stats["failed"] += 1
+            self._reply(500, {"error": "injected_failure"})
+            return False
+
+        return True
+
+    def do_GET(self):
+        board = self.board
+        if not self._inject():
+            return
+
+        path = urlparse(self.path).path
+        with board.busy:
+            if path == "/":
+                self._reply(200, "AgriSight ESP32-CAM OK", "text/plain")
+            elif path == "/relay/status":
+                self._reply(200, {"state": board.relay})
+            else:
+                self._reply(404, "Not Found", "text/plain")
+
+    def do_POST(self):
+        board = self.board
+        if not self._inject():
+            return
+
+        url = urlparse(self.path)
+        path = url.path
+
+        with board.busy:
+            if path == "/capture":
+                request_id = parse_qs(url.query).get("request_id", [None])[0]
+                # Firmware uploads to /scan before answering
+                if board.capture(request_id) is None:
+                    self._reply(500, {"error": "capture_failed"})
+                else:
+                    self._reply(200, {"ok": True})
+
+            elif path == "/read/dht":
+                board.read_dht()
+                self._reply(200, {"ok": True})
+
+            elif path == "/read/soil":
+                moisture = board.read_soil()
+                self._reply(200, {"moisture": moisture})
+
+            elif path == "/read/all":
+                # Replies before "WiFi" goes off; the reading follows via /sensor
+                time.sleep(board.opts.dht_time)
+                temp, hum = board._dht()
+                self._reply(202, {"ok": True})
+                self.close_connection = True
+
+                time.sleep(board.opts.soil_time)
+                board.send_sensor(board._soil(), temp, hum)
+
+            elif path in ("/relay/on", "/relay/off"):
+                board._soil()   # settle moisture before switching
+                board.relay = path.rsplit("/", 1)[1]
+                self._reply(200, {"relay": board.relay})
+
+            else:
+                self._reply(404, "Not Found", "text/plain")
+
+    def do_OPTIONS(self):
+        self.send_response(200)
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Access-Control-Allow-Methods", "GET,POST,OPTIONS")
+        self.send_header("Access-Control-Allow-Headers", "Content-Type")
+        self.end_headers()
+
+
+# -----------------------------
+# FLEET
+# -----------------------------
+def start_fleet(opts):
+    """Start every board from parsed options. Returns the boards."""
+    if opts.ids:
+        ids = [i.strip() for i in opts.ids.split(",") if i.strip()]
+    else:
+        ids = [f"{opts.prefix}-{n + 1}" for n in range(opts.devices)]
+
+    boards = [SimulatedBoard(device_id, opts.port + n, opts.flask, opts) for n, device_id in enumerate(ids)]
+    for board in boards:
+        board.start(opts.host)
+
+        if opts.register:
+            try:
+                r = requests.post(f"{opts.flask.rstrip('/')}/api/devices", json={
+                    "id": board.device_id, "ip": opts.advertise, "port": board.port,
+                    "name": f"Simulated {board.device_id}"
+                }, timeout=10)
+                print(f"[Sim {board.device_id}] registered → {r.status_code}")
+            except Exception as e:
+                print(f"[Sim {board.device_id}] registration failed:", e)
+
+    return boards
+
+
+def build_parser():
+    p = argparse.ArgumentParser(description="Simulate AgriSight ESP32 boards")
+    p.add_argument("--devices", type=int, default=1, help="number of boards (ids <prefix>-1..N)")
+    p.add_argument("--ids", help="comma-separated device ids instead of --devices")
+    p.add_argument("--prefix", default="sim")
+    p.add_argument("--host", default="0.0.0.0")
+    p.add_argument("--port", type=int, default=8081, help="first board's port; the rest follow")
+    p.add_argument("--advertise", default="127.0.0.1", help="IP Flask should use to reach the boards")
+    p.add_argument("--flask", default="http://127.0.0.1:5000", help="Flask base URL for callbacks")
+    p.add_argument("--register", action="store_true", help="add the boards via /api/devices")
+
+    p.add_argument("--latency", type=float, default=0, help="ms added to every request")
+    p.add_argument("--jitter", type=float, default=0, help="up to this many extra ms")
+    p.add_argument("--fail-rate", type=float, default=0, help="share of requests answered 500")
+    p.add_argument("--drop-rate", type=float, default=0, help="share of connections closed unanswered")
+
+    p.add_argument("--dht-time", type=float, default=DHT_TIME)
+    p.add_argument("--soil-time", type=float, default=SOIL_TIME)
+    p.add_argument("--capture-time", type=float, default=CAPTURE_TIME)
+    p.add_argument("--dht-interval", type=float, default=300, help="seconds between DHT pushes (0 = off)")
+    p.add_argument("--soil-interval", type=float, default=0, help="seconds between soil pushes (0 = off)")
+    p.add_argument("--dry-rate", type=float, default=0.05, help="moisture lost per minute, %%")
+    p.add_argument("--water-rate", type=float, default=0.5, help="moisture gained per second of pumping, %%")
+    p.add_argument("--image", dest="images", action="append", help="JPEG to upload (repeatable)")
+    p.add_argument("--verbose", action="store_true")
+    return p
+
+
+if __name__ == "__main__":
+    opts = build_parser().parse_args()
+    boards = start_fleet(opts)
+
+    try:
+        while True:
+            time.sleep(30)
+            for board in boards:
+                print(f"[Sim {board.device_id}] relay={board.relay} moisture={board.moisture:.1f} {board.stats}")
+    except KeyboardInterrupt:
+        print("\n[Sim] stopped")
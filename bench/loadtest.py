@@ -0,0 +1,503 @@
+"""
+End-to-end load test for the ingest, analysis and dashboard endpoints.
+
+By default it starts everything locally:
+  - bench/stubs.py for Kindwise, OpenRouter, Telegram and OpenWeather
+  - one simulated ESP32 (bench/esp32_simulator.py) as the default board
+  - the Flask app in a subprocess, pointed at the above through env vars
+    and with its own temporary database
+
+then drives each endpoint at a fixed request rate (open loop: requests
+are sent on schedule whether or not earlier ones finished, and latency is
+measured from the scheduled time, so a slow server can't hide queueing).
+
+    python -m bench.loadtest --duration 30
+    python -m bench.loadtest --rate sensor=100 --rate analyze=2 --only sensor,analyze
+    python -m bench.loadtest --target http://127.0.0.1:5000 --chat-id 12345
+
+Results (throughput, p50/p95/p99 per endpoint) are printed, saved to
+bench/results/<time>-<git rev>.json and compared with the previous run
+(or --compare FILE). --fail-on-regression exits 1 if p95 got worse by
+more than --tolerance percent or the error rate went up.
+"""
+import argparse
+import base64
+import glob
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "bench", "results")
+UPLOADS_DIR = os.path.join(ROOT, "static", "uploads")
+
+# Requests per second per endpoint
+DEFAULT_RATES = {
+    "sensor": 20,
+    "scan": 1,
+    "upload": 2,
+    "analyze": 1,
+    "sensors": 10,
+    "gallery": 5,
+    "telegram": 2,
+}
+
+
+# -----------------------------
+# REQUEST BUILDERS
+# -----------------------------
+class Context:
+    """Shared data for building requests."""
+
+    def __init__(self, chat_id):
+        self.chat_id = chat_id
+        self.jpeg = _leaf_jpeg()
+        self.jpeg_b64 = base64.b64encode(self.jpeg).decode()
+        self.scan_ids = []
+        self._counter = int(time.time() * 1000)
+        self._lock = threading.Lock()
+
+    def next_id(self):
+        with self._lock:
+            self._counter += 1
+            return self._counter
+
+
+def _leaf_jpeg():
+    img = Image.new("RGB", (640, 480), (92, 64, 40))
+    img.paste((54, 140, 60), (96, 96, 544, 384))
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=80)
+    return buf.getvalue()
+
+
+def _sensor(ctx, n):
+    return "POST", "/sensor", {"json": {
+        "deviceId": "default",
+        "moisture": 30 + n % 40,
+        "temperature": 24 + n % 8,
+        "humidity": 55 + n % 20
+    }}
+
+
+def _scan(ctx, n):
+    return "POST", "/scan", {"json": {"deviceId": "default", "imageBase64": ctx.jpeg_b64}}
+
+
+def _upload(ctx, n):
+    return "POST", "/api/upload", {"files": {"file": (f"bench_{n}.jpg", ctx.jpeg, "image/jpeg")}}
+
+
+def _analyze(ctx, n):
+    scan_id = ctx.scan_ids[n % len(ctx.scan_ids)] if ctx.scan_ids else 1
+    return "POST", "/api/analyze", {"json": {"scan_id": scan_id, "crop_type": "tomato"}}
+
+
+def _sensors(ctx, n):
+    return "GET", "/api/sensors", {}
+
+
+def _gallery(ctx, n):
+    return "GET", "/api/gallery", {}
+
+
+def _telegram(ctx, n):
+    return "POST", "/telegram/webhook", {"json": {
+        "update_id": ctx.next_id(),
+        "message": {"chat": {"id": ctx.chat_id}, "text": "/moisture"}
+    }}
+
+
+SCENARIOS = {
+    "sensor": _sensor,
+    "scan": _scan,
+    "upload": _upload,
+    "analyze": _analyze,
+    "sensors": _sensors,
+    "gallery": _gallery,
+    "telegram": _telegram,
+}
+
+
+# -----------------------------
+# RUNNER
+# -----------------------------
+_local = threading.local()
+
+
+def _session():
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = requests.Session()
+    return session
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+class LoadRun:
+
+    def __init__(self, base, ctx, rates, duration, concurrency, timeout):
+        self.base = base.rstrip("/")
+        self.ctx = ctx
+        self.rates = rates
+        self.duration = duration
+        self.timeout = timeout
+        self.samples = {name: [] for name in rates}   # (latency s, status or None)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="load")
+
+    def _fire(self, name, n, scheduled):
+        method, path, kwargs = SCENARIOS[name](self.ctx, n)
+        status = None
+        try:
+            r = _session().request(method, self.base + path, timeout=self.timeout, **kwargs)
+            status = r.status_code
+        except requests.exceptions.RequestException:
+            pass
+
+        latency = time.monotonic() - scheduled
+        with self._lock:
+            self.samples[name].append((latency, status))
+
+    def _schedule(self, name, rate, start):
+        interval = 1.0 / rate
+        n = 0
+        while True:
+            scheduled = start + n * interval
+            if scheduled - start >= self.duration:
+                return
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._executor.submit(self._fire, name, n, scheduled)
+            n += 1
+
+    def run(self):
+        start = time.monotonic() + 0.2
+        threads = [
+            threading.Thread(target=self._schedule, args=(name, rate, start), daemon=True)
+            for name, rate in self.rates.items() if rate > 0
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self._executor.shutdown(wait=True)
+        elapsed = time.monotonic() - start
+        return {name: self._summarize(name, elapsed) for name in self.rates}
+
+    def _summarize(self, name, elapsed):
+        samples = self.samples[name]
+        ok = [lat for lat, status in samples if status is not None and status < 400]
+        codes = {}
+        for _, status in samples:
+            key = str(status) if status is not None else "error"
+            codes[key] = codes.get(key, 0) + 1
+
+        def ms(value):
+            return round(value * 1000, 1) if value is not None else None
+
+        return {
+            "target_rps": self.rates[name],
+            "requests": len(samples),
+            "ok": len(ok),
+            "errors": len(samples) - len(ok),
+            "error_rate": round((len(samples) - len(ok)) / len(samples), 4) if samples else 0.0,
+            "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": ms(_percentile(ok, 0.50)),
+            "p95_ms": ms(_percentile(ok, 0.95)),
+            "p99_ms": ms(_percentile(ok, 0.99)),
+            "max_ms": ms(max(ok) if ok else None),
+            "status_codes": codes
+        }
+
+
+# -----------------------------
+# LOCAL ENVIRONMENT (stubs + simulator + app)
+# -----------------------------
+def _free_port():
+    import socket
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class LocalEnvironment:
+
+    def __init__(self, opts):
+        self.opts = opts
+        self.workdir = tempfile.mkdtemp(prefix="agrisight-bench-")
+        self.app_port = _free_port()
+        self.base = f"http://127.0.0.1:{self.app_port}"
+        self.chat_id = "424242"
+        self.stubs = None
+        self.board = None
+        self.process = None
+        self.log = None
+        self._uploads_before = set()
+
+    def start(self):
+        from bench.stubs import StubServer
+        from bench.esp32_simulator import SimulatedBoard, build_parser
+
+        self.stubs = StubServer(port=0, latency=self.opts.stub_latency).start()
+
+        sim_opts = build_parser().parse_args(["--dht-interval", "0", "--soil-interval", "0"])
+        self.board = SimulatedBoard("default", _free_port(), self.base, sim_opts)
+        self.board.start("127.0.0.1")
+
+        env = dict(os.environ)
+        env.update(self.stubs.env())
+        env.update({
+            "DATABASE_PATH": os.path.join(self.workdir, "bench.db"),
+            "ESP32_IP": "127.0.0.1",
+            "ESP32_PORT": str(self.board.port),
+            "TELEGRAM_TOKEN": "bench",
+            "TELEGRAM_CHAT_ID": self.chat_id,
+            "KINDWISE_API_KEY": "bench",
+            "OPENROUTER_API_KEY": "bench",
+            "OPENWEATHER_API_KEY": "bench",
+        })
+
+        self._uploads_before = set(os.listdir(UPLOADS_DIR)) if os.path.isdir(UPLOADS_DIR) else set()
+
+        self.log = open(os.path.join(self.workdir, "app.log"), "w")
+        self.process = subprocess.Popen(
+            [sys.executable, "-c",
+             "from app import create_app; "
+             f"create_app().run(host='127.0.0.1', port={self.app_port}, threaded=True)"],
+            cwd=ROOT, env=env, stdout=self.log, stderr=subprocess.STDOUT
+        )
+
+        deadline = time.time() + self.opts.startup_timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"App exited during startup, see {self.log.name}")
+            try:
+                if requests.get(self.base + "/api/sensors", timeout=2).status_code == 200:
+                    print(f"[Bench] app up on {self.base} (log: {self.log.name})")
+                    return self
+            except requests.exceptions.RequestException:
+                pass
+            time.sleep(0.5)
+
+        raise RuntimeError(f"App did not start within {self.opts.startup_timeout}s, see {self.log.name}")
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        if self.log:
+            self.log.close()
+        if self.stubs:
+            self.stubs.stop()
+        if self.board:
+            self.board.server.shutdown()
+
+        # Images written by the run
+        if not self.opts.keep_uploads and os.path.isdir(UPLOADS_DIR):
+            for name in set(os.listdir(UPLOADS_DIR)) - self._uploads_before:
+                try:
+                    os.remove(os.path.join(UPLOADS_DIR, name))
+                except OSError:
+                    pass
+
+
+# -----------------------------
+# RESULTS
+# -----------------------------
+def _git_rev():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+def save_results(report, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{report['meta']['git_rev']}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    return path
+
+
+def previous_results(out_dir, exclude=None):
+    files = sorted(f for f in glob.glob(os.path.join(out_dir, "*.json")) if f != exclude)
+    return files[-1] if files else None
+
+
+def print_table(results):
+    header = f"{'endpoint':<10} {'target':>7} {'req':>6} {'err':>5} {'rps':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        def cell(v):
+            return f"{v:>8.1f}" if v is not None else f"{'-':>8}"
+        print(f"{name:<10} {r['target_rps']:>7g} {r['requests']:>6} {r['errors']:>5} {r['throughput_rps']:>7.2f}"
+              f" {cell(r['p50_ms'])} {cell(r['p95_ms'])} {cell(r['p99_ms'])} {cell(r['max_ms'])}")
+    print("(latencies in ms)")
+
+
+def compare(current, baseline, tolerance):
+    """Print deltas vs. a baseline report. Returns the regressed endpoint names."""
+    print(f"\nvs. {baseline['meta']['git_rev']} ({baseline['meta']['started']})")
+    regressed = []
+
+    for name, r in current["results"].items():
+        base = baseline["results"].get(name)
+        if not base or not base["requests"] or not r["requests"]:
+            continue
+
+        # Throughput is only comparable at the same offered rate
+        keys = ["p50_ms", "p95_ms", "p99_ms"]
+        if base["target_rps"] == r["target_rps"]:
+            keys.append("throughput_rps")
+
+        deltas = []
+        for key in keys:
+            if base[key] and r[key] is not None:
+                deltas.append(f"{key.split('_')[0]} {100.0 * (r[key] - base[key]) / base[key]:+.0f}%")
+
+        worse = (
+            base["p95_ms"] and r["p95_ms"] is not None
+            and r["p95_ms"] > base["p95_ms"] * (1 + tolerance / 100.0)
+        ) or r["error_rate"] > base["error_rate"] + 0.01
+
+        if worse:
+            regressed.append(name)
+        print(f"  {name:<10} {', '.join(deltas)}{'  ← REGRESSION' if worse else ''}")
+
+    return regressed
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def _parse_pairs(values, cast=float):
+    pairs = {}
+    for value in values or []:
+        for item in value.split(","):
+            name, _, number = item.partition("=")
+            pairs[name.strip()] = cast(number)
+    return pairs
+
+
+def build_parser():
+    p = argparse.ArgumentParser(description="AgriSight end-to-end load test")
+    p.add_argument("--target", help="test a running server instead of starting one (stubs are then up to you)")
+    p.add_argument("--chat-id", default="424242", help="TELEGRAM_CHAT_ID of --target")
+    p.add_argument("--duration", type=float, default=30, help="seconds of load")
+    p.add_argument("--rate", action="append", help="endpoint=req/s, e.g. sensor=50,scan=2 (repeatable)")
+    p.add_argument("--only", help="comma-separated endpoints to run: " + ",".join(SCENARIOS))
+    p.add_argument("--concurrency", type=int, default=64, help="max requests in flight")
+    p.add_argument("--timeout", type=float, default=60, help="per-request timeout, seconds")
+    p.add_argument("--seed-scans", type=int, default=5, help="uploads made first for /api/analyze")
+    p.add_argument("--stub-latency", action="append", help="service=ms for the stubs (kindwise, openrouter, telegram, openweather)")
+    p.add_argument("--startup-timeout", type=float, default=120)
+    p.add_argument("--keep-uploads", action="store_true", help="keep images the run wrote to static/uploads")
+    p.add_argument("--out", default=RESULTS_DIR, help="where results are stored")
+    p.add_argument("--compare", help="baseline results file (default: the previous run in --out)")
+    p.add_argument("--tolerance", type=float, default=20, help="allowed p95 increase, percent")
+    p.add_argument("--fail-on-regression", action="store_true")
+    p.add_argument("--no-save", action="store_true")
+    return p
+
+
+def main(argv=None):
+    opts = build_parser().parse_args(argv)
+    opts.stub_latency = _parse_pairs(opts.stub_latency)
+
+    rates = dict(DEFAULT_RATES, **_parse_pairs(opts.rate))
+    if opts.only:
+        wanted = [name.strip() for name in opts.only.split(",")]
+        rates = {name: rates[name] for name in wanted}
+
+    unknown = set(rates) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown endpoint(s): {', '.join(sorted(unknown))}")
+
+    env = None
+    if opts.target:
+        base, chat_id = opts.target, opts.chat_id
+    else:
+        env = LocalEnvironment(opts)
+        try:
+            env.start()
+        except Exception:
+            env.stop()
+            raise
+        base, chat_id = env.base, env.chat_id
+
+    try:
+        ctx = Context(chat_id)
+
+        # Scans for /api/analyze to work on
+        for n in range(opts.seed_scans if "analyze" in rates else 0):
+            method, path, kwargs = _upload(ctx, n)
+            r = requests.post(base + path, timeout=opts.timeout, **kwargs)
+            if r.ok:
+                ctx.scan_ids.append(r.json()["scan_id"])
+
+        print(f"[Bench] {opts.duration:.0f}s against {base}: "
+              + ", ".join(f"{name}={rate:g}/s" for name, rate in rates.items()))
+
+        started = datetime.now().isoformat(timespec="seconds")
+        results = LoadRun(base, ctx, rates, opts.duration, opts.concurrency, opts.timeout).run()
+
+    finally:
+        if env:
+            env.stop()
+
+    report = {
+        "meta": {
+            "git_rev": _git_rev(),
+            "started": started,
+            "duration": opts.duration,
+            "target": opts.target or "local",
+            "stub_latency": opts.stub_latency,
+            "concurrency": opts.concurrency
+        },
+        "results": results
+    }
+
+    print()
+    print_table(results)
+
+    path = None
+    if not opts.no_save:
+        path = save_results(report, opts.out)
+        print(f"\n[Bench] saved {os.path.relpath(path, ROOT)}")
+
+    baseline_path = opts.compare or previous_results(opts.out, exclude=path)
+    regressed = []
+    if baseline_path:
+        with open(baseline_path) as f:
+            regressed = compare(report, json.load(f), opts.tolerance)
+
+    if regressed and opts.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
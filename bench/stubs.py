@@ -0,0 +1,252 @@
+"""
+Local stand-ins for the external services (Kindwise, OpenRouter,
+Telegram, OpenWeather), so load tests never leave the machine.
+
+One threaded HTTP server, one path prefix per service:
+
+    /kindwise/api/v1/identification            → KW_BASE=http://HOST:PORT/kindwise/api/v1
+    /openrouter/api/v1/chat/completions        → OPENROUTER_URL=http://HOST:PORT/openrouter/api/v1/chat/completions
+    /telegram/bot<token>/<method>, /telegram/file/...  → TELEGRAM_API=http://HOST:PORT/telegram
+    /openweather/data/2.5/weather|forecast     → OPENWEATHER_BASE=http://HOST:PORT/openweather/data/2.5
+
+    python -m bench.stubs --port 9000 --latency kindwise=800 --latency openrouter=1500
+
+Latency per service is in ms (plus up to 20% jitter), like the real APIs.
+"""
+import argparse
+import io
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse
+
+from PIL import Image
+
+# Typical latencies of the real services (ms)
+DEFAULT_LATENCY = {
+    "kindwise": 900,
+    "openrouter": 1200,
+    "telegram": 120,
+    "openweather": 150,
+}
+
+DISEASES = [
+    ("leaf spot", "Septoria lycopersici", 0.82),
+    ("early blight", "Alternaria solani", 0.76),
+    ("powdery mildew", "Erysiphales", 0.71),
+    ("healthy", "Healthy", 0.93),
+]
+
+
+def _jpeg():
+    buf = io.BytesIO()
+    Image.new("RGB", (320, 240), (60, 140, 60)).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+class StubServer:
+
+    def __init__(self, host="127.0.0.1", port=9000, latency=None):
+        self.latency = dict(DEFAULT_LATENCY, **(latency or {}))
+        self.hits = {name: 0 for name in self.latency}
+        self._lock = threading.Lock()
+        self._message_id = 0
+        self._image = _jpeg()
+
+        stub = self
+
+        class Handler(_StubHandler):
+            pass
+        Handler.stub = stub
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.host, self.port = self.httpd.server_address[:2]
+
+    @property
+    def base(self):
+        return f"http://{self.host}:{self.port}"
+
+    def env(self):
+        """Environment that points the app at these stubs."""
+        return {
+            "KW_BASE": f"{self.base}/kindwise/api/v1",
+            "OPENROUTER_URL": f"{self.base}/openrouter/api/v1/chat/completions",
+            "TELEGRAM_API": f"{self.base}/telegram",
+            "OPENWEATHER_BASE": f"{self.base}/openweather/data/2.5",
+        }
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, name="stubs", daemon=True).start()
+        print(f"[Stubs] listening on {self.base}")
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+
+    def _wait(self, service):
+        with self._lock:
+            self.hits[service] += 1
+        ms = self.latency.get(service, 0)
+        if ms:
+            time.sleep(ms * random.uniform(1.0, 1.2) / 1000.0)
+
+    def next_message_id(self):
+        with self._lock:
+            self._message_id += 1
+            return self._message_id
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    stub = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status, body, content_type="application/json"):
+        data = body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._body()
+        self._route("GET", urlparse(self.path).path)
+
+    def do_POST(self):
+        self._request_body = self._body()
+        self._route("POST", urlparse(self.path).path)
+
+    def _route(self, method, path):
+        service = path.strip("/").split("/", 1)[0]
+        handler = getattr(self, f"_{service}", None)
+        if handler is None:
+            return self._send(404, {"error": "unknown service"})
+
+        self.stub._wait(service)
+        handler(method, path)
+
+    # ---- Kindwise (crop.health) ----
+    def _kindwise(self, method, path):
+        name, scientific, probability = random.choice(DISEASES)
+        self._send(201, {
+            "status": "COMPLETED",
+            "token": f"stub-{random.randint(0, 1 << 30)}",
+            "result": {
+                "disease": {"suggestions": [{
+                    "name": name,
+                    "scientific_name": scientific,
+                    "probability": round(probability * random.uniform(0.9, 1.05), 3)
+                }]},
+                "crop": {"suggestions": [{"name": "tomato", "probability": 0.9}]}
+            }
+        })
+
+    # ---- OpenRouter ----
+    def _openrouter(self, method, path):
+        try:
+            payload = json.loads(self._request_body or b"{}")
+        except ValueError:
+            payload = {}
+
+        text = ("Remove affected leaves, avoid overhead watering and apply a copper-based "
+                "fungicide every 7-10 days. Improve airflow between plants.")
+        usage = {"prompt_tokens": 220, "completion_tokens": 48, "total_tokens": 268}
+
+        if not payload.get("stream"):
+            return self._send(200, {
+                "id": "stub", "model": payload.get("model", "stub"),
+                "choices": [{"message": {"role": "assistant", "content": text}}],
+                "usage": usage
+            })
+
+        # SSE, a few words per chunk
+        words = text.split(" ")
+        lines = [": OPENROUTER PROCESSING"]
+        for i in range(0, len(words), 4):
+            chunk = {"choices": [{"delta": {"content": " ".join(words[i:i + 4]) + " "}}]}
+            lines.append(f"data: {json.dumps(chunk)}")
+        lines.append(f"data: {json.dumps({'choices': [], 'usage': usage})}")
+        lines.append("data: [DONE]")
+        self._send(200, ("\n\n".join(lines) + "\n\n").encode(), "text/event-stream")
+
+    # ---- Telegram Bot API ----
+    def _telegram(self, method, path):
+        if path.startswith("/telegram/file/"):
+            return self._send(200, self.stub._image, "image/jpeg")
+
+        api_method = path.rsplit("/", 1)[-1]
+
+        if api_method == "getFile":
+            return self._send(200, {"ok": True, "result": {"file_id": "stub", "file_path": "photos/stub.jpg"}})
+
+        result = {"message_id": self.stub.next_message_id(), "date": int(time.time())}
+        if api_method == "sendPhoto":
+            result["photo"] = [{"file_id": f"stub-photo-{result['message_id']}", "width": 320, "height": 240}]
+        self._send(200, {"ok": True, "result": result})
+
+    # ---- OpenWeather ----
+    def _openweather(self, method, path):
+        current = {
+            "main": {"temp": 27.5, "humidity": 62, "pressure": 1011},
+            "weather": [{"description": "scattered clouds"}],
+            "wind": {"speed": 3.1},
+            "name": "Stubville",
+            "sys": {"country": "IN"},
+            "dt": int(time.time())
+        }
+
+        if re.search(r"/forecast$", path):
+            start = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+            return self._send(200, {
+                "city": {"name": "Stubville"},
+                "list": [
+                    {
+                        "dt_txt": (start + timedelta(hours=3 * i)).strftime("%Y-%m-%d %H:%M:%S"),
+                        "main": current["main"],
+                        "weather": current["weather"],
+                        "wind": current["wind"]
+                    }
+                    for i in range(40)
+                ]
+            })
+
+        self._send(200, current)
+
+
+def _parse_latency(values):
+    latency = {}
+    for value in values or []:
+        name, _, ms = value.partition("=")
+        latency[name] = float(ms)
+    return latency
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Stub external services for load tests")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=9000)
+    p.add_argument("--latency", action="append", help="service=ms (repeatable)")
+    opts = p.parse_args()
+
+    stubs = StubServer(opts.host, opts.port, _parse_latency(opts.latency)).start()
+    for key, value in stubs.env().items():
+        print(f"  {key}={value}")
+
+    try:
+        while True:
+            time.sleep(30)
+            print("[Stubs] hits:", stubs.hits)
+    except KeyboardInterrupt:
+        stubs.stop()
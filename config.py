@@ -20,15 +20,132 @@ class Config:
     # ----------------------------
     # Kindwise API endpoints
     # ----------------------------
-    KW_BASE = "https://crop.kindwise.com/api/v1"
+    KW_BASE = os.environ.get("KW_BASE", "https://crop.kindwise.com/api/v1")
     KW_IDENTIFY = f"{KW_BASE}/identification"
     KW_GET_RESULT = f"{KW_BASE}/identification/{{token}}"
 
+    # Upload preparation (images are downsized/re-encoded before sending)
+    KW_UPLOAD_MAX_DIM = int(os.environ.get("KW_UPLOAD_MAX_DIM", 1280))
+    KW_UPLOAD_MAX_BYTES = int(os.environ.get("KW_UPLOAD_MAX_BYTES", 512 * 1024))
+    KW_UPLOAD_MIN_QUALITY = int(os.environ.get("KW_UPLOAD_MIN_QUALITY", 60))
+
+    # Max images per batch identification (one plant, several leaves)
+    KW_MAX_BATCH_IMAGES = int(os.environ.get("KW_MAX_BATCH_IMAGES", 5))
+
+    # ----------------------------
+    # Local disease classifier tier (answers before Kindwise)
+    # ----------------------------
+    LOCAL_CLASSIFIER_ENABLED = os.environ.get("LOCAL_CLASSIFIER_ENABLED", "1") == "1"
+    LOCAL_CLASSIFIER_MODEL = os.environ.get("LOCAL_CLASSIFIER_MODEL", "models/disease/model.traced.pt")
+    LOCAL_CLASSIFIER_CLASSES = os.environ.get("LOCAL_CLASSIFIER_CLASSES", "models/disease/classes.txt")
+    LOCAL_CLASSIFIER_MIN_CONFIDENCE = float(os.environ.get("LOCAL_CLASSIFIER_MIN_CONFIDENCE", 0.85))
+
+    # ----------------------------
+    # LLM response cache (tips, prevention advice, repeated chat prompts)
+    # ----------------------------
+    LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE_ENABLED", "1") == "1"
+    LLM_CACHE_TTL = int(os.environ.get("LLM_CACHE_TTL", 7 * 24 * 3600))
+    LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", 2000))
+
+    # ----------------------------
+    # Speculative treatment advice (generated right after a diagnosis)
+    # ----------------------------
+    ADVICE_PREGEN_ENABLED = os.environ.get("ADVICE_PREGEN_ENABLED", "1") == "1"
+    ADVICE_PREGEN_CONCURRENCY = int(os.environ.get("ADVICE_PREGEN_CONCURRENCY", 2))
+    ADVICE_PREGEN_MAX_PENDING = int(os.environ.get("ADVICE_PREGEN_MAX_PENDING", 20))
+
+    # ----------------------------
+    # Chat context (history sent with follow-up questions)
+    # ----------------------------
+    CHAT_CONTEXT_TOKEN_BUDGET = int(os.environ.get("CHAT_CONTEXT_TOKEN_BUDGET", 1500))
+    CHAT_SUMMARY_MAX_TOKENS = int(os.environ.get("CHAT_SUMMARY_MAX_TOKENS", 300))
+
+    # ----------------------------
+    # OpenRouter model routing
+    # ----------------------------
+    OPENROUTER_PRIMARY_MODEL = os.environ.get("OPENROUTER_PRIMARY_MODEL", "anthropic/claude-3.5-sonnet")
+    OPENROUTER_FALLBACK_MODELS = os.environ.get("OPENROUTER_FALLBACK_MODELS", "anthropic/claude-3-haiku")
+    OPENROUTER_DEADLINE = float(os.environ.get("OPENROUTER_DEADLINE", 30))   # seconds per request, all attempts
+
+    MODEL_STATS_WINDOW = int(os.environ.get("MODEL_STATS_WINDOW", 50))
+    MODEL_MIN_SAMPLES = int(os.environ.get("MODEL_MIN_SAMPLES", 5))
+    MODEL_DEGRADED_ERROR_RATE = float(os.environ.get("MODEL_DEGRADED_ERROR_RATE", 0.3))
+    MODEL_DEGRADED_P95 = float(os.environ.get("MODEL_DEGRADED_P95", 12))     # seconds (below the per-attempt share of the deadline)
+    MODEL_SIMPLE_MAX_CHARS = int(os.environ.get("MODEL_SIMPLE_MAX_CHARS", 80))
+    MODEL_PROBE_INTERVAL = float(os.environ.get("MODEL_PROBE_INTERVAL", 60))    # seconds between calls to a degraded primary
+
+    # ----------------------------
+    # External API protection (rate limit + circuit breaker)
+    # ----------------------------
+    KINDWISE_RATE_PER_SEC = float(os.environ.get("KINDWISE_RATE_PER_SEC", 1))
+    KINDWISE_RATE_BURST = int(os.environ.get("KINDWISE_RATE_BURST", 5))
+    OPENROUTER_RATE_PER_SEC = float(os.environ.get("OPENROUTER_RATE_PER_SEC", 2))
+    OPENROUTER_RATE_BURST = int(os.environ.get("OPENROUTER_RATE_BURST", 10))
+
+    BREAKER_ERROR_THRESHOLD = float(os.environ.get("BREAKER_ERROR_THRESHOLD", 0.5))
+    BREAKER_WINDOW = int(os.environ.get("BREAKER_WINDOW", 20))
+    BREAKER_MIN_CALLS = int(os.environ.get("BREAKER_MIN_CALLS", 5))
+    BREAKER_RESET_TIMEOUT = int(os.environ.get("BREAKER_RESET_TIMEOUT", 30))
+
+    # Analyses that failed while the breaker was open are queued in the DB
+    RETRY_POLL_INTERVAL = int(os.environ.get("RETRY_POLL_INTERVAL", 15))
+    RETRY_BACKOFF = int(os.environ.get("RETRY_BACKOFF", 60))
+    RETRY_MAX_ATTEMPTS = int(os.environ.get("RETRY_MAX_ATTEMPTS", 5))
+
+    # ----------------------------
+    # Outbound HTTP connection pools (utils/http_client.py)
+    # ----------------------------
+    HTTP_POOL_CONNECTIONS = int(os.environ.get("HTTP_POOL_CONNECTIONS", 10))
+    HTTP_POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", 10))
+    ESP32_POOL_HOSTS = int(os.environ.get("ESP32_POOL_HOSTS", 64))  # boards kept alive in the esp32 pool
+
     # ----------------------------
     # ESP32 settings
     # ----------------------------
     ESP32_IP = os.environ.get('ESP32_IP')
     ESP32_PORT = int(os.environ.get('ESP32_PORT', 80))
+    DEFAULT_DEVICE_ID = os.environ.get('DEFAULT_DEVICE_ID', 'default')  # id of the board above
+    FLEET_MAX_PARALLEL = int(os.environ.get('FLEET_MAX_PARALLEL', 16))  # concurrent requests across boards
+    DEVICE_QUEUE_MAX = int(os.environ.get('DEVICE_QUEUE_MAX', 20))  # queued commands per board before rejecting
+    DEVICE_COMMAND_TIMEOUT = int(os.environ.get('DEVICE_COMMAND_TIMEOUT', 60))  # seconds a caller waits (queue + run)
+
+    # Background health monitor (utils/device_monitor.py)
+    DEVICE_PROBE_INTERVAL = int(os.environ.get('DEVICE_PROBE_INTERVAL', 30))  # seconds between probes
+    DEVICE_PROBE_MAX_BACKOFF = int(os.environ.get('DEVICE_PROBE_MAX_BACKOFF', 600))  # cap for unreachable boards
+    DEVICE_OFFLINE_AFTER = int(os.environ.get('DEVICE_OFFLINE_AFTER', 2))  # failed probes before "offline"
+    RELAY_RECONCILE_INTERVAL = int(os.environ.get('RELAY_RECONCILE_INTERVAL', 300))  # seconds between relay reads
+    RELAY_STATE_STALE_AFTER = int(os.environ.get('RELAY_STATE_STALE_AFTER', 600))  # cached state flagged stale after
+    CAPTURE_WAIT_TIMEOUT = int(os.environ.get('CAPTURE_WAIT_TIMEOUT', 30))  # seconds for capture → /scan upload
+    SENSOR_READ_TIMEOUT = int(os.environ.get('SENSOR_READ_TIMEOUT', 15))  # seconds for trigger → /sensor push
+    ESP32_SOIL_WINDOW = int(os.environ.get('ESP32_SOIL_WINDOW', 12))  # seconds WiFi may be off for a soil read
+    CAPTURE_SCHEDULER_WORKERS = int(os.environ.get('CAPTURE_SCHEDULER_WORKERS', 4))  # scheduled frames processed at once
+
+    # ----------------------------
+    # Sensor alerts (utils/alerts.py)
+    # ----------------------------
+    ALERT_MOISTURE_LOW = float(os.environ.get('ALERT_MOISTURE_LOW', 20))
+    ALERT_MOISTURE_CLEAR = float(os.environ.get('ALERT_MOISTURE_CLEAR', 25))   # hysteresis
+    ALERT_TEMP_HIGH = float(os.environ.get('ALERT_TEMP_HIGH', 38))
+    ALERT_TEMP_CLEAR = float(os.environ.get('ALERT_TEMP_CLEAR', 35))
+    ALERT_MOISTURE_DROP_RATE = float(os.environ.get('ALERT_MOISTURE_DROP_RATE', 5))  # % per minute
+    ALERT_CONFIRM_READINGS = int(os.environ.get('ALERT_CONFIRM_READINGS', 2))  # debounce
+    ALERT_REMIND_INTERVAL = int(os.environ.get('ALERT_REMIND_INTERVAL', 3600))  # seconds between repeats
+
+    # ----------------------------
+    # Automatic irrigation (utils/irrigation.py)
+    # ----------------------------
+    IRRIGATION_ENABLED = os.environ.get('IRRIGATION_ENABLED', 'false').lower() == 'true'
+    IRRIGATION_MOISTURE_LOW = float(os.environ.get('IRRIGATION_MOISTURE_LOW', 30))  # start watering below
+    IRRIGATION_MOISTURE_HIGH = float(os.environ.get('IRRIGATION_MOISTURE_HIGH', 45))  # stop at / above
+    IRRIGATION_MAX_RUN = int(os.environ.get('IRRIGATION_MAX_RUN', 300))  # seconds a run may last
+    IRRIGATION_MIN_OFF = int(os.environ.get('IRRIGATION_MIN_OFF', 900))  # seconds between runs
+    IRRIGATION_MOISTURE_MAX_AGE = int(os.environ.get('IRRIGATION_MOISTURE_MAX_AGE', 60))  # seconds a soil reading counts
+    IRRIGATION_POLL_INTERVAL = int(os.environ.get('IRRIGATION_POLL_INTERVAL', 60))  # seconds between soil reads while running
+    IRRIGATION_MAX_CYCLES = int(os.environ.get('IRRIGATION_MAX_CYCLES', 3))  # runs in a row short of target before giving up
+    IRRIGATION_LAT = os.environ.get('IRRIGATION_LAT')  # field location for rain suppression
+    IRRIGATION_LON = os.environ.get('IRRIGATION_LON')
+    IRRIGATION_RAIN_LOOKAHEAD = int(os.environ.get('IRRIGATION_RAIN_LOOKAHEAD', 3))  # hours of forecast checked
+    IRRIGATION_WEATHER_REFRESH = int(os.environ.get('IRRIGATION_WEATHER_REFRESH', 1800))  # seconds
 
     # ----------------------------
     # Flask Server (for ESP32 callbacks)
@@ -41,11 +158,22 @@ class Config:
     # ----------------------------
     TELEGRAM_TOKEN = os.environ.get("TELEGRAM_TOKEN")
     TELEGRAM_CHAT_ID = os.environ.get("TELEGRAM_CHAT_ID")
+    TELEGRAM_WORKERS = int(os.environ.get("TELEGRAM_WORKERS", 2))
+    TELEGRAM_SEEN_UPDATES = int(os.environ.get("TELEGRAM_SEEN_UPDATES", 500))  # update_ids kept for dedupe
+
+    # Outbound queue (Telegram allows ~1 msg/s per chat, ~30 msg/s overall)
+    TELEGRAM_CHAT_RATE = float(os.environ.get("TELEGRAM_CHAT_RATE", 1))
+    TELEGRAM_CHAT_BURST = int(os.environ.get("TELEGRAM_CHAT_BURST", 3))
+    TELEGRAM_GLOBAL_RATE = float(os.environ.get("TELEGRAM_GLOBAL_RATE", 25))
+    TELEGRAM_COALESCE_WINDOW = int(os.environ.get("TELEGRAM_COALESCE_WINDOW", 60))  # seconds a status message stays editable
+    TELEGRAM_MAX_RETRIES = int(os.environ.get("TELEGRAM_MAX_RETRIES", 4))
+    TELEGRAM_RETRY_BACKOFF = float(os.environ.get("TELEGRAM_RETRY_BACKOFF", 1))  # seconds, doubled per attempt
+    TELEGRAM_OUTBOX_MAX = int(os.environ.get("TELEGRAM_OUTBOX_MAX", 200))
 
     # ----------------------------
     # Database
     # ----------------------------
-    DATABASE_PATH = os.path.join('database', 'agrisight.db')
+    DATABASE_PATH = os.environ.get('DATABASE_PATH', os.path.join('database', 'agrisight.db'))
 
     # ----------------------------
     # Upload settings
@@ -56,11 +184,13 @@ class Config:
 
 
     # ----------------------------
-    # External API URLs
+    # External API URLs (overridable, e.g. to point at bench/stubs.py)
     # ----------------------------
-    CROP_HEALTH_URL = 'https://crop.kindwise.com/api/v1/identification'
-    OPENROUTER_URL = 'https://openrouter.ai/api/v1/chat/completions'
-    OPENWEATHER_URL = 'https://api.openweathermap.org/data/2.5/weather'
+    CROP_HEALTH_URL = f'{KW_BASE}/identification'
+    OPENROUTER_URL = os.environ.get('OPENROUTER_URL', 'https://openrouter.ai/api/v1/chat/completions')
+    OPENWEATHER_BASE = os.environ.get('OPENWEATHER_BASE', 'https://api.openweathermap.org/data/2.5')
+    OPENWEATHER_URL = f'{OPENWEATHER_BASE}/weather'
+    TELEGRAM_API = os.environ.get('TELEGRAM_API', 'https://api.telegram.org')
 
     # ----------------------------
     # Supported Crop Types
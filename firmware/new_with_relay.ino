@@ -22,6 +22,9 @@ const char* WIFI_PASSWORD = "okname10";
 const char* SERVER_IP   = "10.235.21.235"; // Flask host
 const int   SERVER_PORT = 5000;
 
+// Unique per board (must match the id registered on the server)
+const char* DEVICE_ID   = "default";
+
 // ---------------- PINS ----------------
 #define DHTPIN   13
 #define DHTTYPE  DHT22
@@ -112,7 +115,8 @@ String base64Encode(const uint8_t* data, size_t len) {
 
 // --------------- Sensor actions ------------------
 void sendSensorData(float moisture, float temp, float hum) {
-  String json = String("{\"moisture\":") + String(moisture,1) +
+  String json = String("{\"deviceId\":\"") + DEVICE_ID + "\"" +
+                ",\"moisture\":" + String(moisture,1) +
                 ",\"temperature\":" + String(temp,1) +
                 ",\"humidity\":" + String(hum,1) + "}";
   httpPostJSONLocal("/sensor", json);
@@ -260,8 +264,12 @@ void handleCaptureEndpoint() {
     server.send(500, "application/json", "{\"error\":\"capture_failed\"}");
     return;
   }
-  // send to Flask
-  String json = "{\"imageBase64\":\"" + b64 + "\"}";
+  // send to Flask (echo the server's request id so it can match the upload)
+  String json = "{\"deviceId\":\"" + String(DEVICE_ID) + "\"";
+  if (server.hasArg("request_id")) {
+    json += ",\"requestId\":\"" + server.arg("request_id") + "\"";
+  }
+  json += ",\"imageBase64\":\"" + b64 + "\"}";
   String resp = httpPostJSONLocal("/scan", json);
   server.send(200, "application/json", "{\"ok\":true}");
 }
@@ -279,6 +287,24 @@ void handleReadSoilEndpoint() {
   server.send(200, "application/json", "{\"moisture\":" + String(m,1) + "}");
 }
 
+// DHT + soil in one request and one /sensor push.
+// Replies before WiFi goes off for the soil read; the reading follows via /sensor.
+void handleReadAllEndpoint() {
+  server.sendHeader("Access-Control-Allow-Origin", "*");
+  Serial.println("\n🌡️ Reading DHT22 + Soil…");
+  float h = dht.readHumidity();
+  float t = dht.readTemperature();
+  if (isnan(h) || isnan(t)) {
+    Serial.println("❌ DHT22 read failed");
+    h = -1; t = -1;
+  }
+  server.send(202, "application/json", "{\"ok\":true}");
+  server.client().stop();
+
+  float m = readSoilAndReturnPercent();
+  sendSensorData(m, t, h);
+}
+
 void handleRelayOnEndpoint() {
   server.sendHeader("Access-Control-Allow-Origin", "*");
   relayOn();
@@ -327,6 +353,7 @@ void setup() {
   server.on("/capture", HTTP_POST, handleCaptureEndpoint);
   server.on("/read/dht", HTTP_POST, handleReadDhtEndpoint);
   server.on("/read/soil", HTTP_POST, handleReadSoilEndpoint);
+  server.on("/read/all", HTTP_POST, handleReadAllEndpoint);
   server.on("/relay/on", HTTP_POST, handleRelayOnEndpoint);
   server.on("/relay/off", HTTP_POST, handleRelayOffEndpoint);
   server.on("/relay/status", HTTP_GET, handleRelayStatusEndpoint);
@@ -348,6 +375,7 @@ void setup() {
   Serial.println("• /capture  (POST)");
   Serial.println("• /read/dht (POST)");
   Serial.println("• /read/soil (POST)");
+  Serial.println("• /read/all (POST)");
   Serial.println("• /relay/on (POST)");
   Serial.println("• /relay/off (POST)");
   Serial.println("• /relay/status (GET)");
@@ -7,3 +7,6 @@ from .weather import weather_bp
 from .gallery import gallery_bp
 from .telegram import telegram_bp
 from .config_routes import config_bp
+from .monitor import monitor_bp
+from .devices import devices_bp
+from .schedules import schedules_bp
@@ -1,7 +1,12 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from datetime import datetime
-from utils.ai_helper import get_ai_response
-from utils.db import get_db_connection
+import itertools
+import json
+from utils.ai_helper import get_ai_response, stream_ai_response
+from utils.advice_pregen import STANDARD_ADVICE_PROMPT, stored_advice
+from utils.chat_context import build_history, schedule_compaction
+from utils.db import get_db_connection, add_chat, get_scan_advice
+from utils.resilience import ServiceUnavailable
 
 chat_bp = Blueprint('chat', __name__)
 
@@ -21,8 +26,12 @@ def chat_with_ai():
         if not message:
             return jsonify({'error': 'No message provided'}), 400
 
-        # Call LLM response function
-        response = get_ai_response(message, disease_name, crop_type)
+        # "Treatment options" → the advice pre-generated at diagnosis time;
+        # anything else → LLM (with earlier turns of this scan's chat)
+        response = stored_advice(scan_id, message)
+        if response is None:
+            history = build_history(scan_id)
+            response = get_ai_response(message, disease_name, crop_type, history=history)
 
         # Save chat to DB
         conn = get_db_connection()
@@ -38,11 +47,79 @@ def chat_with_ai():
         conn.commit()
         conn.close()
 
+        schedule_compaction(scan_id)
+
         return jsonify({'response': response})
 
+    except ServiceUnavailable as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+
+def _sse(data, event=None):
+    """Format one Server-Sent Event."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+# -----------------------------------------------------
+# AI CHAT (STREAMING): tokens forwarded as Server-Sent Events
+#   data: {"delta": "..."}           → partial text
+#   event: done  data: {"response"}  → full reply (saved to DB)
+#   event: error data: {"error"}     → stream failed
+# -----------------------------------------------------
+@chat_bp.route('/api/chat/stream', methods=['POST'])
+def chat_with_ai_stream():
+    data = request.get_json()
+    message = data.get('message')
+    disease_name = data.get('disease_name', '')
+    crop_type = data.get('crop_type', 'general')
+    scan_id = data.get('scan_id')
+
+    if not message:
+        return jsonify({'error': 'No message provided'}), 400
+
+    # Wait for the first token here so setup errors still return a proper status
+    try:
+        advice = stored_advice(scan_id, message)
+        if advice is not None:
+            deltas = (part for part in [advice])
+        else:
+            history = build_history(scan_id)
+            deltas = stream_ai_response(message, disease_name, crop_type, history=history)
+        first = next(deltas)
+    except StopIteration:
+        return jsonify({'error': 'Empty response from AI model'}), 500
+    except ServiceUnavailable as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+    def generate():
+        parts = []
+        try:
+            for delta in itertools.chain([first], deltas):
+                parts.append(delta)
+                yield _sse({'delta': delta})
+        except Exception as e:
+            yield _sse({'error': str(e)}, event='error')
+            return
+        finally:
+            # Runs on client disconnect too → cancels the upstream request
+            deltas.close()
+
+        reply = ''.join(parts).strip()
+        add_chat(scan_id, message, reply)
+        schedule_compaction(scan_id)
+        yield _sse({'response': reply}, event='done')
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 
 # -----------------------------------------------------
@@ -63,3 +140,25 @@ def get_chat_history(scan_id):
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+
+# -----------------------------------------------------
+# PRE-GENERATED TREATMENT ADVICE FOR A SCAN
+# status: none | pending | ready | failed
+# -----------------------------------------------------
+@chat_bp.route('/api/chat/advice/<int:scan_id>', methods=['GET'])
+def get_advice(scan_id):
+    try:
+        scan = get_scan_advice(scan_id)
+        if not scan:
+            return jsonify({'error': 'Scan not found'}), 404
+
+        return jsonify({
+            'scan_id': scan_id,
+            'status': scan['advice_status'] or 'none',
+            'prompt': STANDARD_ADVICE_PROMPT,
+            'response': scan['advice']
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -9,5 +9,6 @@ def get_config():
         "ESP32_IP": Config.ESP32_IP,
         "ESP32_PORT": Config.ESP32_PORT,
         "FLASK_IP": Config.FLASK_IP,
-        "FLASK_PORT": Config.FLASK_PORT
+        "FLASK_PORT": Config.FLASK_PORT,
+        "DEFAULT_DEVICE_ID": Config.DEFAULT_DEVICE_ID
     })
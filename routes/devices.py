@@ -0,0 +1,129 @@
+from flask import Blueprint, request, jsonify
+
+from utils.devices import list_devices, get_device, register_device, remove_device, UnknownDevice
+from utils.esp_helper import get_esp32_status, read_all_devices, capture_all_devices
+from utils.device_monitor import get_all_health, probe_now
+
+devices_bp = Blueprint('devices', __name__)
+
+
+# ---------------------------------------------------------
+# DEVICE REGISTRY
+# GET → all boards, POST → add/update { id, ip, port?, name? }
+# ---------------------------------------------------------
+@devices_bp.route('/api/devices', methods=['GET', 'POST'])
+def devices():
+    try:
+        if request.method == 'POST':
+            data = request.get_json() or {}
+            device_id = (data.get('id') or '').strip()
+            ip = (data.get('ip') or '').strip()
+
+            if not device_id or not ip:
+                return jsonify({'error': 'id and ip are required'}), 400
+
+            register_device(device_id, ip, int(data.get('port', 80)), data.get('name'))
+            return jsonify({'success': True, 'device': get_device(device_id)})
+
+        return jsonify(list_devices())
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@devices_bp.route('/api/devices/<device_id>', methods=['DELETE'])
+def delete_device(device_id):
+    try:
+        get_device(device_id)
+        remove_device(device_id)
+        return jsonify({'success': True})
+
+    except UnknownDevice as e:
+        return jsonify({'error': str(e)}), 404
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# ---------------------------------------------------------
+# STATUS FOR UI (one board, ?device_id= or the default)
+# ---------------------------------------------------------
+@devices_bp.route('/api/devices/status', methods=['GET'])
+def device_status():
+    try:
+        device_id = request.args.get('device_id')
+        get_device(device_id)
+        return jsonify(get_esp32_status(device_id))
+
+    except UnknownDevice as e:
+        return jsonify({'error': str(e)}), 404
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# ---------------------------------------------------------
+# FLEET FAN-OUT
+# Optional body/query "device_ids" limits to some boards.
+# ---------------------------------------------------------
+def _selected_devices():
+    body = request.get_json(silent=True) or {}
+    device_ids = body.get('device_ids') or request.args.getlist('device_id') or None
+
+    for device_id in device_ids or []:
+        get_device(device_id)
+
+    return device_ids
+
+
+# ---------------------------------------------------------
+# HEALTH (from the background monitor; ?live=1 probes right now)
+# ---------------------------------------------------------
+@devices_bp.route('/api/devices/health', methods=['GET'])
+def devices_health():
+    try:
+        device_ids = _selected_devices()
+
+        if request.args.get('live') == '1':
+            probe_now(device_ids)
+
+        health = get_all_health()
+        if device_ids:
+            health = {d: health.get(d) for d in device_ids}
+
+        return jsonify(health)
+
+    except UnknownDevice as e:
+        return jsonify({'error': str(e)}), 404
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@devices_bp.route('/api/devices/sensors/read', methods=['POST'])
+def devices_read_sensors():
+    try:
+        body = request.get_json(silent=True) or {}
+        sensors = body.get('sensors') or ['dht', 'soil']
+
+        results = read_all_devices(tuple(sensors), _selected_devices())
+        return jsonify(results)
+
+    except UnknownDevice as e:
+        return jsonify({'error': str(e)}), 404
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@devices_bp.route('/api/devices/capture', methods=['POST'])
+def devices_capture():
+    try:
+        results = capture_all_devices(_selected_devices())
+        return jsonify(results)
+
+    except UnknownDevice as e:
+        return jsonify({'error': str(e)}), 404
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
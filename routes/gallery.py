@@ -1,4 +1,4 @@
-from flask import Blueprint, jsonify, send_from_directory
+from flask import Blueprint, jsonify, request, send_from_directory
 from utils.db import get_db_connection
 import os
 
@@ -13,11 +13,19 @@ UPLOAD_FOLDER = 'static/uploads'
 @gallery_bp.route('/api/gallery', methods=['GET'])
 def get_gallery():
     try:
+        device_id = request.args.get('device_id')
+
         conn = get_db_connection()
-        scans = conn.execute('''
-            SELECT * FROM scans 
-            ORDER BY timestamp DESC
-        ''').fetchall()
+        if device_id:
+            scans = conn.execute('''
+                SELECT * FROM scans WHERE device_id = ?
+                ORDER BY timestamp DESC
+            ''', (device_id,)).fetchall()
+        else:
+            scans = conn.execute('''
+                SELECT * FROM scans 
+                ORDER BY timestamp DESC
+            ''').fetchall()
         conn.close()
 
         return jsonify([dict(row) for row in scans])
@@ -0,0 +1,98 @@
+from flask import Blueprint, jsonify, request
+from datetime import datetime, timedelta
+from utils.resilience import get_services_status
+from utils.db import get_analysis_queue_stats, get_model_usage_stats
+from utils.model_router import model_router
+from utils.llm_cache import get_cache_stats, clear_cache
+from utils.telegram_helper import outbox
+from utils.alerts import alert_engine
+from utils.device_queue import get_queue_stats
+
+monitor_bp = Blueprint('monitor', __name__)
+
+
+# ---------------------------------------------------------
+# EXTERNAL API PROTECTION STATE
+# (circuit breakers, rate limiters, retry queue)
+# ---------------------------------------------------------
+@monitor_bp.route('/api/monitor/resilience', methods=['GET'])
+def resilience_status():
+    try:
+        return jsonify({
+            'services': get_services_status(),
+            'retry_queue': get_analysis_queue_stats()
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# ---------------------------------------------------------
+# LLM RESPONSE CACHE METRICS (DELETE clears the cache)
+# ---------------------------------------------------------
+@monitor_bp.route('/api/monitor/cache', methods=['GET', 'DELETE'])
+def llm_cache_status():
+    try:
+        if request.method == 'DELETE':
+            clear_cache()
+            return jsonify({'success': True})
+
+        return jsonify(get_cache_stats())
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# ---------------------------------------------------------
+# OPENROUTER MODEL ROUTING
+# live rolling stats + DB usage totals (?hours=24)
+# ---------------------------------------------------------
+@monitor_bp.route('/api/monitor/models', methods=['GET'])
+def model_status():
+    try:
+        hours = request.args.get('hours', 24, type=int)
+        since = datetime.now() - timedelta(hours=hours)
+
+        return jsonify({
+            'routing': model_router.snapshot(),
+            'usage': get_model_usage_stats(since)
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# ---------------------------------------------------------
+# TELEGRAM OUTBOUND QUEUE
+# ---------------------------------------------------------
+@monitor_bp.route('/api/monitor/telegram', methods=['GET'])
+def telegram_status():
+    try:
+        return jsonify(outbox.snapshot())
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# ---------------------------------------------------------
+# SENSOR ALERT RULE STATE
+# ---------------------------------------------------------
+@monitor_bp.route('/api/monitor/alerts', methods=['GET'])
+def alert_status():
+    try:
+        return jsonify(alert_engine.snapshot())
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# ---------------------------------------------------------
+# PER-DEVICE COMMAND QUEUES
+# ---------------------------------------------------------
+@monitor_bp.route('/api/monitor/devices', methods=['GET'])
+def device_queue_status():
+    try:
+        return jsonify(get_queue_stats())
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
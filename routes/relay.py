@@ -1,10 +1,12 @@
 from flask import Blueprint, request, jsonify
 from datetime import datetime
-import requests
 
 from utils.db import get_db_connection
-from utils.esp_helper import send_relay_command
+from utils.esp_helper import send_relay_command, get_relay_state
+from utils.relay_state import get_relay_snapshot
+from utils.devices import DEFAULT_DEVICE
 from utils.telegram_helper import tg_send
+from utils.irrigation import irrigation
 from config import Config
 
 relay_bp = Blueprint('relay', __name__)
@@ -19,28 +21,26 @@ def control_relay():
     try:
         data = request.get_json()
         action = data.get('action')  # 'on', 'off', or 'status'
+        device_id = data.get('device_id')  # None = default board
 
         # -----------------------------------
-        # 1️⃣ STATUS REQUEST (dashboard polling)
+        # 1️⃣ STATUS REQUEST (dashboard polling, served from cache)
         # -----------------------------------
         if action == "status":
-            try:
-                esp_url = f"http://{Config.ESP32_IP}:{Config.ESP32_PORT}/relay/status"
-                r = requests.get(esp_url, timeout=4)
-
-                if r.status_code == 200:
-                    state = r.json().get("state", "off")
-                    return jsonify({"success": True, "state": state})
-                else:
-                    return jsonify({"success": False, "state": "off"})
-            except Exception as e:
-                print("Relay status error:", e)
-                return jsonify({"success": False, "state": "off"})
+            snapshot = get_relay_snapshot(device_id or DEFAULT_DEVICE)
+
+            # Nothing known yet (fresh start) → ask the board once
+            if snapshot["state"] is None:
+                if get_relay_state(device_id) is None:
+                    return jsonify({"success": False, "state": "off", "stale": True})
+                snapshot = get_relay_snapshot(device_id or DEFAULT_DEVICE)
+
+            return jsonify({"success": True, **snapshot})
 
         # -----------------------------------
         # 2️⃣ ON / OFF COMMAND TO ESP32
         # -----------------------------------
-        esp_ok = send_relay_command(action)
+        esp_ok = send_relay_command(action, device_id)
 
         #  Log the action
         conn = get_db_connection()
@@ -50,7 +50,7 @@ def control_relay():
         ''', (
             datetime.now(),
             'relay_control',
-            f'pump_{action}'
+            f'pump_{action}' if not device_id else f'pump_{action} ({device_id})'
         ))
         conn.commit()
         conn.close()
@@ -71,3 +71,21 @@ def control_relay():
 
     except Exception as e:
         return jsonify({"error": str(e), "success": False}), 500
+
+
+# ---------------------------------------------------------
+# AUTOMATIC IRRIGATION
+# GET → settings + per-board run state, POST → { enabled: true | false }
+# ---------------------------------------------------------
+@relay_bp.route('/api/irrigation', methods=['GET', 'POST'])
+def irrigation_control():
+    try:
+        if request.method == 'POST':
+            data = request.get_json() or {}
+            if 'enabled' in data:
+                irrigation.enabled = bool(data['enabled'])
+
+        return jsonify(irrigation.snapshot())
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -4,19 +4,19 @@ from datetime import datetime
 import os
 import base64
 
-from utils.db import get_db_connection
-from utils.crop_health import identify_disease
+from utils.db import get_db_connection, add_scan
+from utils.disease_classifier import diagnose_batch
 from utils.image_pipeline import process_image_pipeline
 from utils.telegram_helper import tg_send, tg_send_photo
+from utils.resilience import ServiceUnavailable
+from utils.analysis_queue import queue_analysis
+from utils.advice_pregen import schedule_advice
+from utils.scan_analysis import router_rejection, analyze_scan, AnalysisQueued
+from utils.completions import capture_completions
+from utils.device_monitor import heartbeat
+from utils.devices import DEFAULT_DEVICE, resolve_device_id
 from config import Config
 
-# OPTIONAL (Kindwise Router Integration)
-try:
-    from utils.router import classify as router_classify
-    ROUTER_ENABLED = True
-except:
-    ROUTER_ENABLED = False
-
 scans_bp = Blueprint('scans', __name__)
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
@@ -41,8 +41,11 @@ def esp32_scan_upload():
             return jsonify({'error': 'No image data provided'}), 400
 
         image_bytes = base64.b64decode(image_base64)
+        device_id = resolve_device_id(data.get('deviceId'), request.remote_addr)
 
-        filename = f"esp32_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
+        # Device id in the name so boards uploading in the same second don't collide
+        prefix = 'esp32' if device_id == DEFAULT_DEVICE else f"esp32_{secure_filename(device_id)}"
+        filename = f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
         filepath = os.path.join(UPLOAD_FOLDER, filename)
 
         with open(filepath, 'wb') as f:
@@ -53,26 +56,23 @@ def esp32_scan_upload():
         enhanced_filename = os.path.basename(enhanced_path)
 
         # Save to DB
-        conn = get_db_connection()
-        conn.execute('''
-            INSERT INTO scans (timestamp, image_path, disease, confidence, description)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (
-            datetime.now(),
-            enhanced_filename,
-            'Pending',
-            0.0,
-            'Analysis pending'
-        ))
-        conn.commit()
+        scan_id = add_scan(enhanced_filename, device_id=device_id)
 
-        scan_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
-        conn.close()
+        heartbeat(device_id)
+
+        # Wake up whoever triggered this capture (e.g. Telegram /scan)
+        capture_completions.complete(data.get('requestId'), {
+            'scan_id': scan_id,
+            'filename': enhanced_filename,
+            'path': enhanced_path,
+            'device_id': device_id
+        }, group=device_id)
 
         return jsonify({
             'status': 'success',
             'filename': enhanced_filename,
-            'scan_id': scan_id
+            'scan_id': scan_id,
+            'device_id': device_id
         })
 
     except Exception as e:
@@ -139,64 +139,141 @@ def analyze_image():
             conn.close()
             return jsonify({'error': 'Scan not found'}), 404
 
+        conn.close()
+
         image_path = os.path.join(UPLOAD_FOLDER, scan['image_path'])
 
         # Router Safety Filter
-        if ROUTER_ENABLED:
-            router_out = router_classify(image_path)
-            top_class = list(router_out.keys())[0]
-            top_score = router_out[top_class]
+        rejection = router_rejection(image_path)
+        if rejection:
+            return jsonify({"error": rejection}), 400
+
+        # Disease Detection (queued for later if Kindwise is unavailable)
+        try:
+            result = analyze_scan(scan_id, image_path, crop_type)
+        except AnalysisQueued as e:
+            return jsonify({
+                'error': str(e),
+                'queued': True,
+                'job_id': e.job_id,
+                'scan_id': scan_id
+            }), 503
+
+        # Telegram Alerts
+        try:
+            tg_send(
+                f"🦠 DISEASE DETECTED\n"
+                f"Name: {result.get('disease')}\n"
+                f"Confidence: {result.get('confidence',0)*100:.1f}%"
+            )
+            tg_send_photo(image_path, caption="Leaf Scan Result")
+        except:
+            pass
 
-            # Debug print
-            print("\nROUTER:", router_out, "\n")
+        return jsonify(result)
 
-            # Hard block humans
-            if top_class == "human" and top_score > 0.40:
-                return jsonify({
-                    "error": "Human detected. Upload plant images only."
-                }), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-            # NEW LOGIC — require PLANT CONFIDENCE > 0.70
-            plant_score = router_out.get("plant", 0)
-            unhealthy_score = router_out.get("unhealthy_plant", 0)
-            crop_score = router_out.get("crop", 0)
 
-            max_plant_like = max(plant_score, unhealthy_score, crop_score)
+# =========================================================
+#  ANALYZE BATCH → ONE IDENTIFICATION FOR SEVERAL SCANS
+#  { scan_ids: [1, 2, 3], crop_type: "tomato" }
+# =========================================================
+@scans_bp.route('/api/analyze/batch', methods=['POST'])
+def analyze_batch():
+    try:
+        data = request.get_json()
+        scan_ids = [int(s) for s in data.get('scan_ids') or []]
+        crop_type = data.get('crop_type', 'general')
 
-            if max_plant_like < 0.65:  # 65% threshold
-                return jsonify({
-                    "error": "No plant detected. Please upload a clear leaf photo."
-                }), 400
+        if not scan_ids:
+            return jsonify({'error': 'No scan_ids provided'}), 400
 
+        if len(scan_ids) > Config.KW_MAX_BATCH_IMAGES:
+            return jsonify({
+                'error': f'Too many scans (max {Config.KW_MAX_BATCH_IMAGES})'
+            }), 400
 
-        # Disease Detection
-        result = identify_disease(image_path, crop_type)
+        conn = get_db_connection()
+        placeholders = ','.join('?' * len(scan_ids))
+        rows = conn.execute(
+            f'SELECT id, image_path FROM scans WHERE id IN ({placeholders})',
+            scan_ids
+        ).fetchall()
+        found = {row['id']: row['image_path'] for row in rows}
+
+        missing = [sid for sid in scan_ids if sid not in found]
+        if missing:
+            conn.close()
+            return jsonify({'error': 'Scan not found', 'missing': missing}), 404
+
+        # Router Safety Filter — drop non-plant images from the batch
+        image_paths = {}
+        rejected = []
+        for sid in scan_ids:
+            path = os.path.join(UPLOAD_FOLDER, found[sid])
+            rejection = router_rejection(path)
+            if rejection:
+                rejected.append({'scan_id': sid, 'error': rejection})
+            else:
+                image_paths[sid] = path
+
+        if not image_paths:
+            conn.close()
+            return jsonify({
+                'error': 'No plant detected in any image.',
+                'rejected': rejected
+            }), 400
 
-        # Update DB
-        conn.execute('''
+        # Disease Detection (single request for all images)
+        try:
+            result = diagnose_batch(list(image_paths.values()), crop_type)
+        except ServiceUnavailable as e:
+            conn.close()
+            job_id = queue_analysis(list(image_paths), crop_type, e)
+            return jsonify({
+                'error': str(e),
+                'queued': True,
+                'job_id': job_id,
+                'scan_ids': list(image_paths),
+                'rejected': rejected
+            }), 503
+
+        # Write the combined result back to every scan in the batch
+        conn.executemany('''
             UPDATE scans
-            SET disease = ?, confidence = ?, description = ?
+            SET disease = ?, confidence = ?, description = ?, tier = ?
             WHERE id = ?
-        ''', (
-            result.get('disease', 'Unknown'),
-            result.get('confidence', 0.0),
-            result.get('description', 'No description'),
-            scan_id
-        ))
+        ''', [
+            (
+                result.get('disease', 'Unknown'),
+                result.get('confidence', 0.0),
+                result.get('description', 'No description'),
+                result.get('tier'),
+                sid
+            )
+            for sid in image_paths
+        ])
         conn.commit()
         conn.close()
 
+        # Pre-generate treatment advice for the chat
+        schedule_advice(list(image_paths), result, crop_type)
+
         # Telegram Alerts
         try:
             tg_send(
-                f"🦠 DISEASE DETECTED\n"
+                f"🦠 DISEASE DETECTED ({len(image_paths)} images)\n"
                 f"Name: {result.get('disease')}\n"
                 f"Confidence: {result.get('confidence',0)*100:.1f}%"
             )
-            tg_send_photo(image_path, caption="Leaf Scan Result")
+            tg_send_photo(next(iter(image_paths.values())), caption="Leaf Scan Result")
         except:
             pass
 
+        result['scan_ids'] = list(image_paths)
+        result['rejected'] = rejected
         return jsonify(result)
 
     except Exception as e:
@@ -285,6 +362,7 @@ def delete_scan(scan_id):
 
             conn.execute('DELETE FROM scans WHERE id = ?', (scan_id,))
             conn.execute('DELETE FROM chats WHERE scan_id = ?', (scan_id,))
+            conn.execute('DELETE FROM chat_summaries WHERE scan_id = ?', (scan_id,))
             conn.commit()
 
         conn.close()
@@ -0,0 +1,96 @@
+from flask import Blueprint, request, jsonify
+
+from utils.devices import DEFAULT_DEVICE, get_device, UnknownDevice
+from utils.capture_scheduler import (
+    list_schedules, get_schedule, create_schedule, edit_schedule, remove_schedule,
+    fire, get_scheduler_stats, InvalidSchedule
+)
+
+schedules_bp = Blueprint('schedules', __name__)
+
+
+# ---------------------------------------------------------
+# CAPTURE SCHEDULES
+# GET  → all schedules (with next run)
+# POST → { cron, device_id?, jitter?, crop_type?, label?, enabled? }
+# ---------------------------------------------------------
+@schedules_bp.route('/api/schedules', methods=['GET', 'POST'])
+def schedules():
+    try:
+        if request.method == 'POST':
+            data = request.get_json() or {}
+            device_id = data.get('device_id') or DEFAULT_DEVICE
+            get_device(device_id)
+
+            schedule_id = create_schedule(
+                device_id,
+                data.get('cron'),
+                jitter=data.get('jitter', 0),
+                crop_type=data.get('crop_type', 'general'),
+                label=data.get('label'),
+                enabled=data.get('enabled', True)
+            )
+            return jsonify({'success': True, 'schedule': get_schedule(schedule_id)}), 201
+
+        label = request.args.get('label')
+        result = list_schedules()
+        if label:
+            result = [s for s in result if s['label'] == label]
+
+        return jsonify(result)
+
+    except (InvalidSchedule, UnknownDevice) as e:
+        return jsonify({'error': str(e)}), 400
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@schedules_bp.route('/api/schedules/<int:schedule_id>', methods=['PUT', 'DELETE'])
+def schedule(schedule_id):
+    try:
+        if not get_schedule(schedule_id):
+            return jsonify({'error': 'Schedule not found'}), 404
+
+        if request.method == 'DELETE':
+            remove_schedule(schedule_id)
+            return jsonify({'success': True})
+
+        data = request.get_json() or {}
+        if data.get('device_id'):
+            get_device(data['device_id'])
+
+        edit_schedule(schedule_id, **data)
+        return jsonify({'success': True, 'schedule': get_schedule(schedule_id)})
+
+    except (InvalidSchedule, UnknownDevice) as e:
+        return jsonify({'error': str(e)}), 400
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# ---------------------------------------------------------
+# RUN ONCE NOW (same busy / offline skip as a scheduled tick)
+# ---------------------------------------------------------
+@schedules_bp.route('/api/schedules/<int:schedule_id>/run', methods=['POST'])
+def run_schedule(schedule_id):
+    try:
+        schedule = get_schedule(schedule_id)
+        if not schedule:
+            return jsonify({'error': 'Schedule not found'}), 404
+
+        started = fire(schedule) is not None
+        return jsonify({'success': started, 'skipped': not started}), 202 if started else 409
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@schedules_bp.route('/api/schedules/stats', methods=['GET'])
+def scheduler_stats():
+    try:
+        return jsonify(get_scheduler_stats())
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -1,7 +1,11 @@
 from flask import Blueprint, request, jsonify
 from datetime import datetime
-from utils.db import get_db_connection
-from utils.telegram_helper import tg_send
+from utils.db import get_db_connection, add_sensor_data, get_recent_sensors
+from utils.alerts import alert_engine
+from utils.irrigation import irrigation
+from utils.completions import sensor_readings
+from utils.device_monitor import heartbeat
+from utils.devices import DEFAULT_DEVICE, UnknownDevice, get_device, resolve_device_id
 from config import Config
 
 sensors_bp = Blueprint('sensors', __name__)
@@ -17,12 +21,14 @@ def esp32_sensor_data():
         moisture = data.get('moisture')
         temperature = data.get('temperature')
         humidity = data.get('humidity')
+        device_id = resolve_device_id(data.get('deviceId'), request.remote_addr)
 
-        # Get last recorded values
+        # Get last recorded values for this board
         conn = get_db_connection()
         last_row = conn.execute(
             'SELECT moisture, temperature, humidity FROM sensors '
-            'ORDER BY timestamp DESC LIMIT 1'
+            'WHERE device_id = ? ORDER BY timestamp DESC LIMIT 1',
+            (device_id,)
         ).fetchone()
 
         last_data = dict(last_row) if last_row else {
@@ -40,29 +46,45 @@ def esp32_sensor_data():
 
         # Insert merged data
         conn.execute('''
-            INSERT INTO sensors (timestamp, moisture, temperature, humidity)
-            VALUES (?, ?, ?, ?)
+            INSERT INTO sensors (timestamp, moisture, temperature, humidity, device_id)
+            VALUES (?, ?, ?, ?, ?)
         ''', (
             datetime.now(),
             merged_data["moisture"],
             merged_data["temperature"],
-            merged_data["humidity"]
+            merged_data["humidity"],
+            device_id
         ))
         conn.commit()
         conn.close()
 
-        # Moisture alert via Telegram
+        # A push is as good as a successful health probe
+        heartbeat(device_id)
+
+        # Only what this push actually measured (None / -1 = not measured);
+        # carried-forward values must not count as new readings
+        measured = {
+            field: value
+            for field, value in (("moisture", moisture), ("temperature", temperature), ("humidity", humidity))
+            if value not in [None, -1]
+        }
+
+        # Complete any manual read waiting on this device
+        sensor_readings.publish(device_id, measured)
+
+        # Alert rules (hysteresis / debounce; sent in the background)
         try:
-            if merged_data["moisture"] is not None and merged_data["moisture"] < 20:
-                tg_send(
-                    f"⚠️ LOW MOISTURE ALERT\n"
-                    f"Moisture: {merged_data['moisture']}%\n"
-                    f"Your plant may need watering."
-                )
-        except:
-            pass
+            alert_engine.evaluate(measured, device_id)
+        except Exception as e:
+            print("[Alerts] Evaluation error:", e)
 
-        return jsonify({"status": "success", "data": merged_data})
+        # Closed-loop irrigation (relay switched in the background)
+        try:
+            irrigation.evaluate(measured, device_id)
+        except Exception as e:
+            print("[Irrigation] Evaluation error:", e)
+
+        return jsonify({"status": "success", "device_id": device_id, "data": merged_data})
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -76,60 +98,38 @@ def sensor_data():
     if request.method == 'POST':
         data = request.get_json()
 
-        conn = get_db_connection()
-        conn.execute('''
-            INSERT INTO sensors (timestamp, moisture, temperature, humidity)
-            VALUES (?, ?, ?, ?)
-        ''', (
-            datetime.now(),
+        add_sensor_data(
             data.get('moisture'),
             data.get('temperature'),
-            data.get('humidity')
-        ))
-        conn.commit()
-        conn.close()
+            data.get('humidity'),
+            data.get('device_id') or DEFAULT_DEVICE
+        )
 
         return jsonify({'status': 'success'})
 
     else:
-        conn = get_db_connection()
-        sensors = conn.execute('''
-            SELECT * FROM sensors 
-            ORDER BY timestamp DESC 
-            LIMIT 100
-        ''').fetchall()
-        conn.close()
-
-        return jsonify([dict(row) for row in sensors])
+        # ?device_id= limits to one board; default = all boards
+        return jsonify(get_recent_sensors(100, request.args.get('device_id')))
 
 
 # -----------------------------
-# MANUAL SENSOR READ — SOIL
+# MANUAL SENSOR READ
+# (the reading is stored by /sensor when the ESP32 reports back)
 # -----------------------------
-@sensors_bp.route('/api/sensors/manual/soil', methods=['POST'])
-def read_soil_manual():
+def manual_read(sensors, required=None):
     try:
         from utils.esp_helper import read_sensors
-        sensor_data = read_sensors()
-
-        if sensor_data and sensor_data.get('moisture') is not None:
-            conn = get_db_connection()
-            conn.execute('''
-                INSERT INTO sensors (timestamp, moisture, temperature, humidity)
-                VALUES (?, ?, ?, ?)
-            ''', (
-                datetime.now(),
-                sensor_data['moisture'],
-                sensor_data.get('temperature'),
-                sensor_data.get('humidity')
-            ))
-            conn.commit()
-            conn.close()
+        body = request.get_json(silent=True) or {}
+        device_id = request.args.get('device_id') or body.get('device_id')
+        get_device(device_id)
+        sensor_data = read_sensors(sensors, device_id=device_id)
 
+        if sensor_data and (required is None or sensor_data.get(required) is not None):
             return jsonify({
                 'success': True,
+                'device_id': sensor_data.get('device_id'),
                 'data': {
-                    'moisture': sensor_data['moisture'],
+                    'moisture': sensor_data.get('moisture'),
                     'temperature': sensor_data.get('temperature'),
                     'humidity': sensor_data.get('humidity'),
                     'timestamp': datetime.now()
@@ -138,47 +138,27 @@ def read_soil_manual():
         else:
             return jsonify({'success': False, 'error': 'Failed to read from ESP32'}), 500
 
+    except UnknownDevice as e:
+        return jsonify({'success': False, 'error': str(e)}), 404
+
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+# -----------------------------
+# MANUAL SENSOR READ — SOIL
+# -----------------------------
+@sensors_bp.route('/api/sensors/manual/soil', methods=['POST'])
+def read_soil_manual():
+    return manual_read(("soil",), 'moisture')
+
+
 # -----------------------------
 # MANUAL SENSOR READ — DHT (Temp + Humidity)
 # -----------------------------
 @sensors_bp.route('/api/sensors/manual/dht', methods=['POST'])
 def read_dht_manual():
-    try:
-        from utils.esp_helper import read_sensors
-        sensor_data = read_sensors()
-
-        if sensor_data and sensor_data.get('temperature') is not None:
-            conn = get_db_connection()
-            conn.execute('''
-                INSERT INTO sensors (timestamp, moisture, temperature, humidity)
-                VALUES (?, ?, ?, ?)
-            ''', (
-                datetime.now(),
-                sensor_data.get('moisture'),
-                sensor_data['temperature'],
-                sensor_data.get('humidity')
-            ))
-            conn.commit()
-            conn.close()
-
-            return jsonify({
-                'success': True,
-                'data': {
-                    'moisture': sensor_data.get('moisture'),
-                    'temperature': sensor_data['temperature'],
-                    'humidity': sensor_data.get('humidity'),
-                    'timestamp': datetime.now()
-                }
-            })
-        else:
-            return jsonify({'success': False, 'error': 'Failed to read from ESP32'}), 500
-
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+    return manual_read(("dht",), 'temperature')
 
 
 # -----------------------------
@@ -186,35 +166,4 @@ def read_dht_manual():
 # -----------------------------
 @sensors_bp.route('/api/sensors/manual/all', methods=['POST'])
 def read_all_sensors_manual():
-    try:
-        from utils.esp_helper import read_sensors
-        sensor_data = read_sensors()
-
-        if sensor_data:
-            conn = get_db_connection()
-            conn.execute('''
-                INSERT INTO sensors (timestamp, moisture, temperature, humidity)
-                VALUES (?, ?, ?, ?)
-            ''', (
-                datetime.now(),
-                sensor_data.get('moisture'),
-                sensor_data.get('temperature'),
-                sensor_data.get('humidity')
-            ))
-            conn.commit()
-            conn.close()
-
-            return jsonify({
-                'success': True,
-                'data': {
-                    'moisture': sensor_data.get('moisture'),
-                    'temperature': sensor_data.get('temperature'),
-                    'humidity': sensor_data.get('humidity'),
-                    'timestamp': datetime.now()
-                }
-            })
-        else:
-            return jsonify({'success': False, 'error': 'Failed to read from ESP32'}), 500
-
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+    return manual_read(("dht", "soil"))
@@ -1,40 +1,94 @@
 import os
 import base64
-import requests
-from time import sleep
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from flask import Blueprint, request, jsonify
 
 from config import Config
-from utils.db import get_db_connection, add_scan
-from utils.telegram_helper import tg_send, tg_send_photo
-from utils.esp_helper import send_relay_command, capture_image
+from utils.db import get_db_connection, add_scan, update_scan
+from utils import http_client
+from utils.telegram_helper import tg_send, tg_status, tg_send_photo
+from utils.esp_helper import send_relay_command, capture_and_wait
 from utils.image_pipeline import process_image_pipeline
-from utils.crop_health import identify_disease
+from utils.disease_classifier import diagnose, TIER_LOCAL
+from utils.advice_pregen import schedule_advice
 from utils.router import classify as router_classify
 
 telegram_bp = Blueprint("telegram", __name__)
 
 
+# ---------------------------------------------------------
+# BACKGROUND COMMAND WORKER
+# Telegram redelivers an update if the webhook doesn't answer quickly,
+# so the webhook only queues work and returns; commands run here.
+# ---------------------------------------------------------
+_executor = ThreadPoolExecutor(
+    max_workers=Config.TELEGRAM_WORKERS, thread_name_prefix="telegram-cmd"
+)
+
+# Recently accepted update_ids (oldest first) → redeliveries are dropped
+_seen_updates = OrderedDict()
+_seen_lock = threading.Lock()
+
+# Only one ESP32 capture at a time
+_scan_lock = threading.Lock()
+
+
+def _mark_seen(update_id):
+    """Return True the first time an update_id is seen."""
+    if update_id is None:
+        return True
+
+    with _seen_lock:
+        if update_id in _seen_updates:
+            return False
+
+        _seen_updates[update_id] = True
+        while len(_seen_updates) > Config.TELEGRAM_SEEN_UPDATES:
+            _seen_updates.popitem(last=False)
+        return True
+
+
+def _run_update(data):
+    try:
+        result = handle_update(data)
+        print(f"[Telegram] Update {data.get('update_id')} done:", result)
+    except Exception as e:
+        print(f"[Telegram] Update {data.get('update_id')} failed:", e)
+        tg_send("❌ Error: " + str(e))
+
+
 # ---------------------------------------------------------
 # TELEGRAM WEBHOOK
 # ---------------------------------------------------------
 @telegram_bp.route("/telegram/webhook", methods=["POST"])
 def telegram_webhook():
-    data = request.get_json()
+    data = request.get_json(silent=True) or {}
     print("TELEGRAM UPDATE:", data)
 
-    msg = data.get("message")
-    if not msg:
+    if not data.get("message"):
         return jsonify({"status": "ignored"})
 
+    if not _mark_seen(data.get("update_id")):
+        print(f"[Telegram] Duplicate update {data.get('update_id')} ignored")
+        return jsonify({"status": "duplicate"})
+
+    _executor.submit(_run_update, data)
+    return jsonify({"status": "queued"})
+
+
+def handle_update(data):
+    """Run one Telegram update (called from the worker pool)."""
+    msg = data["message"]
     chat_id = msg["chat"]["id"]
     text = msg.get("text", "")
 
     # Only allow your Telegram chat ID
     if str(chat_id) != str(Config.TELEGRAM_CHAT_ID):
         tg_send("⛔ Unauthorized user tried accessing AgriSight.")
-        return jsonify({"status": "denied"})
+        return {"status": "denied"}
 
     # If user uploads a photo
     if "photo" in msg:
@@ -80,7 +134,13 @@ def telegram_webhook():
         tg_send("🛑 Pump turned OFF")
 
     elif text == "/scan":
-        return process_full_scan()
+        if not _scan_lock.acquire(blocking=False):
+            tg_send("⏳ A scan is already running, please wait.")
+            return {"status": "busy"}
+        try:
+            return process_full_scan()
+        finally:
+            _scan_lock.release()
 
     elif text.startswith("/ask"):
         return process_ai_chat(text)
@@ -88,7 +148,7 @@ def telegram_webhook():
     else:
         tg_send("❓ Unknown command. Use /help.")
 
-    return jsonify({"status": "ok"})
+    return {"status": "ok"}
 
 
 # ---------------------------------------------------------
@@ -99,20 +159,20 @@ def process_ai_chat(text):
         parts = text.split(" ", 1)
         if len(parts) < 2:
             tg_send("❓ Usage: /ask <your question>")
-            return jsonify({"error": "no question"})
+            return {"error": "no question"}
 
         user_msg = parts[1].strip()
-        tg_send("🤖 Thinking…")
+        tg_status("🤖 Thinking…")
 
         from utils.ai_helper import get_ai_response
         ai_reply = get_ai_response(user_msg)
 
         tg_send(f"💬 <b>AI Response</b>\n{ai_reply}", parse_mode="HTML")
-        return jsonify({"ok": True})
+        return {"ok": True}
 
     except Exception as e:
         tg_send("❌ AI error: " + str(e))
-        return jsonify({"error": str(e)})
+        return {"error": str(e)}
 
 
 # ---------------------------------------------------------
@@ -158,44 +218,28 @@ def send_sensor_status():
 # /scan – Trigger capture, wait, then analyze ONLY enhanced image
 # ---------------------------------------------------------
 def process_full_scan():
-    tg_send("📸 Capturing image from ESP32…")
+    tg_status("📸 Capturing image from ESP32…")
 
-    # 1) Trigger ESP32 capture (does NOT enhance)
-    ok = capture_image()
-    if not ok:
+    # 1) Trigger ESP32 capture and wait for ESP32 → Flask /scan → SR → DB insert
+    capture = capture_and_wait()
+    if not capture:
         tg_send("❌ ESP32 failed to capture image.")
-        return jsonify({"error": "capture_failed"})
-
-    # 2) Wait for ESP32 → Flask /scan → SR → DB insert
-    sleep(3)
+        return {"error": "capture_failed"}
 
-    # 3) Fetch the last saved enhanced image from /api/gallery
-    try:
-        gallery = requests.get(f"{Config.TELEGRAM_SERVER_BASE}/api/gallery", timeout=5).json()
+    scan_id = capture["scan_id"]
+    enhanced_path = capture["path"]
 
-        if not gallery:
-            tg_send("❌ No image found in gallery.")
-            return jsonify({"error": "no_image"})
-
-        latest = gallery[0]
-        filename = latest["image_path"]
-        enhanced_path = f"static/uploads/{filename}"
-
-    except Exception as e:
-        tg_send("❌ Could not load gallery.")
-        return jsonify({"error": str(e)})
-
-    # 🔥 4) Send the enhanced image to Telegram (JUST THIS, no re-enhance)
+    # 🔥 2) Send the enhanced image to Telegram (JUST THIS, no re-enhance)
     tg_send_photo(enhanced_path, caption="📸 Enhanced image captured.")
 
-    # 5) Router classification on enhanced image
+    # 3) Router classification on enhanced image
     router_out = router_classify(enhanced_path)
     top_class = max(router_out, key=router_out.get)
     top_score = router_out[top_class]
 
     if top_class == "human" and top_score > 0.40:
         tg_send("🚫 Human detected. Please capture a leaf.")
-        return jsonify({"status": "rejected"})
+        return {"status": "rejected"}
 
     plant_score = max(
         router_out.get("plant", 0),
@@ -205,29 +249,34 @@ def process_full_scan():
 
     if plant_score < 0.65:
         tg_send("⚠️ This does not appear to be a plant leaf.")
-        return jsonify({"status": "not_plant"})
+        return {"status": "not_plant"}
 
-    # 6) Disease detection
-    tg_send("🧠 Analyzing disease…")
-    result = identify_disease(enhanced_path, "general")
+    # 4) Disease detection
+    tg_status("🧠 Analyzing disease…")
+    result = diagnose(enhanced_path, "general")
 
     disease = result.get("disease", "Unknown")
     confidence = result.get("confidence", 0)
 
-    # 7) DB save (scan already saved by Flask)
-    scan_id = add_scan(os.path.basename(enhanced_path))
+    # 5) DB update (scan row already created by /scan)
+    update_scan(
+        scan_id, disease, confidence,
+        result.get("description", "No description"), result.get("tier")
+    )
+    schedule_advice([scan_id], result, "general")
 
-    # 8) Return final result to Telegram
+    # 6) Return final result to Telegram
     caption = (
         f"🌿 <b>Scan Result</b>\n"
         f"Disease: <b>{disease}</b>\n"
         f"Confidence: <b>{confidence*100:.1f}%</b>\n"
+        f"Source: {'on-device model' if result.get('tier') == TIER_LOCAL else 'Kindwise'}\n"
         f"Scan ID: <code>{scan_id}</code>"
     )
 
     tg_send_photo(enhanced_path, caption=caption, parse_mode="HTML")
 
-    return jsonify({"success": True})
+    return {"success": True}
 
 
 # ---------------------------------------------------------
@@ -235,16 +284,19 @@ def process_full_scan():
 # ---------------------------------------------------------
 def process_telegram_photo(msg):
     try:
-        tg_send("📥 Image received. Processing…")
+        tg_status("📥 Image received. Processing…")
 
         file_id = msg["photo"][-1]["file_id"]
-        tele_api = f"https://api.telegram.org/bot{Config.TELEGRAM_TOKEN}"
+        tele_api = f"{Config.TELEGRAM_API}/bot{Config.TELEGRAM_TOKEN}"
 
-        file_info = requests.get(f"{tele_api}/getFile?file_id={file_id}").json()
+        file_info = http_client.get(
+            f"{tele_api}/getFile?file_id={file_id}", service="telegram"
+        ).json()
         file_path = file_info["result"]["file_path"]
 
-        file_bytes = requests.get(
-            f"https://api.telegram.org/file/bot{Config.TELEGRAM_TOKEN}/{file_path}"
+        file_bytes = http_client.get(
+            f"{Config.TELEGRAM_API}/file/bot{Config.TELEGRAM_TOKEN}/{file_path}",
+            service="telegram"
         ).content
 
         filename = f"tg_upload_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
@@ -256,7 +308,7 @@ def process_telegram_photo(msg):
         tg_send_photo(upload_path, caption="📸 Image received.")
 
         # Enhance
-        tg_send("🔄 Enhancing image…")
+        tg_status("🔄 Enhancing image…")
         enhanced_path = process_image_pipeline(upload_path)
 
         # Router classification
@@ -267,7 +319,7 @@ def process_telegram_photo(msg):
         if top_class == "human" and top_score > 0.40:
             tg_send("🚫 Human detected.")
             tg_send_photo(enhanced_path, caption="⚠️ Human detected.")
-            return jsonify({"status": "blocked"})
+            return {"status": "blocked"}
 
         plant_score = max(
             router_out.get("plant", 0),
@@ -278,27 +330,32 @@ def process_telegram_photo(msg):
         if plant_score < 0.65:
             tg_send("⚠️ Not a plant.")
             tg_send_photo(enhanced_path, caption="⚠️ Not a plant.")
-            return jsonify({"status": "blocked"})
+            return {"status": "blocked"}
 
         # Disease detection
-        tg_send("🧠 Analyzing disease…")
-        result = identify_disease(enhanced_path, "general")
+        tg_status("🧠 Analyzing disease…")
+        result = diagnose(enhanced_path, "general")
 
         disease = result.get("disease", "Unknown")
         confidence = result.get("confidence", 0)
 
-        scan_id = add_scan(os.path.basename(enhanced_path))
+        scan_id = add_scan(
+            os.path.basename(enhanced_path), disease, confidence,
+            result.get("description", "No description"), result.get("tier")
+        )
+        schedule_advice([scan_id], result, "general")
 
         caption = (
             f"🌿 <b>Analysis Result</b>\n"
             f"Disease: <b>{disease}</b>\n"
             f"Confidence: <b>{confidence*100:.1f}%</b>\n"
+            f"Source: {'on-device model' if result.get('tier') == TIER_LOCAL else 'Kindwise'}\n"
             f"Scan ID: <code>{scan_id}</code>"
         )
 
         tg_send_photo(enhanced_path, caption=caption, parse_mode="HTML")
-        return jsonify({"success": True})
+        return {"success": True}
 
     except Exception as e:
         tg_send("❌ Error: " + str(e))
-        return jsonify({"error": str(e)})
+        return {"error": str(e)}
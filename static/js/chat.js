@@ -39,7 +39,7 @@ class ChatManager {
         this.addMessageToChat(welcomeMessage);
     }
 
-    setDiseaseContext(disease, cropType) {
+    setDiseaseContext(disease, cropType, scanId = null) {
         this.currentDisease = disease;
         this.currentCropType = cropType;
         
@@ -50,6 +50,36 @@ class ChatManager {
                 content: `I see your ${cropType} plant has been diagnosed with: **${disease}**\n\nI can help you with treatment options and prevention strategies. What would you like to know?`
             };
             this.addMessageToChat(contextMessage);
+
+            if (scanId) {
+                this.loadPregeneratedAdvice(scanId);
+            }
+        }
+    }
+
+    // Show the treatment advice the server pre-generated right after the diagnosis
+    async loadPregeneratedAdvice(scanId, attempts = 20) {
+        try {
+            for (let i = 0; i < attempts; i++) {
+                const response = await fetch(`/api/chat/advice/${scanId}`);
+                const advice = await response.json();
+
+                if (advice.status === 'ready' && advice.response) {
+                    const userMessage = { type: 'user', content: advice.prompt };
+                    const aiMessage = { type: 'ai', content: advice.response };
+
+                    this.addMessageToChat(userMessage);
+                    this.addMessageToChat(aiMessage);
+                    this.chatHistory.push(userMessage, aiMessage);
+                    return;
+                }
+
+                if (advice.status !== 'pending') return;
+
+                await new Promise(resolve => setTimeout(resolve, 1500));
+            }
+        } catch (error) {
+            console.error('Error loading pre-generated advice:', error);
         }
     }
 
@@ -75,8 +105,8 @@ class ChatManager {
         this.showTypingIndicator();
         
         try {
-            // Send to AI API
-            const response = await fetch('/api/chat', {
+            // Send to AI API (streamed as Server-Sent Events)
+            const response = await fetch('/api/chat/stream', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -89,18 +119,41 @@ class ChatManager {
                 })
             });
 
-            const result = await response.json();
-            
-            // Remove typing indicator
+            if (!response.ok || !response.body) {
+                this.removeTypingIndicator();
+                this.showError('Failed to get AI response. Please try again.');
+                return;
+            }
+
+            const aiMessage = {
+                type: 'ai',
+                content: ''
+            };
+            let bubble = null;
+
+            await this.readEventStream(response, (event, data) => {
+                if (event === 'error') {
+                    throw new Error(data.error);
+                }
+
+                if (event === 'done') {
+                    aiMessage.content = data.response;
+                } else if (data.delta) {
+                    aiMessage.content += data.delta;
+                }
+
+                // Replace typing indicator with the growing reply
+                if (!bubble) {
+                    this.removeTypingIndicator();
+                    bubble = this.addMessageToChat(aiMessage);
+                } else {
+                    this.updateMessageBubble(bubble, aiMessage.content);
+                }
+            });
+
             this.removeTypingIndicator();
-            
-            if (result.response) {
-                const aiMessage = {
-                    type: 'ai',
-                    content: result.response
-                };
-                
-                this.addMessageToChat(aiMessage);
+
+            if (aiMessage.content) {
                 this.chatHistory.push(aiMessage);
             } else {
                 this.showError('Failed to get AI response. Please try again.');
@@ -113,6 +166,49 @@ class ChatManager {
         }
     }
 
+    // Parse a text/event-stream body, calling onEvent(eventName, data) per event
+    async readEventStream(response, onEvent) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let event = 'message';
+                let data = '';
+                rawEvent.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) event = line.slice(6).trim();
+                    else if (line.startsWith('data:')) data += line.slice(5).trim();
+                });
+
+                if (data) onEvent(event, JSON.parse(data));
+            }
+        }
+    }
+
+    formatContent(content) {
+        // Format message content (support basic markdown)
+        return content
+            .replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>')
+            .replace(/\*(.*?)\*/g, '<em>$1</em>')
+            .replace(/\n/g, '<br>');
+    }
+
+    updateMessageBubble(bubble, content) {
+        const chatContainer = document.getElementById('chat-container');
+        bubble.innerHTML = this.formatContent(content);
+        chatContainer.scrollTop = chatContainer.scrollHeight;
+    }
+
     addMessageToChat(message) {
         const chatContainer = document.getElementById('chat-container');
         
@@ -126,19 +222,15 @@ class ChatManager {
                 : 'bg-gray-200 text-gray-800'
         }`;
         
-        // Format message content (support basic markdown)
-        let formattedContent = message.content
-            .replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>')
-            .replace(/\*(.*?)\*/g, '<em>$1</em>')
-            .replace(/\n/g, '<br>');
-        
-        messageBubble.innerHTML = formattedContent;
+        messageBubble.innerHTML = this.formatContent(message.content);
         messageDiv.appendChild(messageBubble);
         
         chatContainer.appendChild(messageDiv);
         
         // Scroll to bottom
         chatContainer.scrollTop = chatContainer.scrollHeight;
+
+        return messageBubble;
     }
 
     showTypingIndicator() {
@@ -198,9 +198,10 @@ class DashboardManager {
 
     async updateESP32Status() {
         try {
-            // This would check ESP32 connection status
-            // For now, we'll simulate it
-            const isConnected = Math.random() > 0.3; // 70% chance of being connected
+            // Answered from the server's background health monitor (no ESP32 ping)
+            const response = await fetch('/api/devices/status');
+            const status = await response.json();
+            const isConnected = status.connected === true;
             
             const statusElement = document.getElementById('esp32-status');
             const indicator = statusElement.querySelector('.w-3');
@@ -137,6 +137,13 @@ class RelayManager {
 
             this.updatePumpStatus();
 
+            // Server-cached state that hasn't been confirmed recently
+            if (result.stale) {
+                const pumpText = document.getElementById('pump-text');
+                pumpText.textContent += ' (unconfirmed)';
+                pumpText.title = result.age != null ? `Last confirmed ${Math.round(result.age)}s ago` : 'Not confirmed yet';
+            }
+
         } catch (error) {
             console.error("Pump status load error:", error);
             this.isPumpOn = false;
@@ -1,38 +1,35 @@
 // Sensor and ESP32-CAM control functionality
 class SensorManager {
     constructor() {
-        this.autoCaptureInterval = null;
+        // Auto-capture runs on the server (/api/schedules);
+        // this is the dashboard's own schedule, if one exists
+        this.captureSchedule = null;
 
-        // Will be loaded dynamically from Flask
-        this.ESP32_IP = null;
-        this.ESP32_PORT = 80;
+        // Board targeted by "Capture Now" (server's default until loaded)
+        this.deviceId = null;
 
-        this.loadConfig();
         this.init();
     }
 
     // -------------------------------------------------------
-    // Load ESP32 and Flask config dynamically
-    // -------------------------------------------------------
-    async loadConfig() {
+    init() {
+        this.setupEventListeners();
+        this.loadDeviceId();
+        this.loadCaptureSchedule();
+    }
+
+    async loadDeviceId() {
         try {
             const res = await fetch('/api/config');
-            const cfg = await res.json();
-
-            this.ESP32_IP = cfg.ESP32_IP;
-            this.ESP32_PORT = cfg.ESP32_PORT || 80;
-
-            console.log("✅ Loaded ESP32 config:", this.ESP32_IP, ":", this.ESP32_PORT);
-
+            const config = await res.json();
+            this.deviceId = config.DEFAULT_DEVICE_ID || null;
         } catch (error) {
-            console.error("❌ Failed to load config:", error);
-            this.showNotification("Failed to load system config", "error");
+            console.error('Failed to load device id:', error);
         }
     }
 
-    // -------------------------------------------------------
-    init() {
-        this.setupEventListeners();
+    captureDeviceId() {
+        return this.captureSchedule?.device_id || this.deviceId;
     }
 
     setupEventListeners() {
@@ -57,15 +54,6 @@ class SensorManager {
         });
     }
 
-    // Safety check for ESP32 IP
-    ensureESP() {
-        if (!this.ESP32_IP) {
-            this.showNotification("ESP32 IP not loaded yet", "error");
-            return false;
-        }
-        return true;
-    }
-
     // -------------------------------------------------------
     // 🌱 Soil Moisture Reading
     // (Already via Flask → ESP32)
@@ -147,45 +135,43 @@ class SensorManager {
     }
 
     // -------------------------------------------------------
-    // 📸 Capture Image → Gallery → Analyze
+    // 📸 Capture Image → Analyze
     // -------------------------------------------------------
     async captureImage() {
-        if (!this.ensureESP()) return;
-
         this.showCaptureStatus('Capturing image from ESP32-CAM...');
 
         try {
-            // 1️⃣ Trigger ESP32 capture
-            const response = await fetch(`http://${this.ESP32_IP}:${this.ESP32_PORT}/capture`, {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' }
-            });
+            // 1️⃣ Server triggers the capture on this board and waits for the /scan upload
+            if (!this.deviceId) await this.loadDeviceId();
+            const deviceId = this.captureDeviceId();
 
-            if (!response.ok) {
-                this.showNotification('Failed to trigger ESP32 capture', 'error');
+            if (!deviceId) {
+                this.showNotification('No ESP32 board configured', 'error');
                 this.hideCaptureStatus();
                 return;
             }
 
-            this.showNotification('ESP32 capture triggered', 'success');
-
-            await new Promise(resolve => setTimeout(resolve, 3000));
+            const response = await fetch('/api/devices/capture', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ device_ids: [deviceId] })
+            });
 
-            // 2️⃣ Fetch latest image from gallery
-            const galleryResponse = await fetch('/api/gallery');
-            const gallery = await galleryResponse.json();
+            const results = await response.json();
+            const capture = results ? results[deviceId] : null;
 
-            if (!gallery || gallery.length === 0) {
-                this.showNotification('No image found in gallery', 'error');
+            if (!response.ok || !capture?.scan_id) {
+                this.showNotification('Failed to capture image from ESP32', 'error');
                 this.hideCaptureStatus();
                 return;
             }
 
-            const latestScan = gallery[0];
-            const scanId = latestScan.id;
-            const filename = latestScan.image_path || latestScan.filename;
+            this.showNotification('ESP32 image captured', 'success');
 
-            // 3️⃣ Analyze the image
+            const scanId = capture.scan_id;
+            const filename = capture.filename;
+
+            // 2️⃣ Analyze the image
             this.showCaptureStatus('Analyzing captured image...');
 
             const cropType = document.getElementById('crop-type')?.value || 'general';
@@ -211,7 +197,7 @@ class SensorManager {
             this.updateDashboardAnalysis(filename, result);
 
             if (window.chatManager) {
-                window.chatManager.setDiseaseContext(result.disease, cropType);
+                window.chatManager.setDiseaseContext(result.disease, cropType, scanId);
             }
 
         } catch (error) {
@@ -243,25 +229,80 @@ class SensorManager {
     }
 
     // -------------------------------------------------------
-    // ⏱ Auto Capture
+    // ⏱ Auto Capture (server-side schedule, keeps running with the tab closed)
     // -------------------------------------------------------
-    setAutoCaptureInterval(intervalSeconds) {
-        if (this.autoCaptureInterval) {
-            clearInterval(this.autoCaptureInterval);
-            this.autoCaptureInterval = null;
+    async loadCaptureSchedule() {
+        try {
+            const res = await fetch('/api/schedules?label=dashboard');
+            const schedules = await res.json();
+
+            this.captureSchedule = Array.isArray(schedules) && schedules.length ? schedules[0] : null;
+
+            const select = document.getElementById('capture-interval');
+            if (select && this.captureSchedule?.enabled) {
+                const seconds = this.cronToInterval(this.captureSchedule.cron);
+                if (seconds) select.value = String(seconds);
+            }
+
+        } catch (error) {
+            console.error('Failed to load capture schedule:', error);
         }
+    }
+
+    intervalToCron(seconds) {
+        if (seconds < 3600) return `*/${seconds / 60} * * * *`;
+        return `0 */${seconds / 3600} * * *`;
+    }
+
+    cronToInterval(cron) {
+        let m = /^\*\/(\d+) \* \* \* \*$/.exec(cron);
+        if (m) return parseInt(m[1]) * 60;
 
-        if (intervalSeconds > 0) {
-            this.autoCaptureInterval = setInterval(() => {
-                this.captureImage();
-            }, intervalSeconds * 1000);
+        m = /^0 (?:\*|\*\/(\d+)) \* \* \*$/.exec(cron);
+        if (m) return (parseInt(m[1]) || 1) * 3600;
+
+        return null;
+    }
+
+    async setAutoCaptureInterval(intervalSeconds) {
+        const cropType = document.getElementById('crop-type')?.value || 'general';
+        const body = intervalSeconds > 0
+            ? { cron: this.intervalToCron(intervalSeconds), enabled: true, crop_type: cropType }
+            : { enabled: false };
+
+        try {
+            let response;
+
+            if (this.captureSchedule) {
+                response = await fetch(`/api/schedules/${this.captureSchedule.id}`, {
+                    method: 'PUT',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify(body)
+                });
+            } else if (intervalSeconds > 0) {
+                response = await fetch('/api/schedules', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ ...body, label: 'dashboard', jitter: 30 })
+                });
+            }
+
+            if (response) {
+                const result = await response.json();
+                if (!response.ok) throw new Error(result.error);
+                this.captureSchedule = result.schedule;
+            }
 
             this.showNotification(
-                `Auto-capture every ${this.formatInterval(intervalSeconds)}`,
+                intervalSeconds > 0
+                    ? `Auto-capture every ${this.formatInterval(intervalSeconds)}`
+                    : 'Auto-capture disabled',
                 'info'
             );
-        } else {
-            this.showNotification('Auto-capture disabled', 'info');
+
+        } catch (error) {
+            console.error('Error saving capture schedule:', error);
+            this.showNotification('Failed to save auto-capture schedule', 'error');
         }
     }
 
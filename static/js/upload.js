@@ -217,7 +217,7 @@ class UploadManager {
 
         // Enable AI chat with disease context
         if (window.chatManager) {
-            window.chatManager.setDiseaseContext(result.disease, result.plant_name || 'general');
+            window.chatManager.setDiseaseContext(result.disease, result.plant_name || 'general', this.currentScanId);
         }
 
         this.showAnalysisComplete();
@@ -0,0 +1,58 @@
+import unittest
+from unittest import mock
+
+from utils import ai_helper, model_router as model_router_module
+from utils.model_router import ModelRouter
+from utils.resilience import ProtectedService
+
+PRIMARY = "primary/model"
+FALLBACK = "fallback/model"
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self._body = body or {}
+        self.text = str(self._body)
+
+    def json(self):
+        return self._body
+
+
+def fake_post(url, service=None, headers=None, json=None, timeout=None, **kwargs):
+    """Primary always answers 500, the fallback always answers."""
+    if json["model"] == PRIMARY:
+        return FakeResponse(500, {"error": "upstream error"})
+    return FakeResponse(200, {"choices": [{"message": {"content": "fallback reply"}}], "usage": {}})
+
+
+class PrimaryFailingTest(unittest.TestCase):
+
+    def setUp(self):
+        patches = [
+            mock.patch.object(ai_helper, "openrouter_service", ProtectedService("OpenRouter", 1000, 1000)),
+            mock.patch.object(ai_helper, "model_router", ModelRouter(PRIMARY, [FALLBACK], window=50)),
+            mock.patch.object(model_router_module, "add_model_usage", lambda *a, **k: None),
+            mock.patch.object(ai_helper.http_client, "post", fake_post),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_fallback_keeps_answering_while_primary_fails(self):
+        headers = {"Authorization": "Bearer test"}
+        payload = {"messages": [{"role": "user", "content": "hi"}]}
+
+        for i in range(30):
+            candidates = ai_helper.model_router.candidates()
+            reply, model = ai_helper._complete(headers, payload, candidates)
+            self.assertEqual((reply, model), ("fallback reply", FALLBACK), f"request {i}")
+
+        service = ai_helper.openrouter_service
+        self.assertEqual(service.breaker_for(FALLBACK).state, "closed")
+        self.assertEqual(service.breaker_for(PRIMARY).state, "open")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+from utils.ai_helper import get_ai_response
+from utils.db import set_scan_advice, get_chat_history, add_chat, get_scan_advice
+from utils.llm_cache import normalize_prompt
+
+# ---------------------------------------------------------
+# SPECULATIVE ADVICE PRE-GENERATION
+# Users open the chat right after a diagnosis; generate the standard
+# treatment reply in the background so the first turn is instant.
+# ---------------------------------------------------------
+
+# Same text as the chat "Treatment options" quick action, so that
+# button is answered from the stored advice (see stored_advice).
+STANDARD_ADVICE_PROMPT = "What are the treatment options for this disease?"
+
+NO_ADVICE_DISEASES = {"", "unknown", "pending", "healthy", "no disease detected"}
+
+_executor = ThreadPoolExecutor(
+    max_workers=Config.ADVICE_PREGEN_CONCURRENCY, thread_name_prefix="advice-pregen"
+)
+
+# (disease, crop) → scan ids waiting on that generation
+_inflight = {}
+_lock = threading.Lock()
+
+
+def schedule_advice(scan_ids, result, crop_type="general"):
+    """
+    Queue advice generation for scans that just got a diagnosis.
+    Returns True if a generation was queued (or joined one in flight).
+    """
+    disease = (result.get("disease") or "").strip()
+
+    if not Config.ADVICE_PREGEN_ENABLED or not result.get("success"):
+        return False
+    if disease.lower() in NO_ADVICE_DISEASES:
+        return False
+
+    key = (disease.lower(), (crop_type or "general").lower())
+
+    with _lock:
+        if key in _inflight:
+            _inflight[key].extend(scan_ids)
+            set_scan_advice(scan_ids, "pending")
+            return True
+
+        if len(_inflight) >= Config.ADVICE_PREGEN_MAX_PENDING:
+            print("[Advice] Pre-generation backlog full, skipping", disease)
+            return False
+
+        _inflight[key] = list(scan_ids)
+
+    set_scan_advice(scan_ids, "pending")
+    _executor.submit(_generate, key, disease, crop_type)
+    return True
+
+
+def stored_advice(scan_id, message):
+    """
+    The pre-generated reply if `message` is the standard advice prompt and
+    the scan's advice is ready, else None. Checked before the chat history
+    is built: once the advice is the scan's first turn, the history makes
+    every later call skip the LLM cache.
+    """
+    if not scan_id or normalize_prompt(message) != normalize_prompt(STANDARD_ADVICE_PROMPT):
+        return None
+
+    try:
+        scan = get_scan_advice(scan_id)
+    except Exception as e:
+        print("[Advice] Lookup failed:", e)
+        return None
+
+    if scan and scan['advice_status'] == 'ready' and scan['advice']:
+        return scan['advice']
+    return None
+
+
+def _generate(key, disease, crop_type):
+    try:
+        advice = get_ai_response(STANDARD_ADVICE_PROMPT, disease, crop_type)
+        status = "ready"
+    except Exception as e:
+        print(f"[Advice] Pre-generation failed for {disease}: {e}")
+        advice, status = None, "failed"
+
+    with _lock:
+        scan_ids = _inflight.pop(key, [])
+
+    set_scan_advice(scan_ids, status, advice)
+
+    # Becomes the first chat turn of each scan (unless the user got there first)
+    if advice:
+        for scan_id in scan_ids:
+            if not get_chat_history(scan_id):
+                add_chat(scan_id, STANDARD_ADVICE_PROMPT, advice)
+    print(f"[Advice] {status} for {disease} ({crop_type}) → scans {scan_ids}")
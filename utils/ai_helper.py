@@ -1,13 +1,33 @@
 import requests
+import time
 import json
 from config import Config
+from utils import http_client
+from utils.model_router import model_router, is_simple_query
+from utils.resilience import (
+    openrouter_service, ServiceUnavailable, CircuitOpenError, ClientRequestError, is_client_error
+)
+from utils.llm_cache import get_cached_response, store_response
 
-def get_ai_response(message, disease_name='', crop_type='general'):
-    """
-    Get AI response from OpenRouter (Claude 3.5 Sonnet)
-    """
+def _headers():
     if not Config.OPENROUTER_API_KEY:
         raise Exception("OpenRouter API key not configured")
+
+    return {
+        'Authorization': f'Bearer {Config.OPENROUTER_API_KEY}',
+        'Content-Type': 'application/json',
+        'HTTP-Referer': 'http://localhost:5000',
+        'X-Title': 'AgriSight 2.0'
+    }
+
+
+def _build_request(message, disease_name='', crop_type='general', history=None):
+    """
+    Build OpenRouter headers + payload for an agronomist chat message.
+    history = {"summary": str | None, "turns": [{"user": ..., "ai": ...}]}
+    (see utils/chat_context.py) is sent before the current message.
+    """
+    headers = _headers()
     
     # Prepare context for the AI
     context = f"""
@@ -23,75 +43,314 @@ def get_ai_response(message, disease_name='', crop_type='general'):
     
     Keep responses practical and easy to understand.
     """
-    
-    headers = {
-        'Authorization': f'Bearer {Config.OPENROUTER_API_KEY}',
-        'Content-Type': 'application/json',
-        'HTTP-Referer': 'http://localhost:5000',
-        'X-Title': 'AgriSight 2.0'
-    }
+
+    history = history or {}
+    if history.get('summary'):
+        context += f"""
+    Summary of the earlier conversation:
+    {history['summary']}
+    """
+
+    messages = [{'role': 'system', 'content': context}]
+    for turn in history.get('turns', []):
+        messages.append({'role': 'user', 'content': turn['user']})
+        messages.append({'role': 'assistant', 'content': turn['ai']})
+    messages.append({'role': 'user', 'content': message})
     
     payload = {
-        'model': 'anthropic/claude-3.5-sonnet',
-        'messages': [
-            {
-                'role': 'system',
-                'content': context
-            },
-            {
-                'role': 'user',
-                'content': message
-            }
-        ],
+        'model': Config.OPENROUTER_PRIMARY_MODEL,
+        'messages': messages,
         'temperature': 0.7,
         'max_tokens': 1000
     }
+
+    return headers, payload
+
+
+def _has_history(history):
+    return bool(history and (history.get('summary') or history.get('turns')))
+
+
+def get_ai_response(message, disease_name='', crop_type='general', use_cache=True, history=None):
+    """
+    Get AI response from OpenRouter (primary model, with latency-aware fallback)
+    Repeated prompts for the same disease/crop are answered from the cache
+    (only without conversation history — follow-ups depend on it).
+    """
+    headers, payload = _build_request(message, disease_name, crop_type, history)
+    use_cache = use_cache and not _has_history(history)
+    candidates = model_router.candidates(is_simple_query(message, disease_name, history))
+
+    if use_cache:
+        cached = get_cached_response(message, model_router.primary, disease_name, crop_type)
+        if cached is not None:
+            return cached
     
     try:
-        response = requests.post(
-            Config.OPENROUTER_URL,
-            headers=headers,
-            json=payload,
-            timeout=30
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            
-            if 'choices' in result and result['choices']:
-                ai_message = result['choices'][0]['message']['content']
-
-                # OpenRouter Anthropic responses wrap text in a list of segments
-                if isinstance(ai_message, list):
-                    segments = []
-                    for item in ai_message:
-                        if isinstance(item, dict):
-                            text_value = item.get('text') or ''
-                            segments.append(text_value)
-                        else:
-                            segments.append(str(item))
-                    ai_message = ''.join(segments)
-                elif isinstance(ai_message, dict):
-                    ai_message = ai_message.get('text') or json.dumps(ai_message)
-
-                ai_message = (ai_message or '').strip()
-
-                if not ai_message:
-                    raise Exception("Empty response from AI model")
-
-                return ai_message
-            else:
-                raise Exception("No response from AI model")
+        reply, model = _complete(headers, payload, candidates, purpose='chat')
+    except ServiceUnavailable:
+        raise
+    except Exception as e:
+        raise _wrap_error(e)
+
+    # Stored under the preferred model whichever one answered, so the next
+    # lookup finds it even after a fallback or while routing is degraded
+    if use_cache:
+        store_response(message, model_router.primary, reply, disease_name, crop_type)
+    return reply
+
+
+def _wrap_error(e):
+    if isinstance(e, requests.exceptions.Timeout):
+        return Exception("AI request timed out - please try again")
+    if isinstance(e, requests.exceptions.RequestException):
+        return Exception(f"Network error: {e}")
+    return Exception(f"Error getting AI response: {e}")
+
+
+def _complete(headers, payload, candidates, purpose='chat'):
+    """
+    Try candidate models in order within one overall deadline.
+    Each model has its own circuit breaker; one that's open is skipped.
+    Returns (reply, model that answered).
+    """
+    deadline = time.monotonic() + Config.OPENROUTER_DEADLINE
+    last_error = None
+
+    for index, model in enumerate(candidates):
+        timeout = _attempt_timeout(deadline, len(candidates) - index)
+        if timeout is None:
+            break
+
+        payload = dict(payload, model=model)
+        started = time.monotonic()
+
+        try:
+            reply, usage = openrouter_service.call(
+                _post_completion, headers, payload, timeout, breaker_key=model
+            )
+        except CircuitOpenError as e:
+            print(f"[Models] {model} skipped: {e}")
+            last_error = e
+            continue
+        except ServiceUnavailable:
+            raise
+        except Exception as e:
+            model_router.record(model, time.monotonic() - started, False, purpose=purpose, error=str(e))
+            print(f"[Models] {model} failed: {e}")
+            last_error = e
+            continue
+
+        model_router.record(model, time.monotonic() - started, True, usage, purpose)
+        return reply, model
+
+    raise last_error or requests.exceptions.Timeout("AI request deadline exceeded")
+
+
+def _attempt_timeout(deadline, attempts_left):
+    """
+    Share what's left of the deadline between the remaining candidates, so a
+    primary that hangs still leaves time for the fallback. None = out of time.
+    """
+    remaining = deadline - time.monotonic()
+    if remaining < 1:
+        return None
+    return max(1, remaining / attempts_left)
+
+
+def _raise_for_status(status_code):
+    """4xx (bad key, quota, bad request) is ours, not an OpenRouter outage."""
+    if is_client_error(status_code):
+        raise ClientRequestError(f"AI API request rejected: {status_code}", status_code)
+    raise Exception(f"AI API request failed: {status_code}")
+
+
+def _post_completion(headers, payload, timeout=30):
+    """
+    POST a chat completion to OpenRouter and return (reply text, token usage).
+    Raises on any HTTP or content error (counted by the circuit breaker).
+    """
+    response = http_client.post(
+        Config.OPENROUTER_URL,
+        service='openrouter',
+        headers=headers,
+        json=payload,
+        timeout=(min(5, timeout), timeout)
+    )
+
+    if response.status_code == 200:
+        result = response.json()
+
+        if 'choices' in result and result['choices']:
+            ai_message = result['choices'][0]['message']['content']
+
+            # OpenRouter Anthropic responses wrap text in a list of segments
+            if isinstance(ai_message, list):
+                segments = []
+                for item in ai_message:
+                    if isinstance(item, dict):
+                        text_value = item.get('text') or ''
+                        segments.append(text_value)
+                    else:
+                        segments.append(str(item))
+                ai_message = ''.join(segments)
+            elif isinstance(ai_message, dict):
+                ai_message = ai_message.get('text') or json.dumps(ai_message)
+
+            ai_message = (ai_message or '').strip()
+
+            if not ai_message:
+                raise Exception("Empty response from AI model")
+
+            return ai_message, result.get('usage') or {}
         else:
-            print(f"OpenRouter API Error: {response.status_code} - {response.text}")
-            raise Exception(f"AI API request failed: {response.status_code}")
-            
-    except requests.exceptions.Timeout:
-        raise Exception("AI request timed out - please try again")
-    except requests.exceptions.RequestException as e:
-        raise Exception(f"Network error: {e}")
+            raise Exception("No response from AI model")
+    else:
+        print(f"OpenRouter API Error: {response.status_code} - {response.text}")
+        _raise_for_status(response.status_code)
+
+def stream_ai_response(message, disease_name='', crop_type='general', use_cache=True, history=None):
+    """
+    Stream the AI response from OpenRouter, yielding text deltas as they arrive.
+    Closing the generator (e.g. client disconnected) closes the upstream request.
+    A cached reply is yielded as a single delta.
+    """
+    headers, payload = _build_request(message, disease_name, crop_type, history)
+    use_cache = use_cache and not _has_history(history)
+    payload['stream'] = True
+    candidates = model_router.candidates(is_simple_query(message, disease_name, history))
+
+    if use_cache:
+        cached = get_cached_response(message, model_router.primary, disease_name, crop_type)
+        if cached is not None:
+            yield cached
+            return
+
+    # Open the stream on the first model that accepts it (within the deadline)
+    deadline = time.monotonic() + Config.OPENROUTER_DEADLINE
+    response = None
+    last_error = None
+
+    for index, model in enumerate(candidates):
+        timeout = _attempt_timeout(deadline, len(candidates) - index)
+        if timeout is None:
+            break
+
+        payload['model'] = model
+        started = time.monotonic()
+
+        try:
+            response = openrouter_service.call(
+                _open_stream, headers, payload, timeout, breaker_key=model
+            )
+            break
+        except CircuitOpenError as e:
+            print(f"[Models] {model} skipped: {e}")
+            last_error = e
+        except ServiceUnavailable:
+            raise
+        except Exception as e:
+            model_router.record(model, time.monotonic() - started, False, purpose='stream', error=str(e))
+            print(f"[Models] {model} failed: {e}")
+            last_error = e
+
+    if response is None:
+        if isinstance(last_error, ServiceUnavailable):
+            raise last_error
+        raise _wrap_error(last_error or requests.exceptions.Timeout("AI request deadline exceeded"))
+
+    parts = []
+    usage = None
+    try:
+        for line in response.iter_lines(decode_unicode=True):
+            # SSE: "data: {...}" lines; ": OPENROUTER PROCESSING" keep-alive comments
+            if not line or not line.startswith('data:'):
+                continue
+
+            data = line[len('data:'):].strip()
+            if data == '[DONE]':
+                break
+
+            chunk = json.loads(data)
+            if 'error' in chunk:
+                raise Exception(f"AI stream error: {chunk['error'].get('message', chunk['error'])}")
+
+            # Token usage arrives in the final chunk
+            if chunk.get('usage'):
+                usage = chunk['usage']
+
+            choices = chunk.get('choices') or []
+            delta = choices[0].get('delta', {}).get('content') if choices else None
+            if delta:
+                parts.append(delta)
+                yield delta
+
+        # Only complete replies are cached
+        if use_cache:
+            store_response(message, model_router.primary, ''.join(parts).strip(), disease_name, crop_type)
     except Exception as e:
-        raise Exception(f"Error getting AI response: {e}")
+        model_router.record(model, time.monotonic() - started, False, purpose='stream', error=str(e))
+        raise
+    finally:
+        response.close()
+
+    model_router.record(model, time.monotonic() - started, True, usage, purpose='stream')
+
+
+def _open_stream(headers, payload, timeout=30):
+    """Open a streaming completion; raises unless OpenRouter accepted it."""
+    response = http_client.post(
+        Config.OPENROUTER_URL,
+        service='openrouter',
+        headers=headers,
+        json=payload,
+        stream=True,
+        timeout=(min(5, timeout), timeout)
+    )
+
+    if response.status_code != 200:
+        print(f"OpenRouter API Error: {response.status_code} - {response.text}")
+        response.close()
+        _raise_for_status(response.status_code)
+
+    # text/event-stream carries no charset → iter_lines would yield bytes
+    response.encoding = 'utf-8'
+    return response
+
+
+def summarize_conversation(previous_summary, turns, max_tokens=300):
+    """
+    Compact older chat turns (plus the previous summary) into a short summary
+    used as context for later questions.
+    """
+    transcript = "\n\n".join(
+        f"User: {turn['user']}\nAgronomist: {turn['ai']}" for turn in turns
+    )
+
+    prompt = f"""
+    Summarize this conversation between a farmer and an agronomist so it can
+    be used as context for follow-up questions. Keep the diagnosis, treatments
+    already suggested, what the farmer has tried, and open questions.
+    Be concise (under {max_tokens} tokens).
+
+    Previous summary:
+    {previous_summary or "(none)"}
+
+    New conversation turns:
+    {transcript}
+    """
+
+    payload = {
+        'model': Config.OPENROUTER_PRIMARY_MODEL,
+        'messages': [{'role': 'user', 'content': prompt}],
+        'temperature': 0.2,
+        'max_tokens': max_tokens
+    }
+
+    # Housekeeping task → prefer the fast/cheap model
+    reply, _ = _complete(_headers(), payload, model_router.candidates(simple=True), purpose='summary')
+    return reply
+
 
 def get_agricultural_tips(crop_type='general'):
     """
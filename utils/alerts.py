@@ -0,0 +1,201 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+from utils.db import add_action
+from utils.telegram_helper import tg_send
+
+# ---------------------------------------------------------
+# SENSOR ALERT RULES
+# Evaluated incrementally on every /sensor push. Each rule keeps a
+# small fixed state per device, so evaluation is O(1) per reading.
+# Alerts are sent from a background thread; ingest never waits.
+# ---------------------------------------------------------
+
+
+class ThresholdRule:
+    """
+    Fires when `field` goes below `below` (or above `above`) for `confirm`
+    consecutive readings. Clears only once the value is back past `clear_at`
+    (hysteresis), then a recovery message is sent. While still in alarm,
+    reminders are sent at most every `min_interval` seconds.
+    """
+
+    def __init__(self, name, field, message, below=None, above=None,
+                 clear_at=None, confirm=1, min_interval=3600, recovery=None):
+        self.name = name
+        self.field = field
+        self.message = message
+        self.below = below
+        self.above = above
+        self.clear_at = clear_at if clear_at is not None else (below if below is not None else above)
+        self.confirm = max(1, confirm)
+        self.min_interval = min_interval
+        self.recovery = recovery
+
+    def new_state(self):
+        return {"active": False, "streak": 0, "last_fired": None}
+
+    def _in_alarm(self, value):
+        if self.below is not None:
+            return value < self.below
+        return value > self.above
+
+    def _cleared(self, value):
+        if self.below is not None:
+            return value >= self.clear_at
+        return value <= self.clear_at
+
+    def evaluate(self, state, value, now):
+        """Return an alert text (or None) and update state in place."""
+        if self._in_alarm(value):
+            state["streak"] += 1
+
+            if not state["active"]:
+                if state["streak"] < self.confirm:
+                    return None
+                state["active"] = True
+                state["last_fired"] = now
+                return self.message.format(value=value)
+
+            if now - state["last_fired"] >= self.min_interval:
+                state["last_fired"] = now
+                return self.message.format(value=value)
+            return None
+
+        state["streak"] = 0
+
+        if state["active"] and self._cleared(value):
+            state["active"] = False
+            if self.recovery:
+                return self.recovery.format(value=value)
+
+        return None
+
+
+class RateOfChangeRule:
+    """
+    Fires when `field` changes faster than `max_rate` units per minute
+    (`direction` "down", "up" or "both"), at most every `min_interval` seconds.
+    """
+
+    def __init__(self, name, field, message, max_rate, direction="both", min_interval=1800):
+        self.name = name
+        self.field = field
+        self.message = message
+        self.max_rate = max_rate
+        self.direction = direction
+        self.min_interval = min_interval
+
+    def new_state(self):
+        return {"value": None, "at": None, "last_fired": None}
+
+    def evaluate(self, state, value, now):
+        previous, previous_at = state["value"], state["at"]
+        state["value"], state["at"] = value, now
+
+        if previous is None or now <= previous_at:
+            return None
+
+        rate = (value - previous) / ((now - previous_at) / 60.0)
+
+        if self.direction == "down":
+            triggered = -rate >= self.max_rate
+        elif self.direction == "up":
+            triggered = rate >= self.max_rate
+        else:
+            triggered = abs(rate) >= self.max_rate
+
+        if not triggered:
+            return None
+        if state["last_fired"] is not None and now - state["last_fired"] < self.min_interval:
+            return None
+
+        state["last_fired"] = now
+        return self.message.format(value=value, previous=previous, rate=abs(rate))
+
+
+def default_rules():
+    return [
+        ThresholdRule(
+            "low_moisture", "moisture",
+            "⚠️ LOW MOISTURE ALERT\nMoisture: {value}%\nYour plant may need watering.",
+            below=Config.ALERT_MOISTURE_LOW,
+            clear_at=Config.ALERT_MOISTURE_CLEAR,
+            confirm=Config.ALERT_CONFIRM_READINGS,
+            min_interval=Config.ALERT_REMIND_INTERVAL,
+            recovery="✅ Moisture back to normal: {value}%"
+        ),
+        ThresholdRule(
+            "high_temperature", "temperature",
+            "🌡️ HIGH TEMPERATURE ALERT\nTemperature: {value}°C",
+            above=Config.ALERT_TEMP_HIGH,
+            clear_at=Config.ALERT_TEMP_CLEAR,
+            confirm=Config.ALERT_CONFIRM_READINGS,
+            min_interval=Config.ALERT_REMIND_INTERVAL,
+            recovery="✅ Temperature back to normal: {value}°C"
+        ),
+        RateOfChangeRule(
+            "moisture_drop", "moisture",
+            "📉 Moisture dropping fast: {previous}% → {value}% ({rate:.1f}%/min)\n"
+            "Check the soil sensor or for drainage issues.",
+            max_rate=Config.ALERT_MOISTURE_DROP_RATE,
+            direction="down",
+            min_interval=Config.ALERT_REMIND_INTERVAL
+        ),
+    ]
+
+
+class AlertEngine:
+
+    def __init__(self, rules):
+        self.rules = rules
+        self._state = {}    # (rule name, device id) → rule state
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="alerts")
+
+    def evaluate(self, reading, device_id="default", now=None):
+        """
+        Feed one sensor reading ({field: value}). Returns the alert texts
+        fired by it; they are delivered in the background.
+        """
+        now = now if now is not None else time.time()
+        fired = []
+
+        with self._lock:
+            for rule in self.rules:
+                value = reading.get(rule.field)
+                if value is None:
+                    continue
+
+                key = (rule.name, device_id)
+                state = self._state.get(key)
+                if state is None:
+                    state = self._state[key] = rule.new_state()
+
+                text = rule.evaluate(state, value, now)
+                if text:
+                    fired.append((rule.name, text))
+
+        for name, text in fired:
+            self._executor.submit(self._deliver, name, device_id, text)
+
+        return [text for _, text in fired]
+
+    def _deliver(self, name, device_id, text):
+        try:
+            tg_send(text)
+            add_action("alert", f"{name} ({device_id}): {text.splitlines()[0]}")
+        except Exception as e:
+            print(f"[Alerts] Delivery failed for {name}:", e)
+
+    def snapshot(self):
+        with self._lock:
+            return [
+                {"rule": name, "device_id": device_id, **state}
+                for (name, device_id), state in self._state.items()
+            ]
+
+
+alert_engine = AlertEngine(default_rules())
@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+
+from config import Config
+from utils.crop_health import identify_disease, identify_disease_batch
+from utils.db import (
+    get_db_connection, update_scan, enqueue_analysis, claim_due_analysis,
+    reschedule_analysis, delete_analysis
+)
+from utils.resilience import ServiceUnavailable, kindwise_service
+from utils.telegram_helper import tg_send
+from utils.advice_pregen import schedule_advice
+
+UPLOAD_FOLDER = 'static/uploads'
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+# ---------------------------------------------------------
+# QUEUE AN ANALYSIS THAT COULD NOT RUN NOW
+# ---------------------------------------------------------
+def queue_analysis(scan_ids, crop_type='general', error=None):
+    """Store scans for later analysis and mark them as queued."""
+    job_id = enqueue_analysis(
+        scan_ids, crop_type, str(error) if error else None,
+        delay=kindwise_service.breaker.retry_in()
+    )
+
+    for scan_id in scan_ids:
+        update_scan(scan_id, 'Pending', 0.0, 'Queued for retry (analysis service unavailable)')
+
+    print(f"[Retry] Queued analysis job {job_id} for scans {list(scan_ids)}")
+    return job_id
+
+
+# ---------------------------------------------------------
+# PROCESS ONE DUE JOB
+# ---------------------------------------------------------
+def process_next_job():
+    """
+    Run the oldest due job. Returns True if a job was consumed
+    (so the caller may immediately try the next one).
+    """
+    # Don't even claim work while the breaker is still cooling down
+    if kindwise_service.breaker.retry_in() > 0:
+        return False
+
+    job = claim_due_analysis()
+    if not job:
+        return False
+
+    conn = get_db_connection()
+    placeholders = ','.join('?' * len(job['scan_ids']))
+    rows = conn.execute(
+        f'SELECT id, image_path FROM scans WHERE id IN ({placeholders})',
+        job['scan_ids']
+    ).fetchall()
+    conn.close()
+
+    # Scans may have been deleted while queued
+    image_paths = {row['id']: os.path.join(UPLOAD_FOLDER, row['image_path']) for row in rows}
+    if not image_paths:
+        delete_analysis(job['id'])
+        return True
+
+    try:
+        paths = list(image_paths.values())
+        if len(paths) == 1:
+            result = identify_disease(paths[0], job['crop_type'])
+        else:
+            result = identify_disease_batch(paths, job['crop_type'])
+
+    except ServiceUnavailable as e:
+        # Still unavailable → try again later, doesn't count as an attempt
+        delay = max(kindwise_service.breaker.retry_in(), Config.RETRY_POLL_INTERVAL)
+        reschedule_analysis(job['id'], job['attempts'], delay, str(e))
+        return False
+
+    except Exception as e:
+        attempts = job['attempts'] + 1
+
+        if attempts >= Config.RETRY_MAX_ATTEMPTS:
+            print(f"[Retry] Job {job['id']} dropped after {attempts} attempts: {e}")
+            delete_analysis(job['id'])
+            for scan_id in image_paths:
+                update_scan(scan_id, 'Unknown', 0.0, f'Analysis failed: {e}')
+        else:
+            reschedule_analysis(job['id'], attempts, Config.RETRY_BACKOFF * 2 ** (attempts - 1), str(e))
+        return True
+
+    for scan_id in image_paths:
+        update_scan(
+            scan_id,
+            result.get('disease', 'Unknown'),
+            result.get('confidence', 0.0),
+            result.get('description', 'No description'),
+            tier='kindwise'
+        )
+    delete_analysis(job['id'])
+    schedule_advice(list(image_paths), result, job['crop_type'])
+
+    print(f"[Retry] Job {job['id']} completed → {result.get('disease')}")
+
+    try:
+        tg_send(
+            f"🦠 DISEASE DETECTED (queued scan)\n"
+            f"Name: {result.get('disease')}\n"
+            f"Confidence: {result.get('confidence',0)*100:.1f}%"
+        )
+    except:
+        pass
+
+    return True
+
+
+# ---------------------------------------------------------
+# BACKGROUND WORKER
+# ---------------------------------------------------------
+def _worker_loop():
+    while True:
+        try:
+            while process_next_job():
+                pass
+        except Exception as e:
+            print("[Retry] Worker error:", e)
+
+        time.sleep(Config.RETRY_POLL_INTERVAL)
+
+
+def start_retry_worker():
+    """Start the retry worker thread (once per process)."""
+    global _worker
+
+    with _worker_lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_worker_loop, name="analysis-retry", daemon=True)
+            _worker.start()
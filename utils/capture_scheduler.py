@@ -0,0 +1,313 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from config import Config
+from utils.db import (
+    get_capture_schedules, add_capture_schedule, update_capture_schedule,
+    delete_capture_schedule, record_schedule_run, update_scan
+)
+from utils.scan_analysis import router_rejection, analyze_scan, AnalysisQueued
+from utils.esp_helper import capture_and_wait
+from utils.device_monitor import get_health, OFFLINE
+
+# ---------------------------------------------------------
+# SERVER-SIDE CAPTURE SCHEDULER
+# Schedules live in the capture_schedules table:
+#   cron    "minute hour day month weekday" (*, */n, a-b, a,b)
+#   jitter  up to this many seconds added to each run, so boards on the
+#           same schedule don't all hit the network at once
+# A tick is skipped while the board's previous frame is still being
+# captured / analysed, or while the health monitor has it offline.
+# ---------------------------------------------------------
+
+_CRON_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+_schedules = None       # cached rows, reloaded after every change
+_next_run = {}          # schedule id → epoch seconds
+_in_pipeline = set()    # device ids with a frame in flight
+_stats = {"runs": 0, "skipped": 0, "failed": 0}
+_lock = threading.Lock()
+_worker = None
+
+_executor = ThreadPoolExecutor(
+    max_workers=Config.CAPTURE_SCHEDULER_WORKERS, thread_name_prefix="capture-sched"
+)
+
+
+class InvalidSchedule(ValueError):
+    pass
+
+
+# ---------------------------------------------------------
+# CRON EXPRESSIONS
+# ---------------------------------------------------------
+def _parse_field(field, low, high):
+    values = set()
+
+    for part in field.split(','):
+        step = 1
+        if '/' in part:
+            part, step = part.split('/', 1)
+            step = int(step)
+            if step < 1:
+                raise ValueError("step must be >= 1")
+
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = (int(v) for v in part.split('-', 1))
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+
+        if start < low or end > high or start > end:
+            raise ValueError(f"{part} out of range {low}-{high}")
+
+        values.update(range(start, end + 1, step))
+
+    return values
+
+
+def parse_cron(expr):
+    """Returns (minutes, hours, days, months, weekdays, day_any, weekday_any)."""
+    fields = (expr or '').split()
+    if len(fields) != 5:
+        raise InvalidSchedule("cron needs 5 fields: minute hour day month weekday")
+
+    try:
+        minutes, hours, days, months, weekdays = (
+            _parse_field(f, low, high) for f, (low, high) in zip(fields, _CRON_RANGES)
+        )
+    except ValueError as e:
+        raise InvalidSchedule(f"Invalid cron '{expr}': {e}")
+
+    # 0 and 7 are both Sunday
+    weekdays = {d % 7 for d in weekdays}
+
+    return minutes, hours, days, months, weekdays, fields[2] == '*', fields[4] == '*'
+
+
+def next_cron_time(expr, after):
+    """First minute strictly after `after` (datetime) that matches the expression."""
+    minutes, hours, days, months, weekdays, day_any, weekday_any = parse_cron(expr)
+
+    t = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    limit = t + timedelta(days=5 * 366)  # covers Feb 29
+
+    while t < limit:
+        if t.month not in months:
+            t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            continue
+
+        # Like cron: if both day and weekday are restricted, either may match
+        day_ok = t.day in days
+        weekday_ok = (t.weekday() + 1) % 7 in weekdays
+        if day_any or weekday_any:
+            date_ok = day_ok and weekday_ok
+        else:
+            date_ok = day_ok or weekday_ok
+
+        if not date_ok:
+            t = t.replace(hour=0, minute=0) + timedelta(days=1)
+        elif t.hour not in hours:
+            t = t.replace(minute=0) + timedelta(hours=1)
+        elif t.minute not in minutes:
+            t += timedelta(minutes=1)
+        else:
+            return t
+
+    raise InvalidSchedule(f"Cron '{expr}' never matches")
+
+
+def _plan_next(schedule, after):
+    at = next_cron_time(schedule["cron"], datetime.fromtimestamp(after)).timestamp()
+    return at + random.uniform(0, schedule.get("jitter") or 0)
+
+
+# ---------------------------------------------------------
+# SCHEDULE MANAGEMENT (DB + cache)
+# ---------------------------------------------------------
+def _load():
+    global _schedules
+    if _schedules is None:
+        with _lock:
+            if _schedules is None:
+                _schedules = get_capture_schedules()
+    return _schedules
+
+
+def reload_schedules():
+    global _schedules
+    with _lock:
+        _schedules = None
+        _next_run.clear()
+
+
+def list_schedules():
+    with _lock:
+        next_run = dict(_next_run)
+
+    schedules = []
+    for schedule in _load():
+        schedule = dict(schedule)
+        at = next_run.get(schedule["id"])
+        schedule["next_run"] = datetime.fromtimestamp(at).isoformat(timespec="seconds") if at else None
+        schedules.append(schedule)
+    return schedules
+
+
+def get_schedule(schedule_id):
+    for schedule in _load():
+        if schedule["id"] == schedule_id:
+            return schedule
+    return None
+
+
+def create_schedule(device_id, cron, jitter=0, crop_type='general', label=None, enabled=True):
+    next_cron_time(cron, datetime.now())    # raises InvalidSchedule
+    schedule_id = add_capture_schedule(device_id, cron, int(jitter), crop_type, label, enabled)
+    reload_schedules()
+    return schedule_id
+
+
+def edit_schedule(schedule_id, **fields):
+    if fields.get("cron") is not None:
+        next_cron_time(fields["cron"], datetime.now())
+    if fields.get("jitter") is not None:
+        fields["jitter"] = int(fields["jitter"])
+    if "enabled" in fields:
+        fields["enabled"] = int(bool(fields["enabled"]))
+
+    update_capture_schedule(schedule_id, **fields)
+    reload_schedules()
+
+
+def remove_schedule(schedule_id):
+    delete_capture_schedule(schedule_id)
+    reload_schedules()
+
+
+# ---------------------------------------------------------
+# ONE SCHEDULED FRAME: capture → router → diagnose → store
+# ---------------------------------------------------------
+def _record(schedule, status):
+    record_schedule_run(schedule["id"], status)
+    # Keep the cached row in step with the table
+    schedule["last_run"] = str(datetime.now())
+    schedule["last_status"] = status
+
+
+def _run_pipeline(schedule):
+    device_id = schedule["device_id"]
+    status = "ok"
+
+    try:
+        capture = capture_and_wait(device_id=device_id)
+
+        if not capture:
+            status = "capture_failed"
+        elif router_rejection(capture["path"]):
+            status = "not_plant"
+            update_scan(capture["scan_id"], "Not a plant", 0.0, "Rejected by router (scheduled capture)")
+        else:
+            try:
+                analyze_scan(capture["scan_id"], capture["path"], schedule.get("crop_type") or "general")
+            except AnalysisQueued:
+                status = "queued"
+
+    except Exception as e:
+        print(f"[Scheduler] Schedule {schedule['id']} failed:", e)
+        status = "error"
+
+    finally:
+        with _lock:
+            _in_pipeline.discard(device_id)
+            if status in ("capture_failed", "error"):
+                _stats["failed"] += 1
+
+    _record(schedule, status)
+    print(f"[Scheduler] Schedule {schedule['id']} ({device_id}) → {status}")
+    return status
+
+
+def fire(schedule):
+    """
+    Start a capture for this schedule unless the board is busy / offline.
+    Returns the Future, or None if the tick was skipped.
+    """
+    device_id = schedule["device_id"]
+    reason = None
+
+    with _lock:
+        if device_id in _in_pipeline:
+            reason = "skipped_busy"
+        elif get_health(device_id)["status"] == OFFLINE:
+            reason = "skipped_offline"
+
+        if reason:
+            _stats["skipped"] += 1
+        else:
+            _in_pipeline.add(device_id)
+            _stats["runs"] += 1
+
+    if reason:
+        print(f"[Scheduler] Schedule {schedule['id']} ({device_id}) {reason}")
+        _record(schedule, reason)
+        return None
+
+    return _executor.submit(_run_pipeline, schedule)
+
+
+def tick(now=None):
+    """Fire every enabled schedule whose time has come. Returns the fired ids."""
+    now = now or time.time()
+    fired = []
+
+    for schedule in _load():
+        if not schedule["enabled"]:
+            continue
+
+        with _lock:
+            due = _next_run.get(schedule["id"])
+            if due is None:
+                _next_run[schedule["id"]] = _plan_next(schedule, now)
+                continue
+            if due > now:
+                continue
+            _next_run[schedule["id"]] = _plan_next(schedule, now)
+
+        fire(schedule)
+        fired.append(schedule["id"])
+
+    return fired
+
+
+def get_scheduler_stats():
+    with _lock:
+        return {**_stats, "in_pipeline": sorted(_in_pipeline)}
+
+
+# ---------------------------------------------------------
+# WORKER THREAD
+# ---------------------------------------------------------
+def _worker_loop():
+    while True:
+        try:
+            tick()
+        except Exception as e:
+            print("[Scheduler] Tick error:", e)
+
+        time.sleep(1)
+
+
+def start_capture_scheduler():
+    """Start the scheduler thread (once per process)."""
+    global _worker
+
+    with _lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_worker_loop, name="capture-scheduler", daemon=True)
+            _worker.start()
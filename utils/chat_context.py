@@ -0,0 +1,111 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+from utils.ai_helper import summarize_conversation
+from utils.db import get_chat_history, get_chat_summary, save_chat_summary
+
+# ---------------------------------------------------------
+# TOKEN-BUDGETED CHAT CONTEXT
+# Recent turns are sent verbatim while they fit the budget; older
+# turns are compacted in the background into a rolling summary, so
+# prompt size stays flat however long the conversation gets.
+# ---------------------------------------------------------
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat-summary")
+_compacting = set()
+_lock = threading.Lock()
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token)."""
+    return len(text or "") // 4 + 1
+
+
+def _turn_tokens(turn):
+    return estimate_tokens(turn['user_message']) + estimate_tokens(turn['ai_response'])
+
+
+def build_history(scan_id, budget=None):
+    """
+    Conversation context for a scan: {"summary": ..., "turns": [...]}.
+    Returns None when the scan has no earlier turns.
+    """
+    if not scan_id:
+        return None
+
+    budget = budget or Config.CHAT_CONTEXT_TOKEN_BUDGET
+    summary = get_chat_summary(scan_id)
+    turns = get_chat_history(scan_id, after_id=summary['upto_chat_id'] if summary else 0)
+
+    used = estimate_tokens(summary['summary']) if summary else 0
+
+    # Newest turns first, until the budget is spent
+    selected = []
+    for turn in reversed(turns):
+        cost = _turn_tokens(turn)
+        if used + cost > budget:
+            break
+        selected.append({'user': turn['user_message'], 'ai': turn['ai_response']})
+        used += cost
+    selected.reverse()
+
+    if not summary and not selected:
+        return None
+
+    return {
+        'summary': summary['summary'] if summary else None,
+        'turns': selected
+    }
+
+
+# ---------------------------------------------------------
+# ROLLING SUMMARY (runs after a reply is saved)
+# ---------------------------------------------------------
+def schedule_compaction(scan_id):
+    """Summarize older turns in the background once they outgrow the budget."""
+    if not scan_id:
+        return
+
+    with _lock:
+        if scan_id in _compacting:
+            return
+        _compacting.add(scan_id)
+
+    _executor.submit(_compact, scan_id)
+
+
+def _compact(scan_id):
+    try:
+        budget = Config.CHAT_CONTEXT_TOKEN_BUDGET
+        summary = get_chat_summary(scan_id)
+        turns = get_chat_history(scan_id, after_id=summary['upto_chat_id'] if summary else 0)
+
+        total = sum(_turn_tokens(turn) for turn in turns)
+        if total <= budget:
+            return
+
+        # Fold the oldest turns into the summary until the rest fits in half the budget
+        to_fold = []
+        for turn in turns[:-1]:
+            if total <= budget // 2:
+                break
+            to_fold.append(turn)
+            total -= _turn_tokens(turn)
+
+        if not to_fold:
+            return
+
+        new_summary = summarize_conversation(
+            summary['summary'] if summary else None,
+            [{'user': t['user_message'], 'ai': t['ai_response']} for t in to_fold],
+            max_tokens=Config.CHAT_SUMMARY_MAX_TOKENS
+        )
+        save_chat_summary(scan_id, new_summary, to_fold[-1]['id'])
+        print(f"[Chat] Scan {scan_id}: compacted {len(to_fold)} turns into summary")
+
+    except Exception as e:
+        print(f"[Chat] Summary failed for scan {scan_id}:", e)
+    finally:
+        with _lock:
+            _compacting.discard(scan_id)
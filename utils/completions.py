@@ -0,0 +1,126 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+# ---------------------------------------------------------
+# IN-PROCESS COMPLETION NOTIFICATIONS
+# A caller that triggers the ESP32 registers a Future under a request id;
+# the route that receives the ESP32's callback completes it, so the caller
+# continues right away instead of sleeping and polling.
+# ---------------------------------------------------------
+
+
+class CompletionRegistry:
+
+    def __init__(self, name):
+        self.name = name
+        self._pending = OrderedDict()     # request id → (Future, group), oldest first
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def expect(self, group=None):
+        """
+        Register a new pending request (group = e.g. the device it targets).
+        Returns (request_id, future).
+        """
+        request_id = f"{self.name}-{int(time.time())}-{next(self._ids)}"
+        future = Future()
+
+        with self._lock:
+            self._pending[request_id] = (future, group)
+
+        return request_id, future
+
+    def complete(self, request_id, value, group=None):
+        """
+        Resolve a pending request. A callback without a request id (old
+        firmware, a browser upload) only resolves a request when it is the
+        single one pending in its group — otherwise it can't be told whose
+        it is. Returns True if someone was waiting.
+        """
+        with self._lock:
+            if not request_id:
+                candidates = [rid for rid, (_, g) in self._pending.items() if g == group]
+                if len(candidates) != 1:
+                    return False
+                request_id = candidates[0]
+            elif request_id not in self._pending:
+                return False
+
+            future, _ = self._pending.pop(request_id)
+
+        future.set_result(value)
+        print(f"[Completion] {request_id} resolved")
+        return True
+
+    def cancel(self, request_id):
+        with self._lock:
+            self._pending.pop(request_id, None)
+
+    def wait(self, request_id, future, timeout):
+        """Block until completed; returns the value or None on timeout."""
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            print(f"[Completion] {request_id} timed out after {timeout}s")
+            return None
+        finally:
+            self.cancel(request_id)
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+
+capture_completions = CompletionRegistry("capture")
+
+
+# ---------------------------------------------------------
+# FRESH SENSOR READINGS
+# /sensor publishes each field it actually measured; a manual read
+# waits until every field it triggered has a value newer than the trigger.
+# ---------------------------------------------------------
+class SensorReadings:
+
+    def __init__(self):
+        self._latest = {}     # device id → {field: (value, time)}
+        self._cond = threading.Condition()
+
+    def publish(self, device_id, reading):
+        """Record measured fields (None / -1 = not measured) and wake waiters."""
+        now = time.time()
+        with self._cond:
+            fields = self._latest.setdefault(device_id, {})
+            for field, value in reading.items():
+                if value not in (None, -1):
+                    fields[field] = (value, now)
+            self._cond.notify_all()
+
+    def wait_for(self, device_id, fields, since, timeout):
+        """
+        Block until all `fields` were published after `since` (time.time()).
+        Returns {field: value} for the fresh fields — partial on timeout,
+        None if nothing fresh arrived.
+        """
+        deadline = time.monotonic() + timeout
+
+        def fresh():
+            latest = self._latest.get(device_id, {})
+            return {f: latest[f][0] for f in fields if f in latest and latest[f][1] >= since}
+
+        with self._cond:
+            while True:
+                values = fresh()
+                remaining = deadline - time.monotonic()
+                if len(values) == len(fields) or remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+        if len(values) < len(fields):
+            print(f"[Completion] Sensor read on {device_id} timed out, got {list(values)}")
+        return values or None
+
+
+sensor_readings = SensorReadings()
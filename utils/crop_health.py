@@ -1,72 +1,142 @@
 import base64
+import io
+import os
 import requests
 import time
+from PIL import Image, ImageOps
 from config import Config
+from utils import http_client
+from utils.resilience import kindwise_service, ClientRequestError, is_client_error
 
+# Read size for streaming base64 (must be a multiple of 3 so chunks concatenate cleanly)
+B64_CHUNK_SIZE = 3 * 64 * 1024
 
-def encode_image_to_base64(image_path):
-    """Convert an image file to a base64-encoded string."""
+
+def prepare_image_for_upload(image_path, max_dim=None, max_bytes=None):
+    """
+    Downsize and re-encode an image for the identification API.
+    Returns a binary file-like object positioned at the start.
+
+    - Images already within max_dim and max_bytes are sent untouched.
+    - Otherwise the image is shrunk to fit max_dim and re-encoded as JPEG,
+      lowering quality (then dimensions) until it fits in max_bytes.
+    """
+    max_dim = max_dim or Config.KW_UPLOAD_MAX_DIM
+    max_bytes = max_bytes or Config.KW_UPLOAD_MAX_BYTES
+    original_size = os.path.getsize(image_path)
+
+    with Image.open(image_path) as img:
+        if (img.format == "JPEG" and max(img.size) <= max_dim
+                and original_size <= max_bytes):
+            return open(image_path, "rb")
+
+        img = ImageOps.exif_transpose(img).convert("RGB")
+
+    img.thumbnail((max_dim, max_dim), Image.LANCZOS)
+
+    quality = 90
+    while True:
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=quality, optimize=True)
+
+        if buf.tell() <= max_bytes or max(img.size) <= 256:
+            break
+
+        if quality > Config.KW_UPLOAD_MIN_QUALITY:
+            quality -= 10
+        else:
+            # Quality floor reached → shrink dimensions instead
+            img = img.resize(
+                (int(img.width * 0.8), int(img.height * 0.8)), Image.LANCZOS
+            )
+
+    print(f"[Kindwise] Upload image {original_size} → {buf.tell()} bytes "
+          f"({img.width}x{img.height}, q={quality})")
+    buf.seek(0)
+    return buf
+
+
+def iter_base64(fileobj, chunk_size=B64_CHUNK_SIZE):
+    """Yield base64 text for a binary file object, chunk by chunk."""
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        yield base64.b64encode(chunk).decode("utf-8")
+
+
+def encode_image_to_base64(image_path, max_dim=None, max_bytes=None):
+    """Prepare an image for upload and return it as a base64-encoded string."""
     try:
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode("utf-8")
+        with prepare_image_for_upload(image_path, max_dim, max_bytes) as fileobj:
+            return "".join(iter_base64(fileobj))
     except Exception as e:
         print(f"Error encoding image: {e}")
         return None
 
 
-def identify_disease(image_path, crop_type="general"):
-    """
-    Identify plant disease using the Kindwise (Crop.Health) async API.
-    Flow:
-      1. POST to /identification → returns either:
-         - 201 (Completed immediately with result)
-         - 200 (Accepted, use token to poll result)
-      2. If token provided, poll /identification/{token} until result is ready.
-    """
-    # ✅ Ensure API key is configured (supports both KINDWISE_API_KEY and CROP_HEALTH_API_KEY)
+def _kindwise_headers():
+    """Build request headers, ensuring the API key is configured."""
+    # ✅ Supports both KINDWISE_API_KEY and CROP_HEALTH_API_KEY
     api_key = Config.KINDWISE_API_KEY or Config.CROP_HEALTH_API_KEY
     if not api_key:
         raise Exception("Kindwise API key not configured")
 
-    # ✅ Encode image
-    image_base64 = encode_image_to_base64(image_path)
-    if not image_base64:
-        raise Exception("Failed to encode image")
-
-    # ✅ Request headers (Kindwise expects 'Api-Key', not 'Authorization')
-    headers = {
+    # ✅ Kindwise expects 'Api-Key', not 'Authorization'
+    return {
         "Api-Key": api_key,
         "Content-Type": "application/json"
     }
 
-    # ✅ Request payload
+
+def _parse_result(data, crop_type):
+    """Extract the top disease + crop suggestion from a Kindwise result."""
+    disease_info = data["result"].get("disease", {}).get("suggestions", [{}])[0]
+    crop_info = data["result"].get("crop", {}).get("suggestions", [{}])[0]
+
+    return {
+        "success": True,
+        "disease": disease_info.get("name", "Unknown"),
+        "confidence": disease_info.get("probability", 0.0),
+        "description": disease_info.get("scientific_name", "No description available"),
+        "plant_name": crop_info.get("name", crop_type)
+    }
+
+
+def _submit_identification(images, headers, crop_type):
+    """
+    Submit one or more base64 images as a single identification.
+    Flow:
+      1. POST to /identification → returns either:
+         - 201 (Completed immediately with result)
+         - 200 (Accepted, use token to poll result)
+      2. If token provided, poll /identification/{token} until result is ready.
+    """
     payload = {
-        "images": [image_base64],
+        "images": images,
         "similar_images": True
     }
 
     try:
-        # Step 1: Submit image for analysis
-        post_res = requests.post(Config.KW_IDENTIFY, headers=headers, json=payload, timeout=30)
-        data = post_res.json()
+        # Step 1: Submit image(s) for analysis
+        post_res = http_client.post(
+            Config.KW_IDENTIFY, service="kindwise", headers=headers, json=payload, timeout=30
+        )
 
         # ✅ Accept both 200 (Accepted) and 201 (Completed)
         if post_res.status_code not in (200, 201):
             print(f"API Error (Step 1): {post_res.status_code} - {post_res.text}")
+            if is_client_error(post_res.status_code):
+                raise ClientRequestError(
+                    f"Kindwise rejected the request: {post_res.status_code}", post_res.status_code
+                )
             raise Exception(f"API request failed: {post_res.status_code}")
 
+        data = post_res.json()
+
         # ✅ Case 1: If result is already ready (201 response)
         if "result" in data and data.get("status") == "COMPLETED":
-            disease_info = data["result"].get("disease", {}).get("suggestions", [{}])[0]
-            crop_info = data["result"].get("crop", {}).get("suggestions", [{}])[0]
-
-            return {
-                "success": True,
-                "disease": disease_info.get("name", "Unknown"),
-                "confidence": disease_info.get("probability", 0.0),
-                "description": disease_info.get("scientific_name", "No description available"),
-                "plant_name": crop_info.get("name", crop_type)
-            }
+            return _parse_result(data, crop_type)
 
         # ✅ Case 2: Asynchronous — poll for result using token
         token = data.get("token")
@@ -76,21 +146,12 @@ def identify_disease(image_path, crop_type="general"):
         for _ in range(10):  # Poll up to 10 times
             time.sleep(1)
             get_url = Config.KW_GET_RESULT.replace("{token}", token)
-            get_res = requests.get(get_url, headers=headers, timeout=20)
+            get_res = http_client.get(get_url, service="kindwise", headers=headers, timeout=20)
 
             if get_res.status_code == 200:
                 data = get_res.json()
                 if "result" in data and data["result"]:
-                    disease_info = data["result"].get("disease", {}).get("suggestions", [{}])[0]
-                    crop_info = data["result"].get("crop", {}).get("suggestions", [{}])[0]
-
-                    return {
-                        "success": True,
-                        "disease": disease_info.get("name", "Unknown"),
-                        "confidence": disease_info.get("probability", 0.0),
-                        "description": disease_info.get("scientific_name", "No description available"),
-                        "plant_name": crop_info.get("name", crop_type)
-                    }
+                    return _parse_result(data, crop_type)
 
             elif get_res.status_code not in (202, 204):
                 print(f"Polling error: {get_res.status_code} - {get_res.text}")
@@ -105,6 +166,8 @@ def identify_disease(image_path, crop_type="general"):
             "plant_name": crop_type
         }
 
+    except ClientRequestError:
+        raise
     except requests.exceptions.Timeout:
         raise Exception("Request timed out - Kindwise API may be slow.")
     except requests.exceptions.RequestException as e:
@@ -113,6 +176,47 @@ def identify_disease(image_path, crop_type="general"):
         raise Exception(f"Error analyzing image: {e}")
 
 
+def identify_disease(image_path, crop_type="general"):
+    """
+    Identify plant disease using the Kindwise (Crop.Health) async API.
+    """
+    headers = _kindwise_headers()
+
+    # ✅ Encode image
+    image_base64 = encode_image_to_base64(image_path)
+    if not image_base64:
+        raise Exception("Failed to encode image")
+
+    return kindwise_service.call(_submit_identification, [image_base64], headers, crop_type)
+
+
+def identify_disease_batch(image_paths, crop_type="general"):
+    """
+    Identify disease from several images of the same plant in ONE request.
+    Kindwise combines all images into a single identification result.
+    """
+    if not image_paths:
+        raise Exception("No images provided")
+
+    if len(image_paths) > Config.KW_MAX_BATCH_IMAGES:
+        raise Exception(
+            f"Too many images in batch (max {Config.KW_MAX_BATCH_IMAGES})"
+        )
+
+    headers = _kindwise_headers()
+
+    images = []
+    for path in image_paths:
+        image_base64 = encode_image_to_base64(path)
+        if not image_base64:
+            raise Exception(f"Failed to encode image: {os.path.basename(path)}")
+        images.append(image_base64)
+
+    result = kindwise_service.call(_submit_identification, images, headers, crop_type)
+    result["image_count"] = len(images)
+    return result
+
+
 def get_supported_crops():
     """Return a list of supported crops."""
     return [
@@ -1,5 +1,7 @@
 import sqlite3
 import os
+import json
+import time
 from datetime import datetime
 from config import Config
 
@@ -21,9 +23,12 @@ def init_db():
             timestamp DATETIME NOT NULL,
             moisture REAL,
             temperature REAL,
-            humidity REAL
+            humidity REAL,
+            device_id TEXT
         )
     ''')
+    _ensure_column(conn, 'sensors', 'device_id', 'TEXT')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_sensors_device ON sensors (device_id, timestamp)')
 
     # -----------------------------
     # Scans Table
@@ -36,7 +41,57 @@ def init_db():
             disease TEXT DEFAULT 'Pending',
             confidence REAL DEFAULT 0.0,
             description TEXT DEFAULT 'Analysis pending',
-            crop_type TEXT DEFAULT 'general'
+            crop_type TEXT DEFAULT 'general',
+            tier TEXT,
+            advice TEXT,
+            advice_status TEXT,
+            device_id TEXT
+        )
+    ''')
+    _ensure_column(conn, 'scans', 'tier', 'TEXT')
+    _ensure_column(conn, 'scans', 'advice', 'TEXT')
+    _ensure_column(conn, 'scans', 'advice_status', 'TEXT')
+    _ensure_column(conn, 'scans', 'device_id', 'TEXT')
+
+    # -----------------------------
+    # Device Registry (ESP32 boards)
+    # -----------------------------
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS devices (
+            id TEXT PRIMARY KEY,
+            name TEXT,
+            ip TEXT NOT NULL,
+            port INTEGER DEFAULT 80,
+            created DATETIME NOT NULL
+        )
+    ''')
+
+    # Rows from before device ids existed belong to the default board
+    conn.execute('UPDATE sensors SET device_id = ? WHERE device_id IS NULL', (Config.DEFAULT_DEVICE_ID,))
+    conn.execute('UPDATE scans SET device_id = ? WHERE device_id IS NULL', (Config.DEFAULT_DEVICE_ID,))
+
+    # The board from .env is always registered as the default device
+    if Config.ESP32_IP:
+        conn.execute('''
+            INSERT OR IGNORE INTO devices (id, name, ip, port, created)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (Config.DEFAULT_DEVICE_ID, 'ESP32', Config.ESP32_IP, Config.ESP32_PORT, datetime.now()))
+
+    # -----------------------------
+    # Capture Schedules (server-side auto-capture)
+    # -----------------------------
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS capture_schedules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            device_id TEXT NOT NULL,
+            cron TEXT NOT NULL,
+            jitter INTEGER DEFAULT 0,
+            crop_type TEXT DEFAULT 'general',
+            label TEXT,
+            enabled INTEGER DEFAULT 1,
+            last_run DATETIME,
+            last_status TEXT,
+            created DATETIME NOT NULL
         )
     ''')
 
@@ -54,6 +109,48 @@ def init_db():
         )
     ''')
 
+    # -----------------------------
+    # Chat Summaries (rolling summary of older turns per scan)
+    # -----------------------------
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS chat_summaries (
+            scan_id INTEGER PRIMARY KEY,
+            summary TEXT NOT NULL,
+            upto_chat_id INTEGER NOT NULL,
+            updated DATETIME NOT NULL,
+            FOREIGN KEY (scan_id) REFERENCES scans (id)
+        )
+    ''')
+
+    # -----------------------------
+    # Model Usage (tokens + latency per OpenRouter call)
+    # -----------------------------
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS model_usage (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp DATETIME NOT NULL,
+            model TEXT NOT NULL,
+            purpose TEXT,
+            prompt_tokens INTEGER,
+            completion_tokens INTEGER,
+            latency_ms INTEGER,
+            success INTEGER NOT NULL,
+            error TEXT
+        )
+    ''')
+
+    # -----------------------------
+    # Telegram file_ids (reuse uploaded photos)
+    # -----------------------------
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS telegram_files (
+            path TEXT PRIMARY KEY,
+            content_hash TEXT NOT NULL,
+            file_id TEXT NOT NULL,
+            updated DATETIME NOT NULL
+        )
+    ''')
+
     # -----------------------------
     # Actions Table
     # -----------------------------
@@ -80,10 +177,51 @@ def init_db():
         )
     ''')
 
+    # -----------------------------
+    # Analysis Retry Queue
+    # (analyses that failed while Kindwise was unavailable)
+    # -----------------------------
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS analysis_queue (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp DATETIME NOT NULL,
+            scan_ids TEXT NOT NULL,
+            crop_type TEXT DEFAULT 'general',
+            attempts INTEGER DEFAULT 0,
+            next_attempt REAL NOT NULL,
+            last_error TEXT
+        )
+    ''')
+
+    # -----------------------------
+    # LLM Response Cache
+    # -----------------------------
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            cache_key TEXT PRIMARY KEY,
+            model TEXT NOT NULL,
+            disease TEXT,
+            crop_type TEXT,
+            prompt TEXT NOT NULL,
+            response TEXT NOT NULL,
+            created REAL NOT NULL,
+            last_used REAL NOT NULL,
+            hits INTEGER DEFAULT 0
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache (last_used)')
+
     conn.commit()
     conn.close()
 
 
+def _ensure_column(conn, table, column, definition):
+    """Add a column to an existing table (for databases created before it existed)."""
+    columns = [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+    if column not in columns:
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+
 # ---------------------------------------------------------
 # CONNECTION WRAPPER
 # ---------------------------------------------------------
@@ -96,39 +234,59 @@ def get_db_connection():
 # ---------------------------------------------------------
 # HELPER FUNCTIONS
 # ---------------------------------------------------------
-def add_sensor_data(moisture, temperature, humidity):
+def add_sensor_data(moisture, temperature, humidity, device_id=None):
     conn = get_db_connection()
     conn.execute('''
-        INSERT INTO sensors (timestamp, moisture, temperature, humidity)
-        VALUES (?, ?, ?, ?)
-    ''', (datetime.now(), moisture, temperature, humidity))
+        INSERT INTO sensors (timestamp, moisture, temperature, humidity, device_id)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (datetime.now(), moisture, temperature, humidity, device_id))
     conn.commit()
     conn.close()
 
 
-def add_scan(image_path, disease='Pending', confidence=0.0, description='Analysis pending'):
+def add_scan(image_path, disease='Pending', confidence=0.0, description='Analysis pending',
+             tier=None, device_id=None):
     conn = get_db_connection()
     cursor = conn.execute('''
-        INSERT INTO scans (timestamp, image_path, disease, confidence, description)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (datetime.now(), image_path, disease, confidence, description))
+        INSERT INTO scans (timestamp, image_path, disease, confidence, description, tier, device_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (datetime.now(), image_path, disease, confidence, description, tier, device_id))
     scan_id = cursor.lastrowid
     conn.commit()
     conn.close()
     return scan_id
 
 
-def update_scan(scan_id, disease, confidence, description):
+def update_scan(scan_id, disease, confidence, description, tier=None):
     conn = get_db_connection()
     conn.execute('''
         UPDATE scans 
-        SET disease = ?, confidence = ?, description = ?
+        SET disease = ?, confidence = ?, description = ?, tier = ?
         WHERE id = ?
-    ''', (disease, confidence, description, scan_id))
+    ''', (disease, confidence, description, tier, scan_id))
     conn.commit()
     conn.close()
 
 
+def set_scan_advice(scan_ids, status, advice=None):
+    conn = get_db_connection()
+    conn.executemany('''
+        UPDATE scans SET advice_status = ?, advice = ?
+        WHERE id = ?
+    ''', [(status, advice, scan_id) for scan_id in scan_ids])
+    conn.commit()
+    conn.close()
+
+
+def get_scan_advice(scan_id):
+    conn = get_db_connection()
+    row = conn.execute('''
+        SELECT disease, crop_type, advice, advice_status FROM scans WHERE id = ?
+    ''', (scan_id,)).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+
 def add_chat(scan_id, user_message, ai_response):
     conn = get_db_connection()
     conn.execute('''
@@ -139,6 +297,26 @@ def add_chat(scan_id, user_message, ai_response):
     conn.close()
 
 
+def get_chat_summary(scan_id):
+    conn = get_db_connection()
+    row = conn.execute(
+        'SELECT summary, upto_chat_id FROM chat_summaries WHERE scan_id = ?',
+        (scan_id,)
+    ).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+
+def save_chat_summary(scan_id, summary, upto_chat_id):
+    conn = get_db_connection()
+    conn.execute('''
+        INSERT OR REPLACE INTO chat_summaries (scan_id, summary, upto_chat_id, updated)
+        VALUES (?, ?, ?, ?)
+    ''', (scan_id, summary, upto_chat_id, datetime.now()))
+    conn.commit()
+    conn.close()
+
+
 def add_action(action_type, data):
     conn = get_db_connection()
     conn.execute('''
@@ -149,13 +327,20 @@ def add_action(action_type, data):
     conn.close()
 
 
-def get_recent_sensors(limit=100):
+def get_recent_sensors(limit=100, device_id=None):
     conn = get_db_connection()
-    rows = conn.execute(f'''
-        SELECT * FROM sensors
-        ORDER BY timestamp DESC
-        LIMIT {limit}
-    ''').fetchall()
+
+    if device_id:
+        rows = conn.execute('''
+            SELECT * FROM sensors WHERE device_id = ?
+            ORDER BY timestamp DESC LIMIT ?
+        ''', (device_id, limit)).fetchall()
+    else:
+        rows = conn.execute('''
+            SELECT * FROM sensors
+            ORDER BY timestamp DESC LIMIT ?
+        ''', (limit,)).fetchall()
+
     conn.close()
     return [dict(r) for r in rows]
 
@@ -176,13 +361,13 @@ def get_scans(limit=None):
     return [dict(r) for r in rows]
 
 
-def get_chat_history(scan_id):
+def get_chat_history(scan_id, after_id=0):
     conn = get_db_connection()
     rows = conn.execute('''
         SELECT * FROM chats
-        WHERE scan_id = ?
+        WHERE scan_id = ? AND id > ?
         ORDER BY timestamp ASC
-    ''', (scan_id,)).fetchall()
+    ''', (scan_id, after_id)).fetchall()
     conn.close()
     return [dict(r) for r in rows]
 
@@ -196,3 +381,295 @@ def get_recent_actions(limit=50):
     ''', (limit,)).fetchall()
     conn.close()
     return [dict(r) for r in rows]
+
+
+# ---------------------------------------------------------
+# ANALYSIS RETRY QUEUE
+# ---------------------------------------------------------
+def enqueue_analysis(scan_ids, crop_type='general', error=None, delay=0):
+    conn = get_db_connection()
+    cursor = conn.execute('''
+        INSERT INTO analysis_queue (timestamp, scan_ids, crop_type, next_attempt, last_error)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (datetime.now(), json.dumps(list(scan_ids)), crop_type, time.time() + delay, error))
+    job_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    return job_id
+
+
+def claim_due_analysis(lease=300):
+    """
+    Claim the oldest due job by pushing its next_attempt `lease` seconds
+    ahead, so no other worker picks it up meanwhile. Returns None if idle.
+    """
+    now = time.time()
+    conn = get_db_connection()
+    row = conn.execute('''
+        SELECT * FROM analysis_queue
+        WHERE next_attempt <= ?
+        ORDER BY next_attempt ASC
+        LIMIT 1
+    ''', (now,)).fetchone()
+
+    if not row:
+        conn.close()
+        return None
+
+    claimed = conn.execute('''
+        UPDATE analysis_queue SET next_attempt = ?
+        WHERE id = ? AND next_attempt = ?
+    ''', (now + lease, row['id'], row['next_attempt'])).rowcount
+    conn.commit()
+    conn.close()
+
+    if not claimed:
+        return None
+
+    job = dict(row)
+    job['scan_ids'] = json.loads(job['scan_ids'])
+    return job
+
+
+def reschedule_analysis(job_id, attempts, delay, error):
+    conn = get_db_connection()
+    conn.execute('''
+        UPDATE analysis_queue
+        SET attempts = ?, next_attempt = ?, last_error = ?
+        WHERE id = ?
+    ''', (attempts, time.time() + delay, error, job_id))
+    conn.commit()
+    conn.close()
+
+
+def delete_analysis(job_id):
+    conn = get_db_connection()
+    conn.execute('DELETE FROM analysis_queue WHERE id = ?', (job_id,))
+    conn.commit()
+    conn.close()
+
+
+def get_analysis_queue_stats():
+    conn = get_db_connection()
+    row = conn.execute('''
+        SELECT COUNT(*) AS pending,
+               SUM(CASE WHEN next_attempt <= ? THEN 1 ELSE 0 END) AS due,
+               MIN(timestamp) AS oldest
+        FROM analysis_queue
+    ''', (time.time(),)).fetchone()
+    conn.close()
+    return {
+        'pending': row['pending'],
+        'due': row['due'] or 0,
+        'oldest': row['oldest']
+    }
+
+
+# ---------------------------------------------------------
+# LLM RESPONSE CACHE
+# ---------------------------------------------------------
+def get_llm_cache_entry(cache_key, max_age):
+    """Return a cached response younger than max_age seconds (and mark it used)."""
+    now = time.time()
+    conn = get_db_connection()
+    row = conn.execute('''
+        SELECT response FROM llm_cache
+        WHERE cache_key = ? AND created >= ?
+    ''', (cache_key, now - max_age)).fetchone()
+
+    if row:
+        conn.execute('''
+            UPDATE llm_cache SET last_used = ?, hits = hits + 1
+            WHERE cache_key = ?
+        ''', (now, cache_key))
+        conn.commit()
+
+    conn.close()
+    return row['response'] if row else None
+
+
+def put_llm_cache_entry(cache_key, model, disease, crop_type, prompt, response, max_age, max_entries):
+    """Store a response, then drop expired entries and trim to max_entries (LRU)."""
+    now = time.time()
+    conn = get_db_connection()
+    conn.execute('''
+        INSERT OR REPLACE INTO llm_cache
+            (cache_key, model, disease, crop_type, prompt, response, created, last_used, hits)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)
+    ''', (cache_key, model, disease, crop_type, prompt, response, now, now))
+
+    conn.execute('DELETE FROM llm_cache WHERE created < ?', (now - max_age,))
+    conn.execute('''
+        DELETE FROM llm_cache WHERE cache_key IN (
+            SELECT cache_key FROM llm_cache
+            ORDER BY last_used DESC
+            LIMIT -1 OFFSET ?
+        )
+    ''', (max_entries,))
+    conn.commit()
+    conn.close()
+
+
+def get_llm_cache_stats():
+    conn = get_db_connection()
+    row = conn.execute('''
+        SELECT COUNT(*) AS entries, COALESCE(SUM(hits), 0) AS total_hits
+        FROM llm_cache
+    ''').fetchone()
+    conn.close()
+    return dict(row)
+
+
+def clear_llm_cache():
+    conn = get_db_connection()
+    conn.execute('DELETE FROM llm_cache')
+    conn.commit()
+    conn.close()
+
+
+# ---------------------------------------------------------
+# MODEL USAGE
+# ---------------------------------------------------------
+def add_model_usage(model, purpose, prompt_tokens, completion_tokens, latency_ms, success, error=None):
+    conn = get_db_connection()
+    conn.execute('''
+        INSERT INTO model_usage
+            (timestamp, model, purpose, prompt_tokens, completion_tokens, latency_ms, success, error)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (datetime.now(), model, purpose, prompt_tokens, completion_tokens,
+          latency_ms, int(success), error))
+    conn.commit()
+    conn.close()
+
+
+def get_model_usage_stats(since):
+    """Per-model totals since a datetime."""
+    conn = get_db_connection()
+    rows = conn.execute('''
+        SELECT model,
+               COUNT(*) AS calls,
+               SUM(1 - success) AS errors,
+               COALESCE(SUM(prompt_tokens), 0) AS prompt_tokens,
+               COALESCE(SUM(completion_tokens), 0) AS completion_tokens,
+               AVG(CASE WHEN success THEN latency_ms END) AS avg_latency_ms
+        FROM model_usage
+        WHERE timestamp >= ?
+        GROUP BY model
+    ''', (since,)).fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+
+# ---------------------------------------------------------
+# TELEGRAM FILE_ID CACHE
+# ---------------------------------------------------------
+def get_telegram_file_id(path, content_hash):
+    conn = get_db_connection()
+    row = conn.execute(
+        'SELECT file_id FROM telegram_files WHERE path = ? AND content_hash = ?',
+        (path, content_hash)
+    ).fetchone()
+    conn.close()
+    return row['file_id'] if row else None
+
+
+def save_telegram_file_id(path, content_hash, file_id):
+    conn = get_db_connection()
+    conn.execute('''
+        INSERT OR REPLACE INTO telegram_files (path, content_hash, file_id, updated)
+        VALUES (?, ?, ?, ?)
+    ''', (path, content_hash, file_id, datetime.now()))
+    conn.commit()
+    conn.close()
+
+
+def delete_telegram_file_id(path):
+    conn = get_db_connection()
+    conn.execute('DELETE FROM telegram_files WHERE path = ?', (path,))
+    conn.commit()
+    conn.close()
+
+
+# ---------------------------------------------------------
+# DEVICE REGISTRY
+# ---------------------------------------------------------
+def save_device(device_id, ip, port=80, name=None):
+    conn = get_db_connection()
+    conn.execute('''
+        INSERT INTO devices (id, name, ip, port, created)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(id) DO UPDATE SET name = excluded.name, ip = excluded.ip, port = excluded.port
+    ''', (device_id, name, ip, port, datetime.now()))
+    conn.commit()
+    conn.close()
+
+
+def get_devices():
+    conn = get_db_connection()
+    rows = conn.execute('SELECT * FROM devices ORDER BY id').fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+
+def delete_device(device_id):
+    conn = get_db_connection()
+    conn.execute('DELETE FROM devices WHERE id = ?', (device_id,))
+    conn.commit()
+    conn.close()
+
+
+# ---------------------------------------------------------
+# CAPTURE SCHEDULES
+# ---------------------------------------------------------
+SCHEDULE_FIELDS = ('device_id', 'cron', 'jitter', 'crop_type', 'label', 'enabled')
+
+
+def add_capture_schedule(device_id, cron, jitter=0, crop_type='general', label=None, enabled=True):
+    conn = get_db_connection()
+    cur = conn.execute('''
+        INSERT INTO capture_schedules (device_id, cron, jitter, crop_type, label, enabled, created)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (device_id, cron, jitter, crop_type, label, int(enabled), datetime.now()))
+    conn.commit()
+    schedule_id = cur.lastrowid
+    conn.close()
+    return schedule_id
+
+
+def update_capture_schedule(schedule_id, **fields):
+    fields = {k: v for k, v in fields.items() if k in SCHEDULE_FIELDS}
+    if not fields:
+        return
+
+    assignments = ', '.join(f'{k} = ?' for k in fields)
+    conn = get_db_connection()
+    conn.execute(
+        f'UPDATE capture_schedules SET {assignments} WHERE id = ?',
+        (*fields.values(), schedule_id)
+    )
+    conn.commit()
+    conn.close()
+
+
+def get_capture_schedules():
+    conn = get_db_connection()
+    rows = conn.execute('SELECT * FROM capture_schedules ORDER BY id').fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+
+def delete_capture_schedule(schedule_id):
+    conn = get_db_connection()
+    conn.execute('DELETE FROM capture_schedules WHERE id = ?', (schedule_id,))
+    conn.commit()
+    conn.close()
+
+
+def record_schedule_run(schedule_id, status):
+    conn = get_db_connection()
+    conn.execute(
+        'UPDATE capture_schedules SET last_run = ?, last_status = ? WHERE id = ?',
+        (datetime.now(), status, schedule_id)
+    )
+    conn.commit()
+    conn.close()
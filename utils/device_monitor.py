@@ -0,0 +1,149 @@
+import threading
+import time
+
+from config import Config
+from utils.devices import DEFAULT_DEVICE, list_devices, fan_out
+from utils.esp_helper import ping_device, radio_busy, get_relay_state
+from utils.relay_state import needs_reconcile
+
+# ---------------------------------------------------------
+# BACKGROUND DEVICE HEALTH MONITOR
+# Probes each board on a schedule (backing off while it's unreachable)
+# and keeps status / last-seen / RTT in memory, so status endpoints
+# answer instantly instead of pinging the board per request.
+# Every /sensor or /scan push from a board counts as a heartbeat.
+# Reachable boards also get their relay state reconciled now and then.
+# ---------------------------------------------------------
+
+ONLINE = "online"
+OFFLINE = "offline"
+UNKNOWN = "unknown"
+
+_health = {}        # device id → state dict
+_lock = threading.Lock()
+_worker = None
+
+
+def _new_state():
+    return {
+        "status": UNKNOWN,
+        "last_seen": None,      # epoch seconds of last probe success / heartbeat
+        "last_probe": None,
+        "rtt_ms": None,
+        "failures": 0,
+        "next_probe": 0.0
+    }
+
+
+def _state(device_id):
+    state = _health.get(device_id)
+    if state is None:
+        state = _health[device_id] = _new_state()
+    return state
+
+
+def heartbeat(device_id):
+    """A board talked to us — it's online; no need to probe it for a while."""
+    now = time.time()
+    with _lock:
+        state = _state(device_id)
+        state["status"] = ONLINE
+        state["last_seen"] = now
+        state["failures"] = 0
+        state["next_probe"] = now + Config.DEVICE_PROBE_INTERVAL
+
+
+def record_probe(device_id, rtt):
+    """Store a probe result (rtt in seconds, None = unreachable) and schedule the next."""
+    now = time.time()
+    with _lock:
+        state = _state(device_id)
+        state["last_probe"] = now
+
+        if rtt is not None:
+            state["status"] = ONLINE
+            state["last_seen"] = now
+            state["rtt_ms"] = round(rtt * 1000, 1)
+            state["failures"] = 0
+            state["next_probe"] = now + Config.DEVICE_PROBE_INTERVAL
+            return
+
+        state["failures"] += 1
+        if state["failures"] >= Config.DEVICE_OFFLINE_AFTER:
+            state["status"] = OFFLINE
+
+        backoff = Config.DEVICE_PROBE_INTERVAL * 2 ** (state["failures"] - 1)
+        state["next_probe"] = now + min(backoff, Config.DEVICE_PROBE_MAX_BACKOFF)
+
+
+def _probe(device_id):
+    # Mid soil read the board is offline on purpose — check again later
+    if radio_busy(device_id):
+        with _lock:
+            _state(device_id)["next_probe"] = time.time() + Config.ESP32_SOIL_WINDOW
+        return
+
+    rtt = ping_device(device_id)
+    record_probe(device_id, rtt)
+
+    # Low-frequency relay reconcile (catches manual / firmware-side changes)
+    if rtt is not None and needs_reconcile(device_id):
+        get_relay_state(device_id)
+
+
+def probe_due():
+    """Probe every board whose next probe time has come (concurrently)."""
+    now = time.time()
+    device_ids = [d["id"] for d in list_devices()]
+
+    with _lock:
+        # Forget boards removed from the registry
+        for device_id in list(_health):
+            if device_id not in device_ids:
+                del _health[device_id]
+
+        due = [d for d in device_ids if _state(d)["next_probe"] <= now]
+
+    if due:
+        fan_out(_probe, due)
+    return due
+
+
+def probe_now(device_ids=None):
+    """Probe boards immediately (ignores the schedule)."""
+    if device_ids is None:
+        device_ids = [d["id"] for d in list_devices()]
+    fan_out(_probe, device_ids)
+
+
+def get_health(device_id=None):
+    with _lock:
+        return dict(_health.get(device_id or DEFAULT_DEVICE) or _new_state())
+
+
+def get_all_health():
+    with _lock:
+        return {device_id: dict(state) for device_id, state in _health.items()}
+
+
+# ---------------------------------------------------------
+# WORKER THREAD
+# ---------------------------------------------------------
+def _worker_loop():
+    while True:
+        try:
+            probe_due()
+        except Exception as e:
+            print("[Monitor] Probe error:", e)
+
+        time.sleep(1)
+
+
+def start_device_monitor():
+    """Start the health monitor thread (once per process)."""
+    global _worker
+
+    with _lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_worker_loop, name="device-monitor", daemon=True)
+            _worker.start()
@@ -0,0 +1,241 @@
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from config import Config
+
+# ---------------------------------------------------------
+# PER-DEVICE COMMAND QUEUE
+# The ESP32 web server handles one request at a time, so every command
+# to a board goes through that board's queue and runs on one worker.
+#  - relay commands jump ahead of reads / captures / pings
+#  - a queued command of the same kind is coalesced instead of repeated
+#    (relay on, off, on → one "on"; two pending pings → one ping); with
+#    supersede, callers who asked for something other than what finally
+#    ran get CommandSuperseded
+#  - a command whose caller gave up waiting is dropped, not run later
+# ---------------------------------------------------------
+
+# Lower runs first
+PRIORITIES = {
+    "relay": 0,
+    "relay_status": 1,
+    "read": 2,
+    "capture": 3,
+    "ping": 4,
+}
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+class CommandSuperseded(Exception):
+    """A queued command was replaced by a newer, different one before it ran."""
+    pass
+
+
+class DeviceCommandQueue:
+
+    def __init__(self, device_id):
+        self.device_id = device_id
+        self._pending = []      # command dicts
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._thread = None
+        self._current = None
+
+        self.executed = 0
+        self.coalesced = 0
+        self.superseded = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self.waits = deque(maxlen=200)        # seconds queued
+        self.latencies = deque(maxlen=200)    # seconds queued + executing
+
+    def submit(self, kind, fn, args, coalesce_key=None, supersede=False):
+        """
+        Queue fn(*args). Returns a Future with fn's result.
+        If a command with the same coalesce_key is still queued, this one
+        takes its place (latest wins) and every caller stays attached to it.
+        Without supersede they all share the result; with supersede=True a
+        caller whose arguments differ from what finally ran (asked "off",
+        the slot ended up "on") gets CommandSuperseded instead.
+        """
+        future = Future()
+
+        with self._cond:
+            if coalesce_key:
+                for command in self._pending:
+                    if command["key"] == coalesce_key:
+                        command["fn"], command["args"] = fn, args
+                        command["waiters"].append((future, fn, args))
+                        self.coalesced += 1
+                        return future
+
+            if len(self._pending) >= Config.DEVICE_QUEUE_MAX:
+                self.rejected += 1
+                future.set_exception(RuntimeError(f"Command queue for {self.device_id} is full"))
+                return future
+
+            self._pending.append({
+                "kind": kind,
+                "key": coalesce_key,
+                "fn": fn,
+                "args": args,
+                "waiters": [(future, fn, args)],
+                "supersede": supersede,
+                "priority": PRIORITIES.get(kind, max(PRIORITIES.values())),
+                "seq": next(self._seq),
+                "queued_at": time.monotonic()
+            })
+            self._cond.notify()
+
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name=f"device-{self.device_id}", daemon=True
+                )
+                self._thread.start()
+
+        return future
+
+    def withdraw(self, future):
+        """
+        The caller stopped waiting: drop its command if nobody else is
+        waiting on it, else fall back to the latest remaining request.
+        A command that's already running can't be stopped.
+        """
+        future.cancel()
+
+        with self._cond:
+            for command in self._pending:
+                waiters = command["waiters"]
+                for waiter in waiters:
+                    if waiter[0] is future:
+                        waiters.remove(waiter)
+                        break
+                else:
+                    continue
+
+                if waiters:
+                    _, command["fn"], command["args"] = waiters[-1]
+                else:
+                    self._pending.remove(command)
+                    self.cancelled += 1
+                return True
+        return False
+
+    def _finish(self, command, result=None, error=None):
+        superseded = 0
+
+        for future, _, args in command["waiters"]:
+            # Withdrawn by their caller → already cancelled
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            elif command["supersede"] and args != command["args"]:
+                superseded += 1
+                future.set_exception(CommandSuperseded(
+                    f"{command['kind']} command for {self.device_id} replaced by a newer one"
+                ))
+            else:
+                future.set_result(result)
+
+        return superseded
+
+    def _next(self):
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+
+            command = min(self._pending, key=lambda c: (c["priority"], c["seq"]))
+            self._pending.remove(command)
+            self._current = command["kind"]
+            return command
+
+    def _run(self):
+        while True:
+            command = self._next()
+            started = time.monotonic()
+
+            try:
+                superseded = self._finish(command, command["fn"](*command["args"]))
+            except Exception as e:
+                superseded = self._finish(command, error=e)
+
+            finished = time.monotonic()
+            with self._cond:
+                self._current = None
+                self.executed += 1
+                self.superseded += superseded
+                self.waits.append(started - command["queued_at"])
+                self.latencies.append(finished - command["queued_at"])
+
+    def snapshot(self):
+        with self._cond:
+            waits, latencies = list(self.waits), list(self.latencies)
+            snapshot = {
+                "depth": len(self._pending),
+                "in_flight": self._current,
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "superseded": self.superseded,
+                "cancelled": self.cancelled,
+                "rejected": self.rejected
+            }
+
+        for name, values in (("wait", waits), ("latency", latencies)):
+            for label, q in (("p50", 0.50), ("p95", 0.95)):
+                value = _percentile(values, q)
+                snapshot[f"{name}_{label}_ms"] = round(value * 1000, 1) if value is not None else None
+
+        return snapshot
+
+
+_queues = {}
+_lock = threading.Lock()
+
+
+def get_queue(device_id):
+    queue = _queues.get(device_id)
+    if queue is None:
+        with _lock:
+            queue = _queues.get(device_id)
+            if queue is None:
+                queue = _queues[device_id] = DeviceCommandQueue(device_id)
+    return queue
+
+
+def run_command(device_id, kind, fn, *args, coalesce_key=None, supersede=False, default=None):
+    """
+    Run fn(*args) through the board's queue and wait for it.
+    Returns `default` if the queue is full, the command fails, is
+    superseded by a different command or DEVICE_COMMAND_TIMEOUT passes
+    (a timed-out command that hasn't started is dropped from the queue).
+    """
+    queue = get_queue(device_id)
+    future = queue.submit(kind, fn, args, coalesce_key, supersede)
+
+    try:
+        return future.result(timeout=Config.DEVICE_COMMAND_TIMEOUT)
+    except FutureTimeout:
+        dropped = queue.withdraw(future)
+        print(f"[Queue] {kind} on {device_id} timed out" + (" (dropped)" if dropped else " (still running)"))
+    except CommandSuperseded as e:
+        print(f"[Queue] {e}")
+    except Exception as e:
+        print(f"[Queue] {kind} on {device_id} failed:", e)
+
+    return default
+
+
+def get_queue_stats():
+    with _lock:
+        queues = dict(_queues)
+    return {device_id: queue.snapshot() for device_id, queue in queues.items()}
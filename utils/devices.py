@@ -0,0 +1,106 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+from utils.db import get_devices, save_device, delete_device
+
+# ---------------------------------------------------------
+# ESP32 DEVICE REGISTRY
+# Boards are stored in the devices table; lookups go through an
+# in-memory copy that is refreshed whenever the registry changes.
+# ---------------------------------------------------------
+
+DEFAULT_DEVICE = Config.DEFAULT_DEVICE_ID
+
+_devices = None
+_lock = threading.Lock()
+
+# Shared pool for fan-out, so N boards cost ~one round trip
+_executor = ThreadPoolExecutor(
+    max_workers=Config.FLEET_MAX_PARALLEL, thread_name_prefix="fleet"
+)
+
+
+class UnknownDevice(Exception):
+    pass
+
+
+def _registry():
+    global _devices
+    if _devices is None:
+        with _lock:
+            if _devices is None:
+                _devices = {d["id"]: d for d in get_devices()}
+    return _devices
+
+
+def reload_devices():
+    global _devices
+    with _lock:
+        _devices = None
+
+
+def list_devices():
+    return list(_registry().values())
+
+
+def get_device(device_id=None):
+    device = _registry().get(device_id or DEFAULT_DEVICE)
+    if device is None:
+        raise UnknownDevice(f"Unknown device: {device_id or DEFAULT_DEVICE}")
+    return device
+
+
+def device_base(device_id=None):
+    """Base URL of a board's HTTP server."""
+    device = get_device(device_id)
+    return f"http://{device['ip']}:{device['port'] or 80}"
+
+
+def register_device(device_id, ip, port=80, name=None):
+    save_device(device_id, ip, port, name)
+    reload_devices()
+
+
+def remove_device(device_id):
+    delete_device(device_id)
+    reload_devices()
+
+
+def resolve_device_id(device_id=None, remote_addr=None):
+    """
+    Which board sent a request: the id it reports, else the registered
+    board with that IP, else the default device.
+    """
+    if device_id:
+        return device_id
+
+    if remote_addr:
+        for device in _registry().values():
+            if device["ip"] == remote_addr:
+                return device["id"]
+
+    return DEFAULT_DEVICE
+
+
+def fan_out(fn, device_ids=None, *args, **kwargs):
+    """
+    Run fn(device_id, *args, **kwargs) for every board (or the given ids)
+    concurrently, at most FLEET_MAX_PARALLEL at a time.
+    Returns {device_id: result}; exceptions become {"error": ...}.
+    """
+    if device_ids is None:
+        device_ids = [d["id"] for d in list_devices()]
+
+    futures = {device_id: _executor.submit(fn, device_id, *args, **kwargs)
+               for device_id in device_ids}
+
+    results = {}
+    for device_id, future in futures.items():
+        try:
+            results[device_id] = future.result()
+        except Exception as e:
+            print(f"[Fleet] {device_id} failed:", e)
+            results[device_id] = {"error": str(e)}
+
+    return results
@@ -0,0 +1,134 @@
+import os
+import threading
+
+from config import Config
+from utils.crop_health import identify_disease, identify_disease_batch
+
+# ---------------------------------------------------------
+# TIERED DISEASE IDENTIFICATION
+#   tier 1 → local TorchScript classifier (on-box, free)
+#   tier 2 → Kindwise identify_disease (network, paid)
+# Only images the local model is not confident about are escalated.
+# ---------------------------------------------------------
+
+TIER_LOCAL = "local"
+TIER_KINDWISE = "kindwise"
+
+_classifier = None
+_loaded = False
+_lock = threading.Lock()
+
+
+def _torchscript_classifier():
+    """
+    Build the default local classifier from the TorchScript model on disk.
+    Returns None (tier disabled) if the model or torch is unavailable.
+    """
+    if not (os.path.exists(Config.LOCAL_CLASSIFIER_MODEL)
+            and os.path.exists(Config.LOCAL_CLASSIFIER_CLASSES)):
+        print("[Classifier] No local disease model found — using Kindwise only")
+        return None
+
+    try:
+        from utils.torchscript import load_torchscript, predict
+        model, classes = load_torchscript(
+            Config.LOCAL_CLASSIFIER_MODEL, Config.LOCAL_CLASSIFIER_CLASSES
+        )
+    except Exception as e:
+        print("[Classifier] Failed to load local disease model:", e)
+        return None
+
+    print(f"[Classifier] Local disease model loaded ({len(classes)} classes)")
+    return lambda image_path: predict(model, classes, image_path, softmax=True)
+
+
+def set_local_classifier(classifier):
+    """
+    Plug in a local classifier: classifier(image_path) → {label: score}
+    sorted best-first. Pass None to disable the local tier.
+    """
+    global _classifier, _loaded
+    with _lock:
+        _classifier = classifier
+        _loaded = True
+
+
+def get_local_classifier():
+    global _classifier, _loaded
+    if not _loaded:
+        with _lock:
+            if not _loaded and Config.LOCAL_CLASSIFIER_ENABLED:
+                _classifier = _torchscript_classifier()
+            _loaded = True
+    return _classifier
+
+
+def classify_locally(image_path):
+    """Return (label, score) from the local tier, or None if unavailable."""
+    classifier = get_local_classifier()
+    if classifier is None:
+        return None
+
+    try:
+        scores = classifier(image_path)
+    except Exception as e:
+        print("[Classifier] Local inference error:", e)
+        return None
+
+    if not scores:
+        return None
+
+    label = next(iter(scores))
+    return label, scores[label]
+
+
+def _local_result(label, score, crop_type):
+    return {
+        "success": True,
+        "disease": label,
+        "confidence": score,
+        "description": "Identified by on-device classifier",
+        "plant_name": crop_type,
+        "tier": TIER_LOCAL
+    }
+
+
+# ---------------------------------------------------------
+# PUBLIC API
+# ---------------------------------------------------------
+def diagnose(image_path, crop_type="general"):
+    """
+    Identify disease, answering on-box when the local model is confident
+    and escalating to Kindwise otherwise. Result includes "tier".
+    """
+    local = classify_locally(image_path)
+
+    if local and local[1] >= Config.LOCAL_CLASSIFIER_MIN_CONFIDENCE:
+        print(f"[Classifier] Local answer: {local[0]} ({local[1]:.2f})")
+        return _local_result(local[0], local[1], crop_type)
+
+    if local:
+        print(f"[Classifier] Low confidence ({local[1]:.2f}) → escalating to Kindwise")
+
+    result = identify_disease(image_path, crop_type)
+    result["tier"] = TIER_KINDWISE
+    return result
+
+
+def diagnose_batch(image_paths, crop_type="general"):
+    """
+    Batch version of diagnose(). Answered locally only if every image is
+    confidently classified as the same label; otherwise one Kindwise batch.
+    """
+    local = [classify_locally(path) for path in image_paths]
+
+    if all(local) and len({label for label, _ in local}) == 1:
+        score = min(score for _, score in local)
+        if score >= Config.LOCAL_CLASSIFIER_MIN_CONFIDENCE:
+            result = _local_result(local[0][0], score, crop_type)
+            result["image_count"] = len(image_paths)
+            return result
+
+    result = identify_disease_batch(image_paths, crop_type)
+    result["tier"] = TIER_KINDWISE
+    return result
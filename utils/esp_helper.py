@@ -1,27 +1,50 @@
+import time
+
 import requests
+
+from utils import http_client
+from utils.completions import capture_completions, sensor_readings
+from utils.db import get_recent_sensors
+from utils.device_queue import run_command
+from utils.devices import DEFAULT_DEVICE, device_base, fan_out
+from utils.relay_state import record_relay_state, get_relay_snapshot
 from config import Config
 
 # -------------------------------------------------------
 # BASE URL FOR ESP32
+# Every helper takes a device_id (None = the default board from .env);
+# addresses come from the device registry (utils/devices.py).
+# Commands go through the board's queue (utils/device_queue.py), since
+# the firmware web server can only serve one request at a time.
 # -------------------------------------------------------
-ESP_BASE = f"http://{Config.ESP32_IP}:{Config.ESP32_PORT}"
-
-FLASK_BASE = f"http://{Config.FLASK_IP}:{Config.FLASK_PORT}"
 
 
 # -------------------------------------------------------
 # RELAY CONTROL
 # -------------------------------------------------------
-def send_relay_command(action):
+def send_relay_command(action, device_id=None):
     """
     action = "on" or "off"
+    Queued ahead of reads and captures; if an earlier relay command is
+    still waiting, it's replaced by this one (the last request wins).
+    Every caller gets the outcome of the action that finally ran, or
+    False if they asked for the other one.
     """
+    device_id = device_id or DEFAULT_DEVICE
+    return run_command(device_id, "relay", _relay_command, action, device_id,
+                       coalesce_key="relay", supersede=True, default=False)
+
+
+def _relay_command(action, device_id):
+    wait_for_radio(device_id)
+
     try:
-        url = f"{ESP_BASE}/relay/{action}"
-        r = requests.post(url, timeout=5)
+        url = f"{device_base(device_id)}/relay/{action}"
+        r = http_client.post(url, service="esp32", timeout=5)
 
         if r.status_code == 200:
             print(f"[ESP] Relay {action.upper()} OK")
+            record_relay_state(device_id or DEFAULT_DEVICE, action, "command")
             return True
 
         print(f"[ESP] Relay {action} failed → {r.status_code}")
@@ -32,18 +55,51 @@ def send_relay_command(action):
         return False
 
 
+def get_relay_state(device_id=None):
+    """Relay state reported by the board ("on" / "off"), or None if unreachable."""
+    device_id = device_id or DEFAULT_DEVICE
+    return run_command(device_id, "relay_status", _relay_status, device_id,
+                       coalesce_key="relay_status")
+
+
+def _relay_status(device_id):
+    wait_for_radio(device_id)
+
+    try:
+        r = http_client.get(f"{device_base(device_id)}/relay/status", service="esp32", timeout=4)
+        if r.status_code == 200:
+            state = r.json().get("state", "off")
+            record_relay_state(device_id or DEFAULT_DEVICE, state, "probe")
+            return state
+    except Exception as e:
+        print("[ESP] Relay status error:", e)
+
+    return None
+
+
 
 # -------------------------------------------------------
 # CAMERA CAPTURE (ESP uploads to /scan automatically)
 # -------------------------------------------------------
-def capture_image():
+def capture_image(request_id=None, device_id=None):
     """
     Trigger ESP32-CAM capture.
-    Image will be uploaded directly to Flask via /scan.
+    Image will be uploaded directly to Flask via /scan
+    (firmware/new_with_relay.ino echoes request_id back as "requestId";
+    uploads without it are matched only when unambiguous, see complete()).
+    Captures are never coalesced — every caller waits on its own image.
     """
+    device_id = device_id or DEFAULT_DEVICE
+    return run_command(device_id, "capture", _capture, request_id, device_id, default=False)
+
+
+def _capture(request_id, device_id):
+    wait_for_radio(device_id)
+
     try:
-        url = f"{ESP_BASE}/capture"
-        r = requests.post(url, timeout=12)
+        url = f"{device_base(device_id)}/capture"
+        params = {"request_id": request_id} if request_id else None
+        r = http_client.post(url, service="esp32", params=params, timeout=12)
 
         if r.status_code == 200:
             print("[ESP] Camera capture triggered")
@@ -58,78 +114,239 @@ def capture_image():
 
 
 
+def capture_and_wait(timeout=None, device_id=None):
+    """
+    Trigger a capture and wait until /scan has stored the enhanced image.
+    Returns {"scan_id", "filename", "path", "device_id"} or None (failed / timed out).
+    """
+    device_id = device_id or DEFAULT_DEVICE
+    request_id, future = capture_completions.expect(group=device_id)
+
+    if not capture_image(request_id, device_id):
+        capture_completions.cancel(request_id)
+        return None
+
+    return capture_completions.wait(
+        request_id, future, timeout or Config.CAPTURE_WAIT_TIMEOUT
+    )
+
+
+
+# -------------------------------------------------------
+# SOIL READ RADIO WINDOW
+# The board turns WiFi off while sampling soil (ADC2) and is unreachable
+# until it reconnects and pushes /sensor. Other commands wait that out
+# instead of failing on a connect timeout.
+# -------------------------------------------------------
+_radio_off = {}     # device id → (since, until)
+
+
+def _start_radio_window(device_id, since):
+    _radio_off[device_id or DEFAULT_DEVICE] = (since, time.time() + Config.ESP32_SOIL_WINDOW)
+
+
+def radio_busy(device_id=None):
+    """True while a soil read has the board offline (and it hasn't reported back)."""
+    device_id = device_id or DEFAULT_DEVICE
+    since, until = _radio_off.get(device_id, (0.0, 0.0))
+    if time.time() >= until:
+        return False
+    return sensor_readings.wait_for(device_id, ("moisture",), since, 0) is None
+
+
+def wait_for_radio(device_id=None):
+    """Block until the board is back from a soil read (bounded by the window)."""
+    device_id = device_id or DEFAULT_DEVICE
+    since, until = _radio_off.get(device_id, (0.0, 0.0))
+    remaining = until - time.time()
+    if remaining > 0:
+        sensor_readings.wait_for(device_id, ("moisture",), since, remaining)
+
+
+
 # -------------------------------------------------------
 # SENSOR READ (DHT + Soil)
 # -------------------------------------------------------
-def read_sensors():
+SENSOR_TRIGGERS = {
+    "dht": ("temperature", "humidity"),
+    "soil": ("moisture",),
+    "all": ("temperature", "humidity", "moisture"),
+}
+
+# Boards on older firmware without /read/all → fall back to dht + soil
+_no_read_all = set()
+
+
+def _trigger(device_id, sensor, since):
     """
-    Step 1 → Trigger DHT & Soil readings on ESP32  
-    Step 2 → ESP sends results to Flask /sensor  
-    Step 3 → Fetch newest values from Flask database
+    Queue POST /read/<sensor>. Returns True if the reading is on its way.
+    Callers asking for the same sensor while a trigger is still queued
+    share it (the push to /sensor answers all of them).
     """
+    return run_command(device_id, "read", _read_trigger, device_id, sensor, since,
+                       coalesce_key=f"read:{sensor}", default=False)
 
-    # ------ Trigger DHT ------
-    try:
-        requests.post(f"{ESP_BASE}/read/dht", timeout=5)
-        print("[ESP] DHT triggered")
-    except Exception as e:
-        print("[ESP] DHT trigger error:", e)
 
-    # ------ Trigger Soil ------
+def _read_trigger(device_id, sensor, since):
+    """
+    The firmware answers /read/soil only after WiFi is back, so a read
+    timeout there still means the push to /sensor will arrive.
+    """
+    wait_for_radio(device_id)
+    takes_radio = sensor in ("soil", "all")
+
     try:
-        requests.post(f"{ESP_BASE}/read/soil", timeout=5)
-        print("[ESP] Soil triggered")
+        r = http_client.post(
+            f"{device_base(device_id)}/read/{sensor}", service="esp32",
+            timeout=(3, Config.ESP32_SOIL_WINDOW if takes_radio else 5)
+        )
+    except requests.exceptions.ReadTimeout:
+        if takes_radio:
+            _start_radio_window(device_id, since)
+            print(f"[ESP] {sensor.upper()} triggered (board offline for soil read)")
+            return True
+        print(f"[ESP] {sensor.upper()} trigger timed out")
+        return False
     except Exception as e:
-        print("[ESP] Soil trigger error:", e)
+        print(f"[ESP] {sensor.upper()} trigger error:", e)
+        return False
 
-    # ------ Fetch newest sensor record from Flask ------
-    try:
-        r = requests.get(f"{FLASK_BASE}/api/sensors", timeout=6)
-        data = r.json()
+    if sensor == "all" and r.status_code == 404:
+        _no_read_all.add(device_id)
+        print(f"[ESP] {device_id} has no /read/all, using separate triggers")
+        return False
+
+    if r.status_code not in (200, 202):
+        print(f"[ESP] {sensor.upper()} trigger failed →", r.status_code)
+        return False
+
+    # /read/all answers before WiFi goes off
+    if r.status_code == 202 and takes_radio:
+        _start_radio_window(device_id, since)
+
+    print(f"[ESP] {sensor.upper()} triggered")
+    return True
 
-        if isinstance(data, list) and len(data) > 0:
-            newest = data[0]     # first row = latest
-            print("[FLASK] Latest sensor data:", newest)
-            return newest
 
-        print("[FLASK] No sensor rows found")
+def _plan(device_id, sensors):
+    """
+    Order triggers for the fewest round trips: one /read/all when both are
+    wanted, otherwise DHT before soil (soil takes the board offline).
+    """
+    sensors = set(sensors)
+    if {"dht", "soil"} <= sensors and device_id not in _no_read_all:
+        return ["all"]
+    return [s for s in ("dht", "soil") if s in sensors]
+
+
+def read_sensors(sensors=("dht", "soil"), timeout=None, device_id=None):
+    """
+    Step 1 → Trigger DHT and/or Soil readings on ESP32
+    Step 2 → ESP sends results to Flask /sensor (stored + published there)
+    Step 3 → Wait for those fresh values, up to SENSOR_READ_TIMEOUT
+
+    Returns the latest stored reading with the freshly measured fields
+    filled in, or None if the ESP32 didn't report back in time.
+    """
+    device_id = device_id or DEFAULT_DEVICE
+    triggered_at = time.time()
+    fields = []
+
+    plan = _plan(device_id, sensors)
+    while plan:
+        sensor = plan.pop(0)
+        if _trigger(device_id, sensor, triggered_at):
+            fields.extend(SENSOR_TRIGGERS[sensor])
+        elif sensor == "all" and device_id in _no_read_all:
+            plan = _plan(device_id, ("dht", "soil"))
+
+    if not fields:
         return None
 
-    except Exception as e:
-        print("[FLASK] Fetch DB error:", e)
+    fresh = sensor_readings.wait_for(
+        device_id, fields, triggered_at, timeout or Config.SENSOR_READ_TIMEOUT
+    )
+    if not fresh:
         return None
 
+    latest = get_recent_sensors(1, device_id)
+    reading = dict(latest[0]) if latest else {"device_id": device_id}
+    reading.update(fresh)
+    print(f"[ESP] Fresh sensor data ({device_id}):", reading)
+    return reading
+
 
 
 # -------------------------------------------------------
 # ESP HEALTH CHECK
 # -------------------------------------------------------
-def check_esp32_connection():
+def ping_device(device_id=None):
+    """
+    Round-trip time (seconds) of GET / on the board, or None if unreachable.
+    Queued behind everything else so a busy board isn't reported offline.
+    """
+    device_id = device_id or DEFAULT_DEVICE
+    return run_command(device_id, "ping", _ping, device_id, coalesce_key="ping")
+
+
+def _ping(device_id):
+    start = time.monotonic()
     try:
-        r = requests.get(f"{ESP_BASE}/", timeout=3)
-        return r.status_code == 200
-    except:
-        return False
+        r = http_client.get(f"{device_base(device_id)}/", service="esp32", timeout=3)
+    except Exception:
+        return None
+
+    return time.monotonic() - start if r.status_code == 200 else None
+
+
+def check_esp32_connection(device_id=None):
+    """Live check (pings the board). UI status should use get_esp32_status()."""
+    # Mid soil read the board is offline on purpose, not disconnected
+    if radio_busy(device_id):
+        return True
+
+    return ping_device(device_id) is not None
 
 
 
 # -------------------------------------------------------
-# STATUS FOR UI
+# STATUS FOR UI (answered from the background health monitor)
 # -------------------------------------------------------
-def get_esp32_status():
+def get_esp32_status(device_id=None):
+    from utils.device_monitor import get_health, ONLINE
+
+    device_id = device_id or DEFAULT_DEVICE
+    health = get_health(device_id)
+
     status = {
-        "connected": check_esp32_connection(),
-        "relay_status": "unknown",
+        "device_id": device_id,
+        "connected": health["status"] == ONLINE,
+        "status": health["status"],
+        "last_seen": health["last_seen"],
+        "rtt_ms": health["rtt_ms"],
+        "relay_status": get_relay_snapshot(device_id)["state"] or "unknown",
         "last_sensor_data": None
     }
 
-    # If connected, also fetch latest reading
-    if status["connected"]:
-        try:
-            data = requests.get(f"{FLASK_BASE}/api/sensors", timeout=6).json()
-            if len(data) > 0:
-                status["last_sensor_data"] = data[0]
-        except:
-            pass
+    try:
+        latest = get_recent_sensors(1, device_id)
+        if latest:
+            status["last_sensor_data"] = dict(latest[0])
+    except:
+        pass
 
     return status
+
+
+
+# -------------------------------------------------------
+# FLEET FAN-OUT (all boards concurrently, bounded)
+# -------------------------------------------------------
+def read_all_devices(sensors=("dht", "soil"), device_ids=None):
+    return fan_out(
+        lambda device_id: read_sensors(sensors, device_id=device_id), device_ids
+    )
+
+
+def capture_all_devices(device_ids=None):
+    return fan_out(lambda device_id: capture_and_wait(device_id=device_id), device_ids)
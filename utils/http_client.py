@@ -0,0 +1,95 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import Config
+
+# ---------------------------------------------------------
+# SHARED HTTP CLIENT
+# One keep-alive Session per outbound service, so TCP/TLS
+# connections are reused instead of re-opened on every call.
+# ---------------------------------------------------------
+
+# Pool tuning per service: (pool_maxsize, default timeout (connect, read))
+SERVICE_POOLS = {
+    "kindwise":   (Config.HTTP_POOL_MAXSIZE, (5, 30)),
+    "openrouter": (Config.HTTP_POOL_MAXSIZE, (5, 30)),
+    "weather":    (4, (5, 10)),
+    "telegram":   (4, (5, 10)),
+    # ESP32 web server handles one request at a time — a big pool only queues sockets
+    "esp32":      (2, (3, 12)),
+    "default":    (Config.HTTP_POOL_MAXSIZE, (5, 30)),
+}
+
+_sessions = {}
+_transport = None
+_lock = threading.Lock()
+
+
+# Host pools kept per service (one per ESP32 board in a fleet)
+POOL_HOSTS = {
+    "esp32": Config.ESP32_POOL_HOSTS,
+}
+
+
+def _build_session(name):
+    pool_maxsize, _ = SERVICE_POOLS.get(name, SERVICE_POOLS["default"])
+
+    session = requests.Session()
+    adapter = _transport or HTTPAdapter(
+        pool_connections=POOL_HOSTS.get(name, Config.HTTP_POOL_CONNECTIONS),
+        pool_maxsize=pool_maxsize,
+        max_retries=0
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session(name="default"):
+    """Return the shared Session for a service (created on first use)."""
+    session = _sessions.get(name)
+    if session is None:
+        with _lock:
+            session = _sessions.get(name)
+            if session is None:
+                session = _build_session(name)
+                _sessions[name] = session
+    return session
+
+
+def request(method, url, service="default", **kwargs):
+    """Send a request through the service's pooled Session."""
+    if "timeout" not in kwargs:
+        kwargs["timeout"] = SERVICE_POOLS.get(service, SERVICE_POOLS["default"])[1]
+    return get_session(service).request(method, url, **kwargs)
+
+
+def get(url, service="default", **kwargs):
+    return request("GET", url, service=service, **kwargs)
+
+
+def post(url, service="default", **kwargs):
+    return request("POST", url, service=service, **kwargs)
+
+
+def set_transport(adapter):
+    """
+    Replace the transport adapter for all sessions (e.g. a fake adapter in tests).
+    Pass None to go back to real pooled HTTP.
+    """
+    global _transport
+    with _lock:
+        _transport = adapter
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def close_all():
+    """Close every pooled connection."""
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
@@ -0,0 +1,293 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from config import Config
+from utils.db import add_action
+from utils.esp_helper import send_relay_command, read_sensors
+from utils.relay_state import get_relay_snapshot
+from utils.telegram_helper import tg_send
+from utils.weather_helper import get_weather_data, get_weather_forecast
+
+# ---------------------------------------------------------
+# CLOSED-LOOP IRRIGATION
+# Evaluated on every /sensor push (O(1) per reading, like the alert
+# rules). Per board:
+#  - starts the pump when moisture drops below IRRIGATION_MOISTURE_LOW
+#  - stops it once moisture reaches IRRIGATION_MOISTURE_HIGH (band, so it
+#    doesn't chatter), after IRRIGATION_MAX_RUN seconds, or when rain
+#    starts / is forecast
+#  - waits IRRIGATION_MIN_OFF seconds between runs
+# Only soil values measured within IRRIGATION_MOISTURE_MAX_AGE count; the
+# board pushes soil rarely, so a run polls it every IRRIGATION_POLL_INTERVAL
+# and a run that ended short of the target re-checks after the rest (at most
+# IRRIGATION_MAX_CYCLES times in a row).
+# Only runs it started are managed; manual pump use is left alone.
+# Relay commands go out on a background thread; ingest never waits.
+# ---------------------------------------------------------
+
+RAIN_WORDS = ("rain", "drizzle", "thunderstorm", "shower")
+
+
+def _rainy(description):
+    return any(word in (description or "").lower() for word in RAIN_WORDS)
+
+
+class IrrigationController:
+
+    def __init__(self):
+        self.enabled = Config.IRRIGATION_ENABLED
+        self._state = {}    # device id → run state
+        self._weather = {"current": None, "current_at": None, "forecast_rain": False, "forecast_at": None}
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="irrigation")
+
+    def _device(self, device_id):
+        state = self._state.get(device_id)
+        if state is None:
+            state = self._state[device_id] = {
+                "running": False,       # a run we started is in progress
+                "pending": None,        # "on" / "off" command in flight
+                "started": None,
+                "stopped": None,
+                "reason": None,
+                "moisture": None,       # last measured soil value
+                "moisture_at": None,
+                "short_runs": 0         # runs in a row that ended below target
+            }
+        return state
+
+    # -----------------------------------------------------
+    # RAIN SUPPRESSION
+    # -----------------------------------------------------
+    def note_weather(self, weather, now=None):
+        """Current conditions ({"description", ...}) at IRRIGATION_LAT / LON."""
+        with self._lock:
+            self._weather["current"] = weather.get("description")
+            self._weather["current_at"] = now if now is not None else time.time()
+
+    def _refresh_weather(self):
+        lat, lon = Config.IRRIGATION_LAT, Config.IRRIGATION_LON
+
+        try:
+            current = get_weather_data(lat, lon)
+            self.note_weather(current)
+
+            # dt_txt is UTC
+            horizon = datetime.utcnow() + timedelta(hours=Config.IRRIGATION_RAIN_LOOKAHEAD)
+            forecast = get_weather_forecast(lat, lon)["forecast"]
+            rain = any(
+                _rainy(item["description"])
+                for item in forecast
+                if datetime.strptime(item["datetime"], "%Y-%m-%d %H:%M:%S") <= horizon
+            )
+
+            with self._lock:
+                self._weather["forecast_rain"] = rain
+                self._weather["forecast_at"] = time.time()
+
+        except Exception as e:
+            print("[Irrigation] Weather refresh failed:", e)
+
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _rain_expected(self, now):
+        """Called with the lock held. Stale weather never suppresses watering."""
+        weather = self._weather
+        max_age = 2 * Config.IRRIGATION_WEATHER_REFRESH
+
+        # Refresh in the background when there's a configured location
+        if Config.IRRIGATION_LAT and Config.IRRIGATION_LON and not self._refreshing:
+            checked = max(weather["current_at"] or 0, weather["forecast_at"] or 0)
+            if now - checked >= Config.IRRIGATION_WEATHER_REFRESH:
+                self._refreshing = True
+                threading.Thread(target=self._refresh_weather, name="irrigation-weather", daemon=True).start()
+
+        if weather["current_at"] and now - weather["current_at"] < max_age and _rainy(weather["current"]):
+            return True
+        return bool(weather["forecast_at"] and now - weather["forecast_at"] < max_age and weather["forecast_rain"])
+
+    # -----------------------------------------------------
+    # DECISION (per reading)
+    # -----------------------------------------------------
+    def evaluate(self, reading, device_id="default", now=None):
+        """
+        Feed the fields measured by one /sensor push (not values carried
+        forward from earlier rows). Returns the command issued ("on" / "off")
+        or None; the relay is switched in the background.
+        """
+        if not self.enabled:
+            return None
+
+        now = now if now is not None else time.time()
+        measured = reading.get("moisture")
+
+        with self._lock:
+            state = self._device(device_id)
+            if measured not in (None, -1):
+                state["moisture"], state["moisture_at"] = measured, now
+
+            # Old soil values neither start nor stop a run
+            moisture = None
+            if state["moisture_at"] is not None and now - state["moisture_at"] <= Config.IRRIGATION_MOISTURE_MAX_AGE:
+                moisture = state["moisture"]
+
+            if state["pending"]:
+                return None
+
+            # Someone switched our run off by hand → treat it as ended
+            if state["running"] and get_relay_snapshot(device_id)["state"] == "off":
+                state["running"] = False
+                state["stopped"] = now
+
+            action = reason = None
+            rain = self._rain_expected(now)
+
+            if state["running"]:
+                if now - state["started"] >= Config.IRRIGATION_MAX_RUN:
+                    action, reason = "off", "max run time"
+                elif rain:
+                    action, reason = "off", "rain"
+                elif moisture is not None and moisture >= Config.IRRIGATION_MOISTURE_HIGH:
+                    action, reason = "off", "target reached"
+
+            elif moisture is not None and moisture < Config.IRRIGATION_MOISTURE_LOW:
+                resting = state["stopped"] is not None and now - state["stopped"] < Config.IRRIGATION_MIN_OFF
+                if not rain and not resting:
+                    action, reason = "on", f"moisture {moisture}% < {Config.IRRIGATION_MOISTURE_LOW}%"
+
+            if action:
+                state["pending"] = action
+                state["reason"] = reason
+
+        if action:
+            self._executor.submit(self._switch, device_id, action, reason, moisture)
+        return action
+
+    def _later(self, delay, fn, *args):
+        timer = threading.Timer(delay, fn, args)
+        timer.daemon = True
+        timer.start()
+
+    def _timeout(self, device_id, started, reason="max run time"):
+        """
+        Max-run watchdog (fires even if the board stops reporting); also
+        retries an "off" the board didn't confirm.
+        """
+        with self._lock:
+            state = self._device(device_id)
+            if not state["running"] or state["started"] != started or state["pending"]:
+                return
+            state["pending"] = "off"
+            state["reason"] = reason
+
+        self._executor.submit(self._switch, device_id, "off", reason, None)
+
+    def _poll_soil(self, device_id, started):
+        """Fresh soil reads during a run; /sensor evaluates each one."""
+        while True:
+            time.sleep(Config.IRRIGATION_POLL_INTERVAL)
+            with self._lock:
+                state = self._device(device_id)
+                if not state["running"] or state["started"] != started:
+                    return
+            try:
+                read_sensors(("soil",), device_id=device_id)
+            except Exception as e:
+                print(f"[Irrigation] Soil read failed ({device_id}):", e)
+
+    def _recheck(self, device_id, stopped):
+        """After the rest: is the soil still dry? (the push decides)"""
+        with self._lock:
+            state = self._device(device_id)
+            if state["running"] or state["pending"] or state["stopped"] != stopped or not self.enabled:
+                return
+        try:
+            read_sensors(("soil",), device_id=device_id)
+        except Exception as e:
+            print(f"[Irrigation] Soil re-check failed ({device_id}):", e)
+
+    def _switch(self, device_id, action, reason, moisture):
+        ok = False
+        try:
+            ok = send_relay_command(action, device_id)
+        except Exception as e:
+            print(f"[Irrigation] Relay {action} failed ({device_id}):", e)
+
+        now = time.time()
+        recheck = give_up = False
+        with self._lock:
+            state = self._device(device_id)
+            state["pending"] = None
+
+            if action == "on":
+                # Unconfirmed may still mean switched (reply lost) → treat
+                # as running and switch it off again right away
+                state["running"] = True
+                state["started"] = now
+                if not ok:
+                    state["pending"] = "off"
+                    state["reason"] = reason = "start not confirmed"
+            elif ok:
+                state["running"] = False
+                state["stopped"] = now
+                if reason == "target reached":
+                    state["short_runs"] = 0
+                elif reason != "rain":
+                    state["short_runs"] += 1
+                    recheck = state["short_runs"] < Config.IRRIGATION_MAX_CYCLES
+                    give_up = not recheck
+            started = state["started"]
+
+        if action == "on" and not ok:
+            print(f"[Irrigation] Relay on not confirmed by {device_id}, switching it off")
+            self._executor.submit(self._switch, device_id, "off", reason, None)
+            return
+
+        if not ok:
+            # Still ours and possibly running → try again
+            print(f"[Irrigation] Relay off not confirmed by {device_id}, retrying in {Config.IRRIGATION_POLL_INTERVAL}s")
+            self._later(Config.IRRIGATION_POLL_INTERVAL, self._timeout, device_id, started, reason)
+            return
+
+        if action == "on":
+            self._later(Config.IRRIGATION_MAX_RUN, self._timeout, device_id, now)
+            threading.Thread(
+                target=self._poll_soil, args=(device_id, now), name="irrigation-soil", daemon=True
+            ).start()
+        elif recheck:
+            self._later(Config.IRRIGATION_MIN_OFF, self._recheck, device_id, now)
+
+        print(f"[Irrigation] Pump {action.upper()} on {device_id} ({reason})")
+        try:
+            add_action("irrigation", f"pump_{action} ({device_id}): {reason}")
+            if action == "on":
+                tg_send(f"💧 Auto-irrigation started ({device_id})\nMoisture: {moisture}%")
+            else:
+                tg_send(f"🛑 Auto-irrigation stopped ({device_id}): {reason}")
+            if give_up:
+                tg_send(
+                    f"⚠️ {device_id}: soil still below {Config.IRRIGATION_MOISTURE_HIGH}% after "
+                    f"{Config.IRRIGATION_MAX_CYCLES} runs. Check the water supply and soil sensor."
+                )
+        except Exception as e:
+            print("[Irrigation] Logging failed:", e)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "moisture_low": Config.IRRIGATION_MOISTURE_LOW,
+                "moisture_high": Config.IRRIGATION_MOISTURE_HIGH,
+                "max_run": Config.IRRIGATION_MAX_RUN,
+                "min_off": Config.IRRIGATION_MIN_OFF,
+                "weather": dict(self._weather),
+                "devices": {device_id: dict(state) for device_id, state in self._state.items()}
+            }
+
+
+irrigation = IrrigationController()
@@ -0,0 +1,86 @@
+import hashlib
+import re
+import threading
+
+from config import Config
+from utils.db import (
+    get_llm_cache_entry, put_llm_cache_entry, get_llm_cache_stats, clear_llm_cache
+)
+
+# ---------------------------------------------------------
+# LLM RESPONSE CACHE
+# Keyed by normalized prompt + preferred model + disease + crop, stored in SQLite
+# so repeated questions survive restarts and cost nothing.
+# ---------------------------------------------------------
+
+_stats = {"hits": 0, "misses": 0, "stores": 0}
+_stats_lock = threading.Lock()
+
+
+def normalize_prompt(prompt):
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    text = " ".join((prompt or "").lower().split())
+    return re.sub(r"[\s?!.]+$", "", text)
+
+
+def make_key(prompt, model, disease="", crop_type="general"):
+    parts = [
+        normalize_prompt(prompt),
+        model,
+        (disease or "").strip().lower(),
+        (crop_type or "general").strip().lower()
+    ]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def get_cached_response(prompt, model, disease="", crop_type="general"):
+    """Return a cached reply or None."""
+    if not Config.LLM_CACHE_ENABLED:
+        return None
+
+    try:
+        response = get_llm_cache_entry(
+            make_key(prompt, model, disease, crop_type), Config.LLM_CACHE_TTL
+        )
+    except Exception as e:
+        print("[LLM Cache] Read error:", e)
+        return None
+
+    _count("hits" if response is not None else "misses")
+    return response
+
+
+def store_response(prompt, model, response, disease="", crop_type="general"):
+    if not Config.LLM_CACHE_ENABLED or not response:
+        return
+
+    try:
+        put_llm_cache_entry(
+            make_key(prompt, model, disease, crop_type), model, disease, crop_type,
+            normalize_prompt(prompt), response,
+            Config.LLM_CACHE_TTL, Config.LLM_CACHE_MAX_ENTRIES
+        )
+        _count("stores")
+    except Exception as e:
+        print("[LLM Cache] Write error:", e)
+
+
+def get_cache_stats():
+    """Hit/miss metrics since start + persistent cache size."""
+    with _stats_lock:
+        stats = dict(_stats)
+
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+    stats["enabled"] = Config.LLM_CACHE_ENABLED
+    stats.update(get_llm_cache_stats())
+    return stats
+
+
+def clear_cache():
+    clear_llm_cache()
@@ -0,0 +1,155 @@
+import threading
+import time
+from collections import deque
+
+from config import Config
+from utils.db import add_model_usage
+
+# ---------------------------------------------------------
+# LATENCY-AWARE MODEL ROUTING (OpenRouter)
+# Tracks rolling latency / error stats per model and decides which
+# model(s) a request should try, in order. A degraded primary still gets
+# one call every MODEL_PROBE_INTERVAL seconds so its stats can recover.
+# ---------------------------------------------------------
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class ModelStats:
+
+    def __init__(self, window):
+        self.latencies = deque(maxlen=window)   # seconds, successful calls
+        self.results = deque(maxlen=window)     # True = success
+        self.calls = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def error_rate(self):
+        if not self.results:
+            return 0.0
+        return self.results.count(False) / len(self.results)
+
+    def snapshot(self):
+        p50 = _percentile(self.latencies, 0.50)
+        p95 = _percentile(self.latencies, 0.95)
+        p99 = _percentile(self.latencies, 0.99)
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "error_rate": round(self.error_rate(), 3),
+            "latency_p50": round(p50, 3) if p50 is not None else None,
+            "latency_p95": round(p95, 3) if p95 is not None else None,
+            "latency_p99": round(p99, 3) if p99 is not None else None,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens
+        }
+
+
+class ModelRouter:
+
+    def __init__(self, primary, fallbacks, window=50):
+        self.primary = primary
+        self.fallbacks = [m for m in fallbacks if m and m != primary]
+        self._stats = {}
+        self._window = window
+        self._probed = {}    # model → monotonic time of the last recovery probe
+        self._lock = threading.Lock()
+
+    def _get(self, model):
+        if model not in self._stats:
+            self._stats[model] = ModelStats(self._window)
+        return self._stats[model]
+
+    def is_degraded(self, model):
+        """Degraded = high recent error rate or slow p95 latency."""
+        with self._lock:
+            stats = self._get(model)
+            if len(stats.results) < Config.MODEL_MIN_SAMPLES:
+                return False
+            p95 = _percentile(stats.latencies, 0.95)
+            return (stats.error_rate() >= Config.MODEL_DEGRADED_ERROR_RATE
+                    or (p95 is not None and p95 >= Config.MODEL_DEGRADED_P95))
+
+    def _probe_due(self, model):
+        """True at most once per MODEL_PROBE_INTERVAL while a model is degraded."""
+        now = time.monotonic()
+        with self._lock:
+            last = self._probed.setdefault(model, now)
+            if now - last < Config.MODEL_PROBE_INTERVAL:
+                return False
+            self._probed[model] = now
+            return True
+
+    def candidates(self, simple=False):
+        """
+        Models to try, in order. Simple queries and calls made while the
+        primary is degraded go to the fallbacks first (except the periodic
+        recovery probe).
+        """
+        if not self.fallbacks:
+            return [self.primary]
+
+        if simple:
+            return self.fallbacks + [self.primary]
+
+        if self.is_degraded(self.primary):
+            if self._probe_due(self.primary):
+                print(f"[Models] Probing degraded primary {self.primary}")
+                return [self.primary] + self.fallbacks
+            return self.fallbacks + [self.primary]
+
+        with self._lock:
+            self._probed.pop(self.primary, None)
+        return [self.primary] + self.fallbacks
+
+    def record(self, model, latency, success, usage=None, purpose="chat", error=None):
+        usage = usage or {}
+
+        with self._lock:
+            stats = self._get(model)
+            stats.calls += 1
+            stats.results.append(success)
+            if success:
+                stats.latencies.append(latency)
+            else:
+                stats.errors += 1
+            stats.prompt_tokens += usage.get("prompt_tokens") or 0
+            stats.completion_tokens += usage.get("completion_tokens") or 0
+
+        try:
+            add_model_usage(
+                model, purpose,
+                usage.get("prompt_tokens"), usage.get("completion_tokens"),
+                int(latency * 1000), success, error
+            )
+        except Exception as e:
+            print("[Models] Usage log error:", e)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "primary": self.primary,
+                "fallbacks": self.fallbacks,
+                "models": {model: stats.snapshot() for model, stats in self._stats.items()}
+            }
+
+
+def is_simple_query(message, disease_name='', history=None):
+    """Short standalone questions without disease context or history."""
+    has_history = bool(history and (history.get('summary') or history.get('turns')))
+    return (len(message or '') <= Config.MODEL_SIMPLE_MAX_CHARS
+            and not disease_name and not has_history)
+
+
+model_router = ModelRouter(
+    Config.OPENROUTER_PRIMARY_MODEL,
+    [m.strip() for m in Config.OPENROUTER_FALLBACK_MODELS.split(",")],
+    window=Config.MODEL_STATS_WINDOW
+)
@@ -0,0 +1,45 @@
+import threading
+import time
+
+from config import Config
+
+# ---------------------------------------------------------
+# RELAY STATE CACHE
+# The server's view of each pump relay. Updated by successful on/off
+# commands and by the health monitor's periodic reconcile probe, and
+# served from memory so status polls never hit the ESP32.
+# ---------------------------------------------------------
+
+_states = {}    # device id → {"state", "updated", "source"}
+_lock = threading.Lock()
+
+
+def record_relay_state(device_id, state, source):
+    """source = "command" (we switched it) or "probe" (read from the board)."""
+    with _lock:
+        _states[device_id] = {"state": state, "updated": time.time(), "source": source}
+
+
+def get_relay_snapshot(device_id):
+    """
+    Cached state plus staleness: {"state", "updated", "source", "age", "stale"}.
+    state is None if never known.
+    """
+    with _lock:
+        entry = dict(_states.get(device_id) or {"state": None, "updated": None, "source": None})
+
+    if entry["updated"] is None:
+        entry["age"] = None
+        entry["stale"] = True
+    else:
+        entry["age"] = round(time.time() - entry["updated"], 1)
+        entry["stale"] = entry["age"] > Config.RELAY_STATE_STALE_AFTER
+
+    return entry
+
+
+def needs_reconcile(device_id):
+    """True if the cached state is older than the reconcile interval."""
+    with _lock:
+        entry = _states.get(device_id)
+    return entry is None or time.time() - entry["updated"] >= Config.RELAY_RECONCILE_INTERVAL
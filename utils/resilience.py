@@ -0,0 +1,280 @@
+import threading
+import time
+from collections import deque
+
+from config import Config
+
+
+# ---------------------------------------------------------
+# ERRORS (raised instead of waiting on a failing service)
+# ---------------------------------------------------------
+class ServiceUnavailable(Exception):
+    """External service is being protected; the call was not attempted."""
+
+
+class CircuitOpenError(ServiceUnavailable):
+    pass
+
+
+class RateLimitedError(ServiceUnavailable):
+    pass
+
+
+class ClientRequestError(Exception):
+    """
+    The service answered with a 4xx (bad request, key, quota...). The
+    service itself is up, so this never counts against its breaker.
+    """
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def is_client_error(status_code):
+    """4xx other than 429 (rate limited, which is the service pushing back)."""
+    return 400 <= status_code < 500 and status_code != 429
+
+
+# ---------------------------------------------------------
+# TOKEN BUCKET RATE LIMITER
+# ---------------------------------------------------------
+class TokenBucket:
+    """
+    Allows `rate` calls per second on average, with bursts up to `capacity`.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout=0):
+        """Take one token, waiting up to `timeout` seconds. Returns True on success."""
+        deadline = time.monotonic() + timeout
+
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def snapshot(self):
+        with self._lock:
+            self._refill()
+            return {
+                "rate": self.rate,
+                "capacity": self.capacity,
+                "tokens": round(self._tokens, 2)
+            }
+
+
+# ---------------------------------------------------------
+# CIRCUIT BREAKER
+# closed → open when the error rate over the last `window` calls
+# crosses `error_threshold`; open → half_open after `reset_timeout`;
+# one probe call then decides closed or open again.
+# ---------------------------------------------------------
+class CircuitBreaker:
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, error_threshold=0.5, window=20, min_calls=5, reset_timeout=30):
+        self.error_threshold = error_threshold
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+
+        self.state = self.CLOSED
+        self._results = deque(maxlen=window)    # True = success
+        self._opened_at = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+        self.total_calls = 0
+        self.total_failures = 0
+        self.total_rejected = 0
+
+    def allow(self):
+        """Return True if a call may go through right now."""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    self.total_rejected += 1
+                    return False
+                self.state = self.HALF_OPEN
+
+            if self.state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    self.total_rejected += 1
+                    return False
+                self._probe_in_flight = True
+
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.total_calls += 1
+            if self.state == self.HALF_OPEN:
+                self.state = self.CLOSED
+                self._results.clear()
+                self._probe_in_flight = False
+            self._results.append(True)
+
+    def record_failure(self):
+        with self._lock:
+            self.total_calls += 1
+            self.total_failures += 1
+            self._results.append(False)
+
+            if self.state == self.HALF_OPEN:
+                self._trip()
+            elif len(self._results) >= self.min_calls and self.error_rate() >= self.error_threshold:
+                self._trip()
+
+    def release_probe(self):
+        """Give back a half-open probe slot that was never used."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def error_rate(self):
+        if not self._results:
+            return 0.0
+        return self._results.count(False) / len(self._results)
+
+    def _trip(self):
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+
+    def retry_in(self):
+        """Seconds until an open breaker lets a probe through (0 if not open)."""
+        if self.state != self.OPEN:
+            return 0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "error_rate": round(self.error_rate(), 3),
+                "window_calls": len(self._results),
+                "retry_in": round(self.retry_in(), 1),
+                "total_calls": self.total_calls,
+                "total_failures": self.total_failures,
+                "total_rejected": self.total_rejected
+            }
+
+
+# ---------------------------------------------------------
+# PROTECTED SERVICE = rate limiter + circuit breaker
+# One rate limit for the whole service. Calls can be split across
+# separate breakers by key (e.g. one per OpenRouter model), so one
+# failing backend doesn't shut out the others.
+# ---------------------------------------------------------
+def _new_breaker():
+    return CircuitBreaker(
+        error_threshold=Config.BREAKER_ERROR_THRESHOLD,
+        window=Config.BREAKER_WINDOW,
+        min_calls=Config.BREAKER_MIN_CALLS,
+        reset_timeout=Config.BREAKER_RESET_TIMEOUT
+    )
+
+
+class ProtectedService:
+
+    def __init__(self, name, rate, burst, acquire_timeout=5):
+        self.name = name
+        self.limiter = TokenBucket(rate, burst)
+        self.breaker = _new_breaker()
+        self._keyed_breakers = {}
+        self._lock = threading.Lock()
+        self.acquire_timeout = acquire_timeout
+
+    def breaker_for(self, key=None):
+        """The service-wide breaker, or the one for `key`."""
+        if key is None:
+            return self.breaker
+
+        with self._lock:
+            breaker = self._keyed_breakers.get(key)
+            if breaker is None:
+                breaker = self._keyed_breakers[key] = _new_breaker()
+            return breaker
+
+    def call(self, fn, *args, breaker_key=None, **kwargs):
+        """
+        Run fn(*args, **kwargs) under the breaker (for breaker_key) and
+        rate limit. Raises CircuitOpenError / RateLimitedError without
+        calling fn. ClientRequestError from fn is passed through without
+        being counted as a failure.
+        """
+        breaker = self.breaker_for(breaker_key)
+        label = f"{self.name} ({breaker_key})" if breaker_key else self.name
+
+        if not breaker.allow():
+            raise CircuitOpenError(
+                f"{label} temporarily unavailable "
+                f"(retry in {breaker.retry_in():.0f}s)"
+            )
+
+        if not self.limiter.acquire(self.acquire_timeout):
+            breaker.release_probe()
+            raise RateLimitedError(f"{self.name} rate limit exceeded")
+
+        try:
+            result = fn(*args, **kwargs)
+        except ClientRequestError:
+            # The service answered; only this request was rejected
+            breaker.release_probe()
+            raise
+        except Exception:
+            breaker.record_failure()
+            raise
+
+        breaker.record_success()
+        return result
+
+    def snapshot(self):
+        with self._lock:
+            keyed = dict(self._keyed_breakers)
+
+        snapshot = {
+            "breaker": self.breaker.snapshot(),
+            "rate_limit": self.limiter.snapshot()
+        }
+        if keyed:
+            snapshot["breakers"] = {key: breaker.snapshot() for key, breaker in keyed.items()}
+        return snapshot
+
+
+kindwise_service = ProtectedService(
+    "Kindwise", Config.KINDWISE_RATE_PER_SEC, Config.KINDWISE_RATE_BURST
+)
+openrouter_service = ProtectedService(
+    "OpenRouter", Config.OPENROUTER_RATE_PER_SEC, Config.OPENROUTER_RATE_BURST
+)
+
+SERVICES = {
+    "kindwise": kindwise_service,
+    "openrouter": openrouter_service
+}
+
+
+def get_services_status():
+    """State of every protected service (for monitoring)."""
+    return {name: service.snapshot() for name, service in SERVICES.items()}
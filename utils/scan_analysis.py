@@ -0,0 +1,81 @@
+from utils.db import update_scan
+from utils.disease_classifier import diagnose
+from utils.resilience import ServiceUnavailable
+from utils.analysis_queue import queue_analysis
+from utils.advice_pregen import schedule_advice
+
+# OPTIONAL (Kindwise Router Integration)
+try:
+    from utils.router import classify as router_classify
+    ROUTER_ENABLED = True
+except:
+    ROUTER_ENABLED = False
+
+# ---------------------------------------------------------
+# ANALYZE ONE STORED SCAN
+# Shared by /api/analyze and the capture scheduler:
+#   router check → diagnose → store result → pre-generate advice
+# ---------------------------------------------------------
+
+
+class AnalysisQueued(ServiceUnavailable):
+    """Kindwise was unavailable; the scan was queued for a later retry."""
+
+    def __init__(self, message, job_id):
+        super().__init__(message)
+        self.job_id = job_id
+
+
+def router_rejection(image_path):
+    """
+    Router Safety Filter.
+    Returns an error message if the image is not a plant leaf, else None.
+    """
+    if not ROUTER_ENABLED:
+        return None
+
+    router_out = router_classify(image_path)
+    top_class = list(router_out.keys())[0]
+    top_score = router_out[top_class]
+
+    # Debug print
+    print("\nROUTER:", router_out, "\n")
+
+    # Hard block humans
+    if top_class == "human" and top_score > 0.40:
+        return "Human detected. Upload plant images only."
+
+    # NEW LOGIC — require PLANT CONFIDENCE > 0.70
+    plant_score = router_out.get("plant", 0)
+    unhealthy_score = router_out.get("unhealthy_plant", 0)
+    crop_score = router_out.get("crop", 0)
+
+    max_plant_like = max(plant_score, unhealthy_score, crop_score)
+
+    if max_plant_like < 0.65:  # 65% threshold
+        return "No plant detected. Please upload a clear leaf photo."
+
+    return None
+
+
+def analyze_scan(scan_id, image_path, crop_type="general"):
+    """
+    Diagnose a scan that passed the router, store the result on its row
+    and start generating its treatment advice. Returns the result.
+    Raises AnalysisQueued (with the job id) if Kindwise is unavailable.
+    """
+    try:
+        result = diagnose(image_path, crop_type)
+    except ServiceUnavailable as e:
+        job_id = queue_analysis([scan_id], crop_type, e)
+        raise AnalysisQueued(str(e), job_id)
+
+    update_scan(
+        scan_id, result.get("disease", "Unknown"), result.get("confidence", 0.0),
+        result.get("description", "No description"), result.get("tier")
+    )
+
+    # Pre-generate treatment advice for the chat
+    schedule_advice([scan_id], result, crop_type)
+
+    return result
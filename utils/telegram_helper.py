@@ -1,7 +1,312 @@
+import hashlib
+import os
+import threading
+import time
+from collections import deque
+
 import requests
+
+from utils import http_client
+from utils.resilience import TokenBucket
+from utils.db import get_telegram_file_id, save_telegram_file_id, delete_telegram_file_id
 from config import Config
 
-BASE = f"https://api.telegram.org/bot{Config.TELEGRAM_TOKEN}"
+BASE = f"{Config.TELEGRAM_API}/bot{Config.TELEGRAM_TOKEN}"
+
+# Telegram rejects longer texts; coalesced status messages start over past this
+MAX_TEXT_LENGTH = 4000
+
+
+# path → (mtime, size, sha256) so unchanged files aren't re-hashed
+_digests = {}
+
+
+def _file_digest(path):
+    """Content hash of a local file (cached while mtime/size are unchanged)."""
+    stat = os.stat(path)
+    cached = _digests.get(path)
+    if cached and cached[:2] == (stat.st_mtime, stat.st_size):
+        return cached[2]
+
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            sha.update(chunk)
+
+    digest = sha.hexdigest()
+    _digests[path] = (stat.st_mtime, stat.st_size, digest)
+    return digest
+
+
+# ---------------------------------------------------------
+# OUTBOUND MESSAGE QUEUE
+# Callers only enqueue; one sender thread talks to Telegram, respecting
+# per-chat and global rate limits and retrying with backoff.
+# Status lines sent in a burst are merged into one message that is
+# edited in place instead of posting a new message per line.
+# ---------------------------------------------------------
+class TelegramOutbox:
+
+    def __init__(self):
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._busy = False
+
+        self._global_bucket = TokenBucket(Config.TELEGRAM_GLOBAL_RATE, Config.TELEGRAM_GLOBAL_RATE)
+        self._chat_buckets = {}
+
+        # chat_id → {"message_id", "lines", "at"} of the status message being edited
+        self._status = {}
+
+        self.sent = 0
+        self.edited = 0
+        self.coalesced = 0
+        self.photos_reused = 0
+        self.retries = 0
+        self.failed = 0
+        self.dropped = 0
+
+    # ------------------------------
+    # Producer side
+    # ------------------------------
+    def put(self, item):
+        with self._cond:
+            if len(self._queue) >= Config.TELEGRAM_OUTBOX_MAX:
+                self.dropped += 1
+                print("[Telegram] Outbox full, dropping message")
+                return False
+
+            self._queue.append(item)
+            self._cond.notify()
+
+        self._ensure_thread()
+        return True
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._cond:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name="telegram-outbox", daemon=True
+                    )
+                    self._thread.start()
+
+    def flush(self, timeout=10):
+        """Wait until everything queued so far has been sent. Returns True if drained."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._queue or self._busy:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    # ------------------------------
+    # Sender thread
+    # ------------------------------
+    def _next(self):
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+
+            item = self._queue.popleft()
+
+            # Merge status lines queued right behind this one
+            if item["kind"] == "status":
+                while (self._queue and self._queue[0]["kind"] == "status"
+                       and self._queue[0]["chat_id"] == item["chat_id"]):
+                    item["lines"] += self._queue.popleft()["lines"]
+                    self.coalesced += 1
+
+            self._busy = True
+            return item
+
+    def _run(self):
+        while True:
+            item = self._next()
+            try:
+                if item["kind"] == "status":
+                    self._send_status(item)
+                elif item["kind"] == "photo":
+                    self._send_photo(item)
+                else:
+                    self._send_text(item)
+            except Exception as e:
+                print("[Telegram] Outbox error:", e)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _send_text(self, item):
+        self._status.pop(item["chat_id"], None)
+
+        payload = {"chat_id": item["chat_id"], "text": item["text"]}
+        if item["parse_mode"]:
+            payload["parse_mode"] = item["parse_mode"]
+
+        if self._call("sendMessage", item["chat_id"], json=payload) is not None:
+            self.sent += 1
+
+    def _send_photo(self, item):
+        chat_id = item["chat_id"]
+        path = item["path"]
+        self._status.pop(chat_id, None)
+
+        data = {"chat_id": chat_id, "caption": item["caption"]}
+        if item["parse_mode"]:
+            data["parse_mode"] = item["parse_mode"]
+
+        try:
+            digest = _file_digest(path)
+        except OSError as e:
+            print(f"[Telegram] sendPhoto failed, cannot read {path}:", e)
+            self.failed += 1
+            return
+
+        # Same bytes already uploaded → send by file_id, no re-upload.
+        # A rejected file_id only counts as failed if the re-upload fails too.
+        file_id = get_telegram_file_id(path, digest)
+        if file_id:
+            result = self._call("sendPhoto", chat_id, data=dict(data, photo=file_id), count_failure=False)
+            if result is not None:
+                self.sent += 1
+                self.photos_reused += 1
+                return
+            delete_telegram_file_id(path)
+
+        result = self._call("sendPhoto", chat_id, data=data, photo=path)
+        if result is None:
+            return
+
+        self.sent += 1
+
+        # Largest size comes last
+        sizes = result.get("photo") or []
+        if sizes and sizes[-1].get("file_id"):
+            save_telegram_file_id(path, digest, sizes[-1]["file_id"])
+
+    def _send_status(self, item):
+        chat_id = item["chat_id"]
+        current = self._status.get(chat_id)
+        now = time.monotonic()
+
+        # Append to the status message still on screen
+        if current and now - current["at"] <= Config.TELEGRAM_COALESCE_WINDOW:
+            lines = current["lines"] + item["lines"]
+            text = "\n".join(lines)
+
+            if len(text) <= MAX_TEXT_LENGTH:
+                result = self._call("editMessageText", chat_id, json={
+                    "chat_id": chat_id,
+                    "message_id": current["message_id"],
+                    "text": text
+                }, count_failure=False)
+                if result is not None:
+                    current.update(lines=lines, at=now)
+                    self.edited += 1
+                    return
+
+        result = self._call("sendMessage", chat_id, json={
+            "chat_id": chat_id, "text": "\n".join(item["lines"])
+        })
+        if result is None:
+            self._status.pop(chat_id, None)
+            return
+
+        self.sent += 1
+        self._status[chat_id] = {
+            "message_id": result.get("message_id"),
+            "lines": item["lines"],
+            "at": now
+        }
+
+    def _wait_for_slot(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(Config.TELEGRAM_CHAT_RATE, Config.TELEGRAM_CHAT_BURST)
+            self._chat_buckets[chat_id] = bucket
+
+        bucket.acquire(timeout=60)
+        self._global_bucket.acquire(timeout=60)
+
+    def _call(self, method, chat_id, json=None, data=None, photo=None, count_failure=True):
+        """
+        Call a Bot API method with retries. Returns the "result" object
+        (or {}) on success, None if the message was given up on.
+        count_failure=False when the caller has a fallback of its own.
+        """
+        url = f"{BASE}/{method}"
+
+        for attempt in range(Config.TELEGRAM_MAX_RETRIES + 1):
+            delay = Config.TELEGRAM_RETRY_BACKOFF * 2 ** attempt
+            self._wait_for_slot(chat_id)
+
+            try:
+                if photo:
+                    with open(photo, "rb") as img:
+                        r = http_client.post(url, service="telegram", data=data,
+                                             files={"photo": img}, timeout=(5, 30))
+                else:
+                    r = http_client.post(url, service="telegram", json=json, data=data,
+                                         timeout=(5, 10))
+
+                try:
+                    body = r.json()
+                except ValueError:
+                    body = {}
+
+                if r.status_code == 200 and body.get("ok", True):
+                    result = body.get("result")
+                    return result if isinstance(result, dict) else {}
+
+                if r.status_code == 429:
+                    delay = body.get("parameters", {}).get("retry_after", delay)
+                elif r.status_code < 500:
+                    # Bad request / forbidden — retrying won't help
+                    print(f"[Telegram] {method} rejected ({r.status_code}):", body.get("description"))
+                    if count_failure:
+                        self.failed += 1
+                    return None
+
+                error = f"HTTP {r.status_code}"
+
+            except requests.RequestException as e:
+                error = str(e)
+
+            except OSError as e:
+                print(f"[Telegram] {method} failed, cannot read {photo}:", e)
+                if count_failure:
+                    self.failed += 1
+                return None
+
+            if attempt < Config.TELEGRAM_MAX_RETRIES:
+                self.retries += 1
+                print(f"[Telegram] {method} failed ({error}), retrying in {delay}s")
+                time.sleep(delay)
+
+        print(f"[Telegram] {method} failed after {Config.TELEGRAM_MAX_RETRIES + 1} attempts")
+        if count_failure:
+            self.failed += 1
+        return None
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                "queued": len(self._queue),
+                "sent": self.sent,
+                "edited": self.edited,
+                "coalesced": self.coalesced,
+                "photos_reused": self.photos_reused,
+                "retries": self.retries,
+                "failed": self.failed,
+                "dropped": self.dropped
+            }
+
+
+outbox = TelegramOutbox()
 
 
 # ---------------------------------------------------------
@@ -9,26 +314,31 @@ BASE = f"https://api.telegram.org/bot{Config.TELEGRAM_TOKEN}"
 # ---------------------------------------------------------
 def tg_send(text, parse_mode=None):
     """
-    Send a Telegram message.
+    Queue a Telegram message (returns immediately).
     parse_mode can be: "Markdown", "MarkdownV2", "HTML", or None.
     Example: tg_send("**Hello**", parse_mode="Markdown")
     """
-    try:
-        payload = {
-            "chat_id": Config.TELEGRAM_CHAT_ID,
-            "text": text
-        }
+    outbox.put({
+        "kind": "text",
+        "chat_id": Config.TELEGRAM_CHAT_ID,
+        "text": text,
+        "parse_mode": parse_mode
+    })
 
-        if parse_mode:
-            payload["parse_mode"] = parse_mode
 
-        requests.post(
-            f"{BASE}/sendMessage",
-            json=payload,
-            timeout=4
-        )
-    except Exception as e:
-        print("[Telegram] sendMessage failed:", e)
+# ---------------------------------------------------------
+# SEND STATUS LINE (progress updates, coalesced)
+# ---------------------------------------------------------
+def tg_status(text):
+    """
+    Queue a short progress line. Consecutive status lines are shown as
+    one message that gets edited, e.g. "Capturing…" → "Analyzing…".
+    """
+    outbox.put({
+        "kind": "status",
+        "chat_id": Config.TELEGRAM_CHAT_ID,
+        "lines": [text]
+    })
 
 
 # ---------------------------------------------------------
@@ -36,24 +346,13 @@ def tg_send(text, parse_mode=None):
 # ---------------------------------------------------------
 def tg_send_photo(path, caption="AgriSight Update", parse_mode=None):
     """
-    Send a photo with optional caption + formatting.
+    Queue a photo with optional caption + formatting (returns immediately).
     Example: tg_send_photo(path, "🌿 *Scan Done*", parse_mode="Markdown")
     """
-    try:
-        with open(path, "rb") as img:
-            data = {
-                "chat_id": Config.TELEGRAM_CHAT_ID,
-                "caption": caption
-            }
-
-            if parse_mode:
-                data["parse_mode"] = parse_mode
-
-            requests.post(
-                f"{BASE}/sendPhoto",
-                data=data,
-                files={"photo": img},
-                timeout=8
-            )
-    except Exception as e:
-        print("[Telegram] sendPhoto failed:", e)
+    outbox.put({
+        "kind": "photo",
+        "chat_id": Config.TELEGRAM_CHAT_ID,
+        "path": path,
+        "caption": caption,
+        "parse_mode": parse_mode
+    })
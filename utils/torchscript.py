@@ -0,0 +1,44 @@
+import numpy as np
+import torch
+import cv2
+from PIL import Image
+import torchvision.transforms.functional as TF
+
+DEVICE = 'cuda:0' if torch.cuda.is_available() else 'cpu'
+
+
+# -----------------------------------
+# Shared TorchScript loading + preprocessing
+# (router and local disease classifier)
+# -----------------------------------
+def load_torchscript(model_path, classes_path):
+    # Load classes
+    with open(classes_path) as f:
+        classes = [line.strip() for line in f if line.strip()]
+
+    # Load TorchScript model
+    model = torch.jit.load(model_path).eval().to(DEVICE)
+    return model, classes
+
+
+def resize_crop(img, target=480):
+    h, w = img.shape[:2]
+    crop = min(h, w)
+    x = (w - crop) // 2
+    y = (h - crop) // 2
+    return cv2.resize(img[y:y+crop, x:x+crop], (target, target), interpolation=cv2.INTER_AREA)
+
+
+def predict(model, classes, image_path, softmax=False):
+    img = np.array(Image.open(image_path).convert("RGB"))
+    img_resized = resize_crop(img)
+    tensor = TF.to_tensor(img_resized).to(DEVICE)
+
+    with torch.no_grad():
+        out = model(tensor.unsqueeze(0)).squeeze()
+        if softmax:
+            out = torch.softmax(out, dim=0)
+        pred = out.cpu().numpy()
+
+    result = {classes[i]: float(pred[i]) for i in range(len(pred))}
+    return dict(sorted(result.items(), key=lambda x: -x[1]))
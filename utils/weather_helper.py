@@ -1,4 +1,5 @@
 import requests
+from utils import http_client
 from config import Config
 
 def get_weather_data(lat, lon):
@@ -16,8 +17,9 @@ def get_weather_data(lat, lon):
     }
     
     try:
-        response = requests.get(
+        response = http_client.get(
             Config.OPENWEATHER_URL,
+            service='weather',
             params=params,
             timeout=10
         )
@@ -60,8 +62,9 @@ def get_weather_by_city(city_name):
     }
     
     try:
-        response = requests.get(
-            'https://api.openweathermap.org/data/2.5/weather',
+        response = http_client.get(
+            Config.OPENWEATHER_URL,
+            service='weather',
             params=params,
             timeout=10
         )
@@ -104,8 +107,9 @@ def get_weather_forecast(lat, lon):
     }
     
     try:
-        response = requests.get(
-            'https://api.openweathermap.org/data/2.5/forecast',
+        response = http_client.get(
+            f'{Config.OPENWEATHER_BASE}/forecast',
+            service='weather',
             params=params,
             timeout=10
         )